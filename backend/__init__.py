@@ -1,6 +1,15 @@
 """Backend package initialization."""
 
-from .app import create_app
 from .version import VERSION  # central version constant
 
 __all__ = ["create_app"]
+
+
+def __getattr__(name):
+    # Import the app lazily so CLI modules (python -m backend.ledger, ...)
+    # don't pay for Flask, Dash and every route at startup.
+    if name == "create_app":
+        from .app import create_app
+
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,199 @@
+"""First-expiry-first-out (FEFO) batch allocation.
+
+WHY: fulfilling a request meant picking batches by hand.
+WHAT: closes #fefo-allocation
+HOW: ``allocate`` reads a per-org, per-product list of batches kept sorted by
+expiry; ledger changes adjust it in place after commit. Each pair loads
+under its own lock. Tune the reload interval with FEFO_INDEX_TTL (seconds).
+
+Only stock whose batch is ``Released`` and not yet expired is allocated.
+The index only sees this process's ledger changes, so picks that are
+saved go through ``stale_products`` first, which checks them against the
+database.
+"""
+
+import bisect
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event, inspect, select, tuple_
+from sqlalchemy.orm import object_session
+
+from . import ledger, models
+from .database import after_commit
+
+RELEASED = "Released"
+# Reload a pair's index after this long to pick up other workers' writes
+INDEX_TTL = float(os.environ.get("FEFO_INDEX_TTL", "300"))
+
+
+class _Stock:
+    """Expiry-ordered stock of one product at one organization."""
+
+    def __init__(self, loaded_at):
+        self.loaded_at = loaded_at
+        self.batches = []  # sorted [(expiry, batch_id)]
+        self.quantity = {}  # batch_id -> on-hand quantity
+
+    def add(self, batch_id, expiry, qty):
+        bisect.insort(self.batches, (expiry, batch_id))
+        self.quantity[batch_id] = qty
+
+
+class FefoIndex:
+    """Lazily loaded, incrementally maintained FEFO structure per (org, product).
+
+    Each pair loads under its own lock, so allocations for unrelated pairs
+    never wait on each other's queries.
+    """
+
+    def __init__(self, ttl: float = INDEX_TTL):
+        self.ttl = ttl
+        self._stocks = {}  # (org_id, product_id) -> _Stock
+        self._loading = {}  # (org_id, product_id) -> lock held while loading
+        self._changes = {}  # (org_id, product_id) -> committed ledger changes seen
+        self._lock = threading.Lock()
+
+    def _load(self, session, org_id, product_id):
+        inv, batch = models.Inventory, models.Batch
+        rows = session.execute(
+            select(inv.batch_id, batch.expiry_date, inv.quantity)
+            .join(batch, batch.batch_id == inv.batch_id)
+            .where(inv.organization_id == org_id, inv.product_id == product_id)
+            .where(inv.quantity > 0)
+            .where(batch.quality_control_status == RELEASED)
+        )
+        stock = _Stock(time.monotonic())
+        for batch_id, expiry, qty in rows:
+            # Batches without an expiry date go last
+            stock.add(batch_id, expiry or date.max, qty)
+        return stock
+
+    def _fresh(self, key):
+        stock = self._stocks.get(key)
+        if stock is not None and time.monotonic() - stock.loaded_at <= self.ttl:
+            return stock
+        return None
+
+    def stock(self, session, org_id, product_id) -> _Stock:
+        key = (org_id, product_id)
+        with self._lock:
+            stock = self._fresh(key)
+            if stock is not None:
+                return stock
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            # Another thread may have loaded the pair while this one waited
+            with self._lock:
+                stock = self._fresh(key)
+                seen = self._changes.get(key, 0)
+            if stock is None:
+                stock = self._load(session, org_id, product_id)
+                with self._lock:
+                    # A commit during the load may be missing from it; don't keep it
+                    if self._changes.get(key, 0) == seen:
+                        self._stocks[key] = stock
+            return stock
+
+    def on_ledger_change(self, changes):
+        """Apply committed ledger deltas to loaded pairs."""
+        with self._lock:
+            for (org_id, batch_id), (product_id, delta) in changes.items():
+                self._changes[(org_id, product_id)] = self._changes.get((org_id, product_id), 0) + 1
+                stock = self._stocks.get((org_id, product_id))
+                if stock is None:
+                    continue
+                if batch_id not in stock.quantity:
+                    # New batch for this pair; expiry/QC unknown here, so reload
+                    del self._stocks[(org_id, product_id)]
+                    continue
+                stock.quantity[batch_id] += delta
+
+    def invalidate(self, org_id=None, product_id=None):
+        """Drop loaded pairs matching ``org_id`` and ``product_id`` (None matches any)."""
+        with self._lock:
+            for key in [key for key in self._stocks
+                        if org_id in (None, key[0]) and product_id in (None, key[1])]:
+                del self._stocks[key]
+
+
+fefo_index = FefoIndex()
+ledger.listeners.append(fefo_index.on_ledger_change)
+
+
+@event.listens_for(models.Batch, "after_update")
+def _on_batch_update(mapper, connection, target):
+    # QC holds and expiry corrections decide which batches are allocatable
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("quality_control_status", "expiry_date")):
+        after_commit(object_session(target), lambda: fefo_index.invalidate(product_id=target.product_id))
+
+
+def allocate(session, org_id: str, lines, today=None) -> list:
+    """Allocate ``lines`` of ``{"product_id", "quantity"}`` from ``org_id``.
+
+    Returns one result per line with the batches picked, earliest expiry
+    first. Lines for the same product draw down the same stock.
+    """
+    today = today or date.today()
+    first_valid = (today + timedelta(days=1), "")
+    taken = {}
+    results = []
+    for line in lines:
+        product_id, wanted = line["product_id"], int(line["quantity"])
+        picks, remaining = [], wanted
+        stock = fefo_index.stock(session, org_id, product_id)
+        batches = stock.batches
+        for expiry, batch_id in batches[bisect.bisect_left(batches, first_valid):]:
+            if remaining <= 0:
+                break
+            free = stock.quantity.get(batch_id, 0) - taken.get(batch_id, 0)
+            if free <= 0:
+                continue
+            qty = min(free, remaining)
+            taken[batch_id] = taken.get(batch_id, 0) + qty
+            remaining -= qty
+            picks.append({
+                "batch_id": batch_id,
+                "expiry_date": None if expiry == date.max else expiry.isoformat(),
+                "quantity": qty,
+            })
+        results.append({
+            "product_id": product_id,
+            "requested": wanted,
+            "allocated": wanted - remaining,
+            "shortfall": remaining,
+            "batches": picks,
+        })
+    return results
+
+
+def stale_products(session, org_id: str, results, today=None) -> set:
+    """Products whose picks in ``results`` the database no longer backs.
+
+    A pick is stale when its batch is no longer ``Released``, has expired,
+    or ``org_id`` holds less of it than was picked (another worker moved
+    it since the index loaded).
+    """
+    picked = {}
+    product_of = {}
+    for line in results:
+        for pick in line["batches"]:
+            picked[pick["batch_id"]] = picked.get(pick["batch_id"], 0) + pick["quantity"]
+            product_of[pick["batch_id"]] = line["product_id"]
+    if not picked:
+        return set()
+    today = today or date.today()
+    inv, batch = models.Inventory, models.Batch
+    rows = session.execute(
+        select(inv.batch_id, inv.quantity, batch.quality_control_status, batch.expiry_date)
+        .join(batch, batch.batch_id == inv.batch_id)
+        .where(tuple_(inv.organization_id, inv.batch_id).in_([(org_id, b) for b in picked]))
+    )
+    backed = {
+        batch_id for batch_id, qty, status, expiry in rows
+        if status == RELEASED and (expiry is None or expiry > today) and qty >= picked[batch_id]
+    }
+    return {product_of[b] for b in picked if b not in backed}
@@ -0,0 +1,199 @@
+"""Cached dashboard aggregates computed with pandas.
+
+WHY: dashboard pages should show live figures without querying per view.
+WHAT: closes #analytics-cache
+HOW: each figure is loaded with one set-based query, aggregated vectorized
+and cached until its TTL (ANALYTICS_CACHE_TTL seconds) runs out or a
+commit touches one of its tables.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import select
+
+from .changes import tracker
+from .database import read_engine
+from . import models
+
+CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", "300"))
+EXPIRY_BUCKETS = [-1, 30, 60, 90]
+EXPIRY_LABELS = ["0-30 days", "31-60 days", "61-90 days"]
+OPEN_REQUEST_STATUSES = ("Pending", "In Progress")
+
+
+class AnalyticsCache:
+    """TTL cache whose entries are dropped when their tables change."""
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # key -> (expires_at, tables, value)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a compute that raced a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, tables, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[2]
+            generation = self._generation
+        self.misses += 1
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, frozenset(tables), value)
+        return value
+
+    def on_change(self, tables):
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, e in self._entries.items() if e[1] & tables]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = AnalyticsCache()
+tracker.listeners.append(cache.on_change)
+
+_STOCK_TABLES = ("inventory", "batches", "products", "organizations")
+_REORDER_TABLES = ("reorder_points", "products", "organizations")
+
+
+def _stock_frame() -> pd.DataFrame:
+    """One row per positive inventory balance with batch, product and org details."""
+    inv, batch, prod, org = models.Inventory, models.Batch, models.Product, models.Organization
+    query = (
+        select(
+            inv.organization_id, org.name.label("organization"), org.type.label("org_type"),
+            inv.product_id, prod.name.label("product"), prod.sku,
+            inv.batch_id, batch.batch_number, batch.expiry_date,
+            batch.quality_control_status, inv.quantity,
+        )
+        .join(org, org.organization_id == inv.organization_id)
+        .join(prod, prod.product_id == inv.product_id)
+        .join(batch, batch.batch_id == inv.batch_id)
+        .where(inv.quantity > 0)
+    )
+    with read_engine.connect() as conn:
+        frame = pd.read_sql(query, conn)
+    # Far-future "never expires" dates overflow datetime64[ns]; NaT keeps them out of near_expiry
+    frame["expiry_date"] = pd.to_datetime(frame["expiry_date"], errors="coerce")
+    return frame
+
+
+def stock_frame() -> pd.DataFrame:
+    return cache.get_or_compute("stock_frame", _STOCK_TABLES, _stock_frame)
+
+
+def _by_type(frame, org_type):
+    return frame if org_type is None else frame[frame["org_type"] == org_type]
+
+
+def stock_by_product_org(org_type=None) -> pd.DataFrame:
+    """Total on-hand quantity per organization and product."""
+
+    def compute():
+        frame = _by_type(stock_frame(), org_type)
+        return (
+            frame.groupby(["organization_id", "organization", "product_id", "product"], as_index=False)
+            ["quantity"].sum()
+            .sort_values(["organization", "product"])
+        )
+
+    return cache.get_or_compute(("stock_by_product_org", org_type), _STOCK_TABLES, compute)
+
+
+def near_expiry(days: int = 90, org_type=None) -> pd.DataFrame:
+    """Balances whose batch expires within ``days``, bucketed by time left."""
+
+    def compute():
+        frame = _by_type(stock_frame(), org_type)
+        days_left = (frame["expiry_date"] - pd.Timestamp(date.today())).dt.days
+        soon = frame.assign(days_left=days_left)[(days_left >= 0) & (days_left <= days)]
+        soon = soon.assign(
+            bucket=pd.cut(soon["days_left"], EXPIRY_BUCKETS, labels=EXPIRY_LABELS).astype(str),
+            expiry_date=soon["expiry_date"].dt.date,
+        )
+        return soon.sort_values("days_left")[
+            ["organization", "product", "batch_number", "expiry_date", "days_left", "bucket", "quantity"]
+        ]
+
+    # Keyed by day too, since "days left" changes at midnight without a write
+    return cache.get_or_compute(("near_expiry", days, org_type, date.today()), _STOCK_TABLES, compute)
+
+
+def _pending_requests() -> pd.DataFrame:
+    req, org = models.Request, models.Organization
+    query = (
+        select(
+            req.request_id, req.request_type, req.status, req.request_date,
+            req.target_org_id, org.name.label("target"), org.type.label("org_type"),
+        )
+        .outerjoin(org, org.organization_id == req.target_org_id)
+        .where(req.status.in_(OPEN_REQUEST_STATUSES))
+    )
+    with read_engine.connect() as conn:
+        frame = pd.read_sql(query, conn)
+    frame["request_date"] = pd.to_datetime(frame["request_date"])
+    return frame
+
+
+def pending_requests(org_type=None) -> pd.DataFrame:
+    """Open requests per target organization and type with the oldest age."""
+
+    def compute():
+        frame = _by_type(
+            cache.get_or_compute("pending_frame", ("requests", "organizations"), _pending_requests),
+            org_type,
+        )
+        age = (pd.Timestamp.utcnow().tz_localize(None) - frame["request_date"]).dt.days
+        return (
+            frame.assign(age_days=age)
+            .groupby(["target", "request_type"], as_index=False, dropna=False)
+            .agg(open_requests=("request_id", "count"), oldest_days=("age_days", "max"))
+            .sort_values("open_requests", ascending=False)
+        )
+
+    return cache.get_or_compute(("pending_requests", org_type), ("requests", "organizations"), compute)
+
+
+def _reorder_frame() -> pd.DataFrame:
+    rp, org, prod = models.ReorderPoint, models.Organization, models.Product
+    query = (
+        select(
+            org.name.label("organization"), org.type.label("org_type"), prod.name.label("product"),
+            rp.on_hand, rp.forecast_daily_demand, rp.safety_stock, rp.reorder_point,
+            rp.days_of_cover, rp.suggested_order,
+        )
+        .join(org, org.organization_id == rp.organization_id)
+        .join(prod, prod.product_id == rp.product_id)
+        .where(rp.suggested_order > 0)
+    )
+    with read_engine.connect() as conn:
+        return pd.read_sql(query, conn)
+
+
+def reorder_suggestions(org_type=None) -> pd.DataFrame:
+    """Pairs at or below their reorder point (see planning.py), largest order first."""
+
+    def compute():
+        frame = _by_type(
+            cache.get_or_compute("reorder_frame", _REORDER_TABLES, _reorder_frame),
+            org_type,
+        )
+        return frame.drop(columns="org_type").sort_values(
+            ["suggested_order", "organization", "product"], ascending=[False, True, True]
+        )
+
+    return cache.get_or_compute(("reorder_suggestions", org_type), _REORDER_TABLES, compute)
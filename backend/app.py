@@ -1,23 +1,72 @@
 """Application factory that sets up Flask and Dash."""
 
-from flask import Flask
+import os
+import threading
 
-from frontend.dash_app import create_dash
+from flask import Flask
 
-from .database import init_db
+from .database import close_session, init_db
 from .routes import api_bp
 from . import models
 from .sample_data import seed_data
 
+# WHY: cold starts re-ran DDL, seeding and the full Dash build on every worker
+# WHAT: closes #fast-startup
+# HOW: DASH_MODE=eager|lazy|off picks how the UI mounts; SEED_ON_BOOT=1
+# restores seeding at startup (otherwise run `python -m backend.sample_data`)
+DASH_MODE = os.environ.get("DASH_MODE", "eager")
+SEED_ON_BOOT = os.environ.get("SEED_ON_BOOT", "0").lower() in ("1", "true", "yes")
+DASH_PREFIX = "/dashboard/"
+
+
+class LazyDashMiddleware:
+    """Build the Dash UI on the first ``/dashboard/`` request.
+
+    Dash runs on its own Flask instance so it can be created after the API
+    server has started handling requests. Concurrent first requests (gthread
+    workers) build it once under a lock.
+    """
+
+    def __init__(self, api_app):
+        self.api_app = api_app
+        self.dash_server = None
+        self._lock = threading.Lock()
 
-def create_app():
+    def _build(self):
+        with self._lock:
+            if self.dash_server is None:
+                from frontend.dash_app import create_dash
+
+                server = Flask("dashboard")
+                create_dash(server)
+                self.dash_server = server
+        return self.dash_server
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(DASH_PREFIX):
+            if self.dash_server is None:
+                self._build()
+            return self.dash_server.wsgi_app(environ, start_response)
+        return self.api_app(environ, start_response)
+
+
+def create_app(dash_mode: str | None = None, seed: bool | None = None):
     """Create Flask app with Dash attached."""
-    init_db()  # Ensure tables exist
-    seed_data()  # Insert sample records for demo
+    init_db()  # Skips DDL when the schema version is current
+    if SEED_ON_BOOT if seed is None else seed:
+        seed_data()  # Insert sample records for demo
     server = Flask(__name__)
     server.register_blueprint(api_bp, url_prefix="/api")
+    # One session per request, released when the request ends
+    server.teardown_appcontext(close_session)
+
+    dash_mode = dash_mode or DASH_MODE
+    if dash_mode == "eager":
+        from frontend.dash_app import create_dash
 
-    # Attach Dash frontend to this server
-    create_dash(server)
+        # Attach Dash frontend to this server
+        create_dash(server)
+    elif dash_mode == "lazy":
+        server.wsgi_app = LazyDashMiddleware(server.wsgi_app)
 
     return server
@@ -0,0 +1,245 @@
+"""Asynchronous, batched audit-log writer.
+
+WHY: audit rows were never written, and inserting them inline would double
+the commits on every write request.
+WHAT: closes #audit-writer
+HOW: ORM changes are captured on flush and queued once the session
+commits; a background thread inserts them in batches. Set AUDIT_SYNC=1 (or
+``writer.sync = True`` in tests) to write inline instead.
+
+Tuning: AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL (seconds), AUDIT_QUEUE_SIZE.
+When the queue is full the producing request writes its records itself, so
+memory stays bounded and a slow database slows writers instead of
+dropping audit rows.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+
+from flask import g, has_request_context
+from sqlalchemy import event, inspect, insert
+
+from .database import SessionLocal, after_commit, discard_rolled_back, engine
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Tables whose rows are derived or are the audit trail itself
+EXCLUDED = (models.AuditLog, models.OrganizationClosure, models.RevokedToken)
+MASKED_COLUMNS = {"password_hash"}
+
+
+def _truthy(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _current_user_id():
+    if has_request_context():
+        user = g.get("current_user")
+        return user.user_id if user is not None else None
+    return None
+
+
+def _encode(values: dict):
+    return json.dumps(values, default=str, sort_keys=True) if values else None
+
+
+def _snapshot(obj) -> dict:
+    state = inspect(obj)
+    return {
+        attr.key: ("***" if attr.key in MASKED_COLUMNS else attr.value)
+        for attr in state.attrs
+        if attr.key in state.mapper.columns
+    }
+
+
+def make_record(action_type, table_name, record_id, old=None, new=None, user_id=None) -> dict:
+    """Build one ``audit_logs`` row as a dict ready for Core insert."""
+    return {
+        "log_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "action_type": action_type,
+        "table_name": table_name,
+        "record_id": record_id,
+        "old_value": _encode(old),
+        "new_value": _encode(new),
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def _record_for(obj, verb, user_id):
+    mapper = inspect(obj).mapper
+    table = mapper.local_table.name
+    record_id = ",".join(str(v) for v in mapper.primary_key_from_instance(obj))
+    action = f"{type(obj).__name__} {verb}"
+    if verb == "Created":
+        return make_record(action, table, record_id, new=_snapshot(obj), user_id=user_id)
+    if verb == "Deleted":
+        return make_record(action, table, record_id, old=_snapshot(obj), user_id=user_id)
+    old, new = {}, {}
+    state = inspect(obj)
+    for column in mapper.column_attrs:
+        history = state.attrs[column.key].history
+        if not history.has_changes():
+            continue
+        masked = column.key in MASKED_COLUMNS
+        old[column.key] = "***" if masked else (history.deleted[0] if history.deleted else None)
+        new[column.key] = "***" if masked else (history.added[0] if history.added else None)
+    if not new:
+        return None
+    return make_record(action, table, record_id, old=old, new=new, user_id=user_id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture(session, flush_context):
+    user_id = _current_user_id()
+    records = []
+    for objects, verb in ((session.new, "Created"), (session.dirty, "Updated"), (session.deleted, "Deleted")):
+        for obj in objects:
+            if isinstance(obj, EXCLUDED):
+                continue
+            record = _record_for(obj, verb, user_id)
+            if record:
+                records.append(record)
+    record_after_commit(session, records)
+
+
+def record_after_commit(session, records):
+    """Queue ``records`` for the writer once ``session`` commits.
+
+    Use for changes made through Core statements, which skip the flush hook.
+    Records queued inside a SAVEPOINT are dropped if it rolls back.
+    """
+    if not records:
+        return
+    pending = session.info.get("audit_pending")
+    if pending is None:
+        pending = session.info["audit_pending"] = []
+
+        def submit():
+            writer.submit([record for _, batch in session.info.pop("audit_pending", []) for record in batch])
+
+        after_commit(session, submit)
+    pending.append((session.get_nested_transaction(), records))
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    discard_rolled_back(session, "audit_pending", previous_transaction)
+
+
+class AuditWriter:
+    """Queue audit records and insert them in batches from a daemon thread."""
+
+    def __init__(self, batch_size=500, flush_interval=1.0, maxsize=10000, put_timeout=0.5, sync=False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self.sync = sync
+        self.written = 0
+        self.inline_writes = 0
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def reset_after_fork(self):
+        """Threads don't survive fork; start fresh in the child process."""
+        self._reset()
+
+    def _write(self, records):
+        if not records:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(models.AuditLog.__table__), records)
+            self.written += len(records)
+        except Exception:  # never let auditing take the worker down
+            logger.exception("failed to write %d audit records", len(records))
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, records):
+        """Hand committed records to the writer."""
+        if self.sync:
+            self._write(records)
+            return
+        self._ensure_started()
+        for i, record in enumerate(records):
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                # Back-pressure: the producer pays for its own remaining rows
+                self.inline_writes += len(records) - i
+                self._write(records[i:])
+                return
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(batch)
+        for _ in batch:
+            self._queue.task_done()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._drain(first)
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        """Stop the thread and write anything still queued."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+            self._thread = None
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._drain(first)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "inline_writes": self.inline_writes,
+            "sync": self.sync,
+        }
+
+
+writer = AuditWriter(
+    batch_size=int(os.environ.get("AUDIT_BATCH_SIZE", "500")),
+    flush_interval=float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0")),
+    maxsize=int(os.environ.get("AUDIT_QUEUE_SIZE", "10000")),
+    sync=_truthy(os.environ.get("AUDIT_SYNC", "0")),
+)
+atexit.register(writer.stop)
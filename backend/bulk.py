@@ -0,0 +1,312 @@
+"""Bulk CSV/NDJSON import for batches, inventory and transactions.
+
+WHY: nightly ERP syncs push tens of thousands of rows, one HTTP call each.
+WHAT: closes #bulk-import
+HOW: add a spec to ``SPECS`` to support another table; remove the
+``/bulk`` routes to roll back.
+
+Rows are parsed straight off the request stream, checked against foreign
+key id sets loaded once per import and inserted with Core ``executemany``
+in chunks of ``CHUNK_SIZE``.
+"""
+
+import csv
+import io
+import json
+import uuid
+from dataclasses import dataclass, field
+from functools import cached_property
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import StatementError
+
+from . import models
+
+CHUNK_SIZE = 5000
+# Cap the error report so a completely broken file doesn't blow up the reply
+MAX_ERRORS = 1000
+
+
+def _to_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _to_int(value):
+    # int() would accept 2.7, True and "  3 " from NDJSON alike
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError("not an integer")
+    return int(value)
+
+
+def _to_count(value):
+    count = _to_int(value)
+    if count < 0:
+        raise ValueError("must not be negative")
+    return count
+
+
+def _to_positive(value):
+    quantity = _to_int(value)
+    if quantity <= 0:
+        raise ValueError("must be positive")
+    return quantity
+
+
+def _check_type(column, value, expected):
+    """Return ``value`` as ``expected`` (numbers become text) or raise ValueError.
+
+    NDJSON can carry objects, lists and booleans anywhere; catching them
+    here keeps them out of FK set lookups and the INSERT.
+    """
+    if value is None or (isinstance(value, expected) and not isinstance(value, bool)):
+        return value
+    if expected is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"invalid {column}: expected {expected.__name__}, got {type(value).__name__}")
+
+
+@dataclass
+class BulkSpec:
+    """Describe how raw records map onto one table."""
+
+    model: type
+    columns: tuple
+    required: tuple
+    # column -> ORM attribute whose values are the valid ids
+    foreign_keys: dict
+    converters: dict = field(default_factory=dict)
+    defaults: dict = field(default_factory=dict)
+    # columns whose FK may be NULL
+    nullable_fks: tuple = ()
+
+    @property
+    def pk(self):
+        return self.model.__table__.primary_key.columns.values()[0].name
+
+    @cached_property
+    def types(self) -> dict:
+        """Python type each column's value must have once converted."""
+        table = self.model.__table__
+        return {column: table.c[column].type.python_type for column in self.columns}
+
+
+SPECS = {
+    "batches": BulkSpec(
+        model=models.Batch,
+        columns=(
+            "batch_id", "product_id", "batch_number", "manufacturing_date",
+            "expiry_date", "manufacturing_site_name", "quality_control_status",
+        ),
+        required=("product_id", "batch_number"),
+        foreign_keys={"product_id": models.Product.product_id},
+        converters={"manufacturing_date": _to_date, "expiry_date": _to_date},
+        defaults={"quality_control_status": "Released"},
+    ),
+    "inventory": BulkSpec(
+        model=models.Inventory,
+        columns=(
+            "inventory_record_id", "organization_id", "product_id", "batch_id",
+            "quantity", "storage_condition",
+        ),
+        required=("organization_id", "product_id", "batch_id", "quantity"),
+        foreign_keys={
+            "organization_id": models.Organization.organization_id,
+            "product_id": models.Product.product_id,
+            "batch_id": models.Batch.batch_id,
+        },
+        converters={"quantity": _to_count},
+    ),
+    "transactions": BulkSpec(
+        model=models.Transaction,
+        columns=(
+            "transaction_id", "request_id", "product_id", "batch_id", "quantity",
+            "transaction_type", "source_org_id", "destination_org_id",
+            "transaction_date", "recorded_by_user_id", "notes",
+        ),
+        required=("product_id", "batch_id", "quantity", "transaction_type", "recorded_by_user_id"),
+        foreign_keys={
+            "request_id": models.Request.request_id,
+            "product_id": models.Product.product_id,
+            "batch_id": models.Batch.batch_id,
+            "source_org_id": models.Organization.organization_id,
+            "destination_org_id": models.Organization.organization_id,
+            "recorded_by_user_id": models.User.user_id,
+        },
+        converters={"quantity": _to_positive, "transaction_date": _to_datetime},
+        nullable_fks=("request_id", "source_org_id", "destination_org_id"),
+    ),
+}
+
+
+def iter_records(stream, content_type: str):
+    """Yield ``(line_no, record_or_exception)`` from a CSV or NDJSON stream.
+
+    A body that is not UTF-8 raises ``UnicodeDecodeError`` mid-iteration.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="strict", newline="")
+    if "csv" in (content_type or ""):
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Empty CSV cells mean "not provided"
+            yield reader.line_num, {k: v for k, v in record.items() if v != ""}
+        return
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_no, exc
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError("each line must be a JSON object")
+            continue
+        yield line_no, record
+
+
+# Writer failures that reject rows rather than the whole import: database
+# errors (StatementError covers IntegrityError and other DBAPI errors) and
+# ValueError, which writers raise for rows they refuse (``ledger.LedgerError``).
+REJECTED = (StatementError, ValueError)
+
+
+def _reason(exc) -> str:
+    return str(getattr(exc, "orig", None) or exc)
+
+
+def insert_rows(session, spec: BulkSpec, rows):
+    """Default writer: one Core ``executemany`` INSERT for the chunk."""
+    session.execute(insert(spec.model.__table__), rows)
+
+
+class BulkLoader:
+    """Validate and insert records for one ``BulkSpec``.
+
+    ``writer(session, spec, rows)`` persists each validated chunk; pass a
+    custom one when rows must go through another subsystem (e.g. the ledger).
+    """
+
+    def __init__(self, session, spec: BulkSpec, atomic: bool = False, defaults=None,
+                 writer=insert_rows):
+        self.session = session
+        self.spec = spec
+        self.atomic = atomic
+        self.defaults = {**spec.defaults, **(defaults or {})}
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self._seen_pks = set()
+        self._id_sets = {}
+        self._writer = writer
+
+    def _ids(self, column):
+        """Load each referenced id set once per import."""
+        attr = self.spec.foreign_keys[column]
+        key = (attr.class_, attr.key)
+        if key not in self._id_sets:
+            self._id_sets[key] = set(self.session.scalars(select(attr)))
+        return self._id_sets[key]
+
+    def _error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def _prepare(self, record):
+        """Return a full column dict for ``record`` or raise ValueError."""
+        spec = self.spec
+        row = {}
+        for column in spec.columns:
+            value = record.get(column)
+            if value is None:
+                value = self.defaults.get(column)
+            if value is not None and column in spec.converters:
+                try:
+                    value = spec.converters[column](value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"invalid {column}: {value!r}")
+            row[column] = _check_type(column, value, spec.types[column])
+        missing = [c for c in spec.required if row[c] is None]
+        if missing:
+            raise ValueError("missing " + ", ".join(missing))
+        for column in spec.foreign_keys:
+            value = row[column]
+            if value is None and column in spec.nullable_fks:
+                continue
+            if value not in self._ids(column):
+                raise ValueError(f"unknown {column}: {value}")
+        if row[spec.pk] is None:
+            row[spec.pk] = str(uuid.uuid4())
+        elif row[spec.pk] in self._seen_pks:
+            raise ValueError(f"duplicate {spec.pk} in upload: {row[spec.pk]}")
+        self._seen_pks.add(row[spec.pk])
+        return row
+
+    def _insert_chunk(self, chunk):
+        rows = [row for _, row in chunk]
+        if self.atomic:
+            try:
+                self._writer(self.session, self.spec, rows)
+            except REJECTED as exc:
+                self._error(chunk[0][0], f"chunk rejected: {_reason(exc)}")
+                return
+            self.inserted += len(rows)
+            return
+        try:
+            self._writer(self.session, self.spec, rows)
+            self.session.commit()
+            self.inserted += len(rows)
+            return
+        except REJECTED:
+            self.session.rollback()
+        # Fall back to row-at-a-time only for the chunk that failed
+        for line_no, row in chunk:
+            try:
+                self._writer(self.session, self.spec, [row])
+                self.session.commit()
+                self.inserted += 1
+            except REJECTED as exc:
+                self.session.rollback()
+                self._error(line_no, _reason(exc))
+
+    def load(self, records):
+        """Consume ``records`` from ``iter_records`` and return a report dict."""
+        chunk = []
+        for line_no, record in records:
+            if isinstance(record, Exception):
+                self._error(line_no, str(record))
+                continue
+            try:
+                chunk.append((line_no, self._prepare(record)))
+            except ValueError as exc:
+                self._error(line_no, str(exc))
+                continue
+            if len(chunk) >= CHUNK_SIZE:
+                # In atomic mode stop writing once the load is doomed
+                if not (self.atomic and self.failed):
+                    self._insert_chunk(chunk)
+                chunk = []
+        if chunk and not (self.atomic and self.failed):
+            self._insert_chunk(chunk)
+
+        if self.atomic:
+            if self.failed:
+                self.session.rollback()
+                self.inserted = 0
+            else:
+                self.session.commit()
+        return self.report()
+
+    def report(self):
+        return {
+            "table": self.spec.model.__tablename__,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "atomic": self.atomic,
+            "errors": self.errors,
+        }
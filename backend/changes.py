@@ -0,0 +1,153 @@
+"""Per-table change tracking for cache invalidation and ETags.
+
+WHY: caches and conditional GETs need to know when the rows behind them
+change, whether the write came from the ORM, a Core bulk insert or a
+background thread.
+WHAT: closes #analytics-cache, #conditional-get
+HOW: ``tracker.install(engine)`` hooks engine events; subscribe with
+``tracker.listeners.append(fn)`` where ``fn(tables)`` gets a set of names.
+
+DML tables are collected per connection and announced only once the
+transaction has committed: on the connection's next ``begin`` or when it
+is checked back into the pool, whichever comes first.
+
+Each transaction that writes a table also bumps that table's row in
+``table_versions`` within the transaction, so every worker (and every
+restart) agrees on a table's version; ETags are built from these. The bumps
+run just before the commit, in table-name order. Version rows are therefore
+locked only while committing, and always in the same order, so concurrent
+writers cannot deadlock on them. Versions are handed out in commit order.
+Columns defaulting to ``commit_seq`` hold ``PENDING_SEQ`` until then, and the
+same pre-commit step stamps this transaction's pending rows with the new
+version. ``change_seq`` on transactions and inventory uses this for exports.
+"""
+
+import threading
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String, column, event, insert, select, table, update
+from sqlalchemy.sql.dml import UpdateBase
+
+_PENDING = "changes_pending"
+_COMMITTED = "changes_committed"
+_STAMPED = "versions_stamped"
+_BUMPING = "versions_bumping"
+# change_seq of rows written by a transaction that has not committed yet
+PENDING_SEQ = -1
+
+VERSIONS_TABLE = "table_versions"
+# Lightweight handle; the mapped model lives in models.TableVersion
+_versions = table(
+    VERSIONS_TABLE,
+    column("table_name", String), column("version", Integer), column("updated_at", DateTime),
+)
+
+
+def stored_versions(conn, tables) -> dict:
+    """Return ``{table: (version, updated_at)}`` from ``table_versions``."""
+    rows = conn.execute(
+        select(_versions.c.table_name, _versions.c.version, _versions.c.updated_at)
+        .where(_versions.c.table_name.in_(list(tables)))
+    )
+    return {name: (version, updated_at) for name, version, updated_at in rows}
+
+
+def commit_seq(context):
+    """Column default/onupdate: a placeholder the commit turns into the table's new version.
+
+    Other transactions never see ``PENDING_SEQ`` rows (they are uncommitted),
+    so one constant marks this transaction's rows without any lock.
+    """
+    stamped = context.connection.info.setdefault(_STAMPED, {})
+    col = context.current_column
+    stamped.setdefault(col.table.name, set()).add(col.name)
+    return PENDING_SEQ
+
+
+def _persist_bumps(conn, names):
+    """Bump each table's version in name order and stamp its pending rows."""
+    now = datetime.utcnow()
+    stamped = conn.info.pop(_STAMPED, {})
+    for name in sorted(names):
+        result = conn.execute(
+            update(_versions)
+            .where(_versions.c.table_name == name)
+            .values(version=_versions.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:  # upgrade() pre-creates rows, so only for new tables
+            conn.execute(insert(_versions).values(table_name=name, version=1, updated_at=now))
+        columns = stamped.get(name)
+        if not columns:
+            continue
+        version = conn.execute(select(_versions.c.version).where(_versions.c.table_name == name)).scalar()
+        target = table(name, *(column(c, Integer) for c in columns))
+        for c in sorted(columns):
+            conn.execute(update(target).where(target.c[c] == PENDING_SEQ).values({c: version}))
+
+
+class ChangeTracker:
+    """In-process version counter per table plus change listeners."""
+
+    def __init__(self):
+        self.versions = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def version(self, name: str) -> int:
+        return self.versions.get(name, 0)
+
+    def bump(self, tables):
+        if not tables:
+            return
+        with self._lock:
+            for name in tables:
+                self.versions[name] = self.versions.get(name, 0) + 1
+        for listener in self.listeners:
+            listener(set(tables))
+
+    def _announce(self, info):
+        committed = info.pop(_COMMITTED, None)
+        if committed:
+            self.bump(committed)
+
+    def install(self, engine):
+        """Attach the tracking hooks to ``engine`` (and its pool)."""
+
+        @event.listens_for(engine, "before_execute")
+        def _before_execute(conn, clauseelement, multiparams, params, execution_options):
+            if not isinstance(clauseelement, UpdateBase) or conn.info.get(_BUMPING):
+                return
+            name = clauseelement.table.name
+            if name != VERSIONS_TABLE:
+                conn.info.setdefault(_PENDING, set()).add(name)
+
+        @event.listens_for(engine, "commit")
+        def _commit(conn):
+            # Runs before the DBAPI commit, inside the transaction
+            pending = conn.info.pop(_PENDING, None)
+            if pending:
+                conn.info[_BUMPING] = True
+                try:
+                    _persist_bumps(conn, pending)
+                finally:
+                    conn.info.pop(_BUMPING, None)
+                conn.info.setdefault(_COMMITTED, set()).update(pending)
+            conn.info.pop(_STAMPED, None)
+
+        @event.listens_for(engine, "rollback")
+        def _rollback(conn):
+            conn.info.pop(_STAMPED, None)
+            conn.info.pop(_PENDING, None)
+
+        @event.listens_for(engine, "begin")
+        def _begin(conn):
+            self._announce(conn.info)
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            connection_record.info.pop(_PENDING, None)
+            connection_record.info.pop(_STAMPED, None)
+            self._announce(connection_record.info)
+
+
+tracker = ChangeTracker()
@@ -0,0 +1,135 @@
+"""Conditional GET (ETag / Last-Modified) for read endpoints.
+
+WHY: dashboards poll list endpoints and every poll re-read and
+re-serialized rows that rarely change.
+WHAT: closes #conditional-get
+HOW: decorate a view with ``@conditional("batches", ...)`` below
+``require_auth``. The ETag is derived from the listed tables' rows in
+``table_versions`` (see ``backend.changes``), so a matching
+``If-None-Match`` gets a 304 after one primary-key lookup and no row
+loading. 200 bodies are cached per URL and version
+(CONDITIONAL_CACHE_SIZE entries, bodies up to CONDITIONAL_CACHE_MAX_BYTES).
+The negotiated mimetype is part of the ETag and responses carry
+``Vary: Accept``, as list endpoints pick JSON or NDJSON from ``Accept``.
+
+Last-Modified is sent for information only: it has one-second resolution,
+so revalidation relies on the ETag.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from .changes import stored_versions
+from .database import get_read_session
+from .version import VERSION
+
+CACHE_SIZE = int(os.environ.get("CONDITIONAL_CACHE_SIZE", "256"))
+CACHE_MAX_BYTES = int(os.environ.get("CONDITIONAL_CACHE_MAX_BYTES", str(1024 * 1024)))
+# Response headers that belong to the body and must be replayed from cache
+CACHED_HEADERS = ("X-Next-Cursor",)
+
+
+class BodyCache:
+    """Small thread-safe LRU of serialized response bodies."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+body_cache = BodyCache()
+
+
+def _stamp(tables, representation):
+    """Return ``(etag, last_modified)`` for the current versions of ``tables``.
+
+    ``representation`` (the negotiated mimetype) is part of the ETag, since
+    one URL serves JSON or NDJSON depending on ``Accept``.
+    """
+    versions = stored_versions(get_read_session().connection(), tables)
+    parts = [VERSION, str(representation)] + [f"{t}:{versions.get(t, (0, None))[0]}" for t in tables]
+    etag = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    modified = [v[1] for v in versions.values() if v[1] is not None]
+    return etag, max(modified) if modified else None
+
+
+def _not_modified(etag, last_modified):
+    resp = Response(status=304)
+    _set_validators(resp, etag, last_modified)
+    return resp
+
+
+def _set_validators(resp, etag, last_modified):
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    # Clients may keep the body but must revalidate before reusing it
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.vary.add("Accept")
+
+
+def conditional(*tables):
+    """Serve 304s and cached bodies for a GET view that reads ``tables``."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            representation = request.accept_mimetypes.best
+            etag, last_modified = _stamp(tables, representation)
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag, last_modified)
+
+            key = (request.full_path, representation, etag)
+            entry = body_cache.get(key)
+            if entry is not None:
+                body, mimetype, headers = entry
+                resp = Response(body, mimetype=mimetype, headers=headers)
+            else:
+                resp = make_response(func(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                if not resp.is_streamed:
+                    body = resp.get_data()
+                    if len(body) <= CACHE_MAX_BYTES:
+                        headers = {h: resp.headers[h] for h in CACHED_HEADERS if h in resp.headers}
+                        body_cache.put(key, (body, resp.mimetype, headers))
+            _set_validators(resp, etag, last_modified)
+            return resp
+
+        return wrapper
+
+    return decorator
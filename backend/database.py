@@ -1,24 +1,225 @@
 """Database setup and session management."""
 
-from sqlalchemy import create_engine
+from flask import g, has_request_context
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 import os
 
+from .changes import tracker
+from .metrics import TimedQueuePool
+
 # WHY: let deployments configure the DB without changing code
 # WHAT: closes #config-db-url
 # HOW: extend by using a PostgreSQL URI; roll back by hardcoding
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///pharma.db")
 
+# WHY: size the connection pool to the number of worker threads
+# WHAT: closes #pool-tuning
+# HOW: set the DB_POOL_* variables; unset them to fall back to these defaults
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+# WHY: concurrent writers hit "database is locked" and reads queued behind them
+# WHAT: closes #sqlite-production
+# HOW: SQLITE_PROFILE=production (default) enables WAL and the pragmas below
+# on file databases and opens a separate read-only pool for GET endpoints;
+# SQLITE_PROFILE=default keeps SQLite's stock settings and a single engine.
+# DATABASE_READ_URL points reads at a replica on other backends.
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "production")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KB = int(os.environ.get("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.environ.get("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", str(POOL_SIZE)))
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def _is_file_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite" and not _is_memory_sqlite(url)
+
+
+def _engine_options(url: str, pool_size: int = POOL_SIZE) -> dict:
+    """Return ``create_engine`` keyword arguments for ``url``."""
+    options = {"echo": False, "future": True, "pool_pre_ping": POOL_PRE_PING}
+    if _is_memory_sqlite(url):
+        # In-memory SQLite lives in a single connection; there is no pool to size
+        return options
+    options.update(
+        poolclass=TimedQueuePool,  # QueuePool that records checkout waits
+        pool_size=pool_size,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+    return options
+
+
+def _sqlite_pragmas(read_only: bool = False):
+    """Return a ``connect`` listener applying the production pragmas."""
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # WAL is persistent; readers inherit it from the database file
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return on_connect
+
+
+SQLITE_PRODUCTION = SQLITE_PROFILE == "production" and _is_file_sqlite(DATABASE_URL)
+
 # Engine created for configured database (defaults to SQLite)
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+if SQLITE_PRODUCTION:
+    event.listen(engine, "connect", _sqlite_pragmas())
+# Announce committed writes per table so caches can invalidate
+tracker.install(engine)
+
+# Reads go to their own pool: in WAL mode they see the last commit without
+# waiting for the writer. Elsewhere they share ``engine`` unless a replica
+# URL is configured.
+if DATABASE_READ_URL:
+    read_engine = create_engine(DATABASE_READ_URL, **_engine_options(DATABASE_READ_URL, READ_POOL_SIZE))
+elif SQLITE_PRODUCTION:
+    read_engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, READ_POOL_SIZE))
+    event.listen(read_engine, "connect", _sqlite_pragmas(read_only=True))
+else:
+    read_engine = engine
 
 # Session factory for database operations
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
 
 
+def after_commit(session, callback):
+    """Run ``callback()`` once ``session`` commits; drop it on rollback.
+
+    Used to invalidate caches only after the write is durable. A callback
+    registered inside a SAVEPOINT is also dropped when that savepoint rolls
+    back.
+    """
+    session.info.setdefault("after_commit", []).append((session.get_nested_transaction(), callback))
+
+
+def rolled_back(savepoint, transaction) -> bool:
+    """True if ``savepoint`` is ``transaction`` or was opened inside it."""
+    while savepoint is not None:
+        if savepoint is transaction:
+            return True
+        savepoint = savepoint.parent
+    return False
+
+
+def discard_rolled_back(session, key, previous_transaction):
+    """Drop ``(savepoint, item)`` entries under ``session.info[key]`` undone by a rollback."""
+    if not session.in_transaction():
+        session.info.pop(key, None)
+    elif previous_transaction.nested and key in session.info:
+        kept = [entry for entry in session.info[key] if not rolled_back(entry[0], previous_transaction)]
+        if kept:
+            session.info[key] = kept
+        else:
+            del session.info[key]
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit(session):
+    if session.get_nested_transaction() is not None:
+        # Releasing a SAVEPOINT fires this too; wait for the outer commit
+        return
+    for _, callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_after_commit(session, previous_transaction):
+    discard_rolled_back(session, "after_commit", previous_transaction)
+
+
 def init_db():
-    """Create tables based on ORM models."""
-    from . import models  # Import models for metadata
-    Base.metadata.create_all(bind=engine)
+    """Bring the schema up to date; a no-op beyond one SELECT when current."""
+    from .migrations import ensure_schema
+    return ensure_schema(engine)
+
+
+def get_session():
+    """Return the session for the current request, opening it on first use.
+
+    Auth and the view share this session; ``close_session`` releases it when
+    the request ends. Outside a request a fresh session is returned and the
+    caller must close it.
+    """
+    if not has_request_context():
+        return SessionLocal()
+    if "db_session" not in g:
+        g.db_session = SessionLocal()
+    return g.db_session
+
+
+def get_read_session():
+    """Return the request's read-only session (``get_session`` without a split).
+
+    Use it in handlers that never write; it may lag the writer by the
+    replica delay when DATABASE_READ_URL points at a replica.
+    """
+    if read_engine is engine:
+        return get_session()
+    if not has_request_context():
+        return ReadSessionLocal()
+    if "db_read_session" not in g:
+        g.db_read_session = ReadSessionLocal()
+    return g.db_read_session
+
+
+def close_session(exc=None):
+    """Teardown hook: roll back on error and return the connections to the pool."""
+    for key in ("db_session", "db_read_session"):
+        session = g.pop(key, None)
+        if session is None:
+            continue
+        if exc is not None:
+            session.rollback()
+        session.close()
+
+
+def pool_stats(bind=None) -> dict:
+    """Return a snapshot of connection pool usage for capacity planning."""
+    if bind is None:
+        stats = pool_stats(engine)
+        if read_engine is not engine:
+            stats["read"] = pool_stats(read_engine)
+        return stats
+    pool = bind.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=POOL_MAX_OVERFLOW,
+            timeout=POOL_TIMEOUT,
+            recycle=POOL_RECYCLE,
+            pre_ping=POOL_PRE_PING,
+        )
+    else:
+        stats["status"] = pool.status()
+    return stats
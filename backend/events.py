@@ -0,0 +1,155 @@
+"""Change feed of request, approval and stock events over server-sent events.
+
+WHY: dashboards and integrations polled list endpoints to notice that a
+request was approved or stock arrived, multiplying read load.
+WHAT: closes #change-feed
+HOW: writers call ``publish_after_commit(session, type, orgs, data)``; once
+the session commits, the event gets the next id from the broker and is
+delivered to ``GET /api/events`` subscribers whose ``org`` filter
+intersects ``orgs``. A reconnecting client sends ``Last-Event-ID`` (or
+``?last_event_id=``) and gets everything it missed that is still held.
+
+``LocalBroker`` keeps the last EVENTS_BUFFER_SIZE events in memory, so it
+only sees events published by its own process. With several gunicorn
+workers, point EVENTS_BROKER at a ``module:Class`` implementing ``Broker``
+over a shared transport; ``run.py`` refuses to start more than one worker
+on the local broker. When the requested id is no longer held (buffer
+overflow or a restart) the stream starts with a ``reset`` event and the
+client should reload its state through the REST endpoints.
+"""
+
+import importlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import NamedTuple
+
+from .database import after_commit
+
+BUFFER_SIZE = int(os.environ.get("EVENTS_BUFFER_SIZE", "10000"))
+KEEPALIVE_SECONDS = float(os.environ.get("EVENTS_KEEPALIVE_SECONDS", "15"))
+# Streams end after this long so worker threads are recycled; clients reconnect
+STREAM_SECONDS = float(os.environ.get("EVENTS_STREAM_SECONDS", "300"))
+RETRY_MS = 3000
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    orgs: frozenset
+    data: dict
+    timestamp: float
+
+    def matches(self, orgs, types) -> bool:
+        return (orgs is None or not self.orgs.isdisjoint(orgs)) and (types is None or self.type in types)
+
+    def sse(self) -> str:
+        body = json.dumps({"type": self.type, "timestamp": self.timestamp, **self.data})
+        return f"id: {self.id}\nevent: {self.type}\ndata: {body}\n\n"
+
+
+class Broker(ABC):
+    """Publish/subscribe interface the SSE endpoint relies on."""
+
+    @abstractmethod
+    def publish(self, type: str, orgs, data: dict) -> Event:
+        """Assign the next id to a new event and deliver it to waiters."""
+
+    @abstractmethod
+    def since(self, last_id: int | None):
+        """Return ``(events after last_id, complete)``.
+
+        ``complete`` is False when some events after ``last_id`` are no
+        longer held, so the subscriber has missed changes.
+        """
+
+    @abstractmethod
+    def wait(self, last_id: int | None, timeout: float) -> bool:
+        """Block until an event newer than ``last_id`` exists or ``timeout`` passes."""
+
+    @abstractmethod
+    def latest_id(self) -> int:
+        """Id of the newest event published, 0 before the first."""
+
+
+class LocalBroker(Broker):
+    """In-process ring buffer of the most recent events."""
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self._events = deque(maxlen=size)
+        self._next_id = 1
+        self._cond = threading.Condition()
+
+    def publish(self, type, orgs, data):
+        with self._cond:
+            event = Event(self._next_id, type, frozenset(o for o in orgs if o), data, time.time())
+            self._next_id += 1
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def latest_id(self):
+        return self._next_id - 1
+
+    def since(self, last_id):
+        with self._cond:
+            if last_id is None:
+                return [], True
+            if last_id > self.latest_id():
+                # An id from before a restart: everything may have changed
+                return list(self._events), False
+            oldest = self._events[0].id if self._events else self._next_id
+            # deque ids are contiguous, so slice instead of scanning
+            skip = max(0, last_id + 1 - oldest)
+            return [self._events[i] for i in range(skip, len(self._events))], last_id + 1 >= oldest
+
+    def wait(self, last_id, timeout):
+        with self._cond:
+            return self._cond.wait_for(lambda: self.latest_id() > (last_id or 0), timeout)
+
+
+def load_broker(spec: str) -> Broker:
+    """``local`` or ``package.module:ClassName`` of a ``Broker`` subclass."""
+    if spec == "local":
+        return LocalBroker()
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+broker = load_broker(os.environ.get("EVENTS_BROKER", "local"))
+
+
+def publish_after_commit(session, type: str, orgs, data: dict):
+    """Publish an event once ``session`` commits; drop it on rollback."""
+    after_commit(session, lambda: broker.publish(type, orgs, data))
+
+
+def stream(last_id, orgs=None, types=None, duration: float = STREAM_SECONDS):
+    """Yield SSE text for events after ``last_id`` matching ``orgs``/``types``.
+
+    Runs without the request context, so callers resolve filters first.
+    """
+    yield f"retry: {RETRY_MS}\n\n"
+    if last_id is None:
+        last_id = broker.latest_id()
+    deadline = time.monotonic() + duration
+    events, complete = broker.since(last_id)
+    while True:
+        if not complete:
+            yield f"event: reset\ndata: {json.dumps({'last_event_id': last_id})}\n\n"
+            last_id = events[0].id - 1 if events else broker.latest_id()
+        for event in events:
+            last_id = event.id
+            if event.matches(orgs, types):
+                yield event.sse()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not broker.wait(last_id, min(KEEPALIVE_SECONDS, remaining)):
+            yield ": keepalive\n\n"
+            events, complete = [], True
+            continue
+        events, complete = broker.since(last_id)
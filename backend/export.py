@@ -0,0 +1,275 @@
+"""Chunked CSV/Parquet export of transactions and inventory.
+
+WHY: finance and planning pulled full history through unpaginated ORM
+queries that loaded whole tables into memory.
+WHAT: closes #columnar-export
+HOW: ``GET /api/exports/<table>`` or ``python -m backend.export <table>``.
+Rows are read in keyset chunks of EXPORT_CHUNK_SIZE and written as they
+arrive (Parquet one row group per chunk, needs pyarrow), so memory is
+bounded by the chunk size.
+
+Incremental exports use ``change_seq`` as the watermark: every write
+stamps its rows with the table's ``table_versions`` counter, which writers
+take in commit order (see ``backend.changes``). An export covers rows up
+to the counter's committed value, reports it, and a later export with
+that value as ``after`` gets exactly the rows committed since, however
+long their transactions ran. Timestamps are not used because a row's
+``created_at`` is set when it is written, not when it commits. The CLI
+keeps watermarks in a ``--state`` file; ISO timestamps saved by earlier
+versions are still accepted as ``after`` for one run.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, Integer, and_, or_, select
+
+from . import models
+from .changes import stored_versions
+
+CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "10000"))
+FORMATS = ("csv", "parquet")
+
+
+class ExportError(ValueError):
+    """Raised for an unknown table or format, or a missing dependency."""
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """Describe how one table is filtered and chunked for export."""
+
+    model: type
+    columns: tuple
+    # Table version stamped on write; orders chunks and watermarks
+    watermark: str
+    # Insert/update time that watermarks were before ``change_seq``
+    legacy_watermark: str
+    # Business date filtered by ``since`` / ``until``
+    date_column: str
+    # A row matches ``org`` when any of these columns equals it
+    org_columns: tuple
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+    @property
+    def pk(self):
+        return self.table.primary_key.columns.values()[0]
+
+
+EXPORTS = {
+    "transactions": ExportSpec(
+        models.Transaction,
+        ("transaction_id", "request_id", "product_id", "batch_id", "quantity", "transaction_type",
+         "source_org_id", "destination_org_id", "transaction_date", "recorded_by_user_id", "created_at"),
+        watermark="change_seq",
+        legacy_watermark="created_at",
+        date_column="transaction_date",
+        org_columns=("source_org_id", "destination_org_id"),
+    ),
+    "inventory": ExportSpec(
+        models.Inventory,
+        ("inventory_record_id", "organization_id", "product_id", "batch_id", "quantity",
+         "storage_condition", "last_updated_at"),
+        watermark="change_seq",
+        legacy_watermark="last_updated_at",
+        date_column="last_updated_at",
+        org_columns=("organization_id",),
+    ),
+}
+
+
+def get_spec(table: str) -> ExportSpec:
+    try:
+        return EXPORTS[table]
+    except KeyError:
+        raise ExportError(f"unknown export table: {table}") from None
+
+
+def high_water_mark(conn, spec) -> int:
+    """Upper watermark bound: the table's last committed version."""
+    version = stored_versions(conn, [spec.table.name]).get(spec.table.name)
+    return version[0] if version else 0
+
+
+def parse_after(value):
+    """``after`` as a ``change_seq`` int, or a legacy ISO timestamp."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, int) or value.isdigit():
+        return int(value)
+    return datetime.fromisoformat(value)
+
+
+def iter_chunks(conn, spec, *, since=None, until=None, org=None, after=None, upto=None,
+                chunk_size=CHUNK_SIZE):
+    """Yield lists of row tuples (in ``spec.columns`` order) one chunk at a time.
+
+    ``after``/``upto`` bound the watermark column (exclusive/inclusive);
+    chunks are walked by ``(watermark, pk)`` so no OFFSET scans are needed.
+    A datetime ``after`` filters on the legacy timestamp column instead.
+    """
+    t = spec.table
+    mark, pk = t.c[spec.watermark], spec.pk
+    base = select(*(t.c[c] for c in spec.columns), mark.label("_mark"), pk.label("_pk"))
+    if since:
+        base = base.where(t.c[spec.date_column] >= since)
+    if until:
+        base = base.where(t.c[spec.date_column] <= until)
+    if org:
+        base = base.where(or_(*(t.c[c] == org for c in spec.org_columns)))
+    if isinstance(after, datetime):
+        base = base.where(t.c[spec.legacy_watermark] > after)
+    elif after is not None:
+        base = base.where(mark > after)
+    if upto is not None:
+        base = base.where(mark <= upto)
+    base = base.where(mark.isnot(None)).order_by(mark, pk).limit(chunk_size)
+
+    last = None
+    while True:
+        query = base if last is None else base.where(
+            or_(mark > last[0], and_(mark == last[0], pk > last[1]))
+        )
+        rows = conn.execute(query).all()
+        if not rows:
+            return
+        last = (rows[-1]._mark, rows[-1]._pk)
+        yield [tuple(row[:-2]) for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def _csv_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def iter_csv(chunks, columns):
+    """Yield CSV text, one block per chunk, starting with the header."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([_csv_value(v) for v in row] for row in chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def write_parquet(chunks, spec, sink) -> int:
+    """Write chunks to ``sink`` (path or binary file) as Parquet row groups.
+
+    The Arrow schema comes from the table's column types, so every row
+    group agrees even when a chunk has a column that is entirely NULL.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("parquet export requires pyarrow (pip install pyarrow)") from None
+
+    schema = pa.schema([(c, _arrow_type(pa, spec.table.c[c])) for c in spec.columns])
+    rows = 0
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            rows += len(chunk)
+    return rows
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _load_state(path):
+    if path and os.path.exists(path):
+        with open(path) as fh:
+            return json.load(fh)
+    return {}
+
+
+def _state_key(table, org, since, until):
+    return f"{table}|org={org or ''}|since={since or ''}|until={until or ''}"
+
+
+def main(argv=None):
+    from .database import read_engine
+
+    parser = argparse.ArgumentParser(prog="python -m backend.export", description="Export a table in chunks.")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", required=True, help="output file path")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="business date range start (inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="business date range end (inclusive)")
+    parser.add_argument("--org", help="only rows touching this organization")
+    parser.add_argument("--state", help="JSON file holding watermarks; export only rows newer than the last run")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    spec = get_spec(args.table)
+    state = _load_state(args.state)
+    key = _state_key(args.table, args.org, args.since, args.until)
+    after = parse_after(state.get(key)) if args.state else None
+
+    rows = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    with read_engine.connect() as conn:
+        upto = high_water_mark(conn, spec)
+        chunks = counted(iter_chunks(
+            conn, spec, since=args.since, until=args.until, org=args.org,
+            after=after, upto=upto, chunk_size=args.chunk_size,
+        ))
+        try:
+            if args.format == "parquet":
+                write_parquet(chunks, spec, args.out)
+            else:
+                with open(args.out, "w", newline="") as fh:
+                    for block in iter_csv(chunks, spec.columns):
+                        fh.write(block)
+        except ExportError as exc:
+            print(exc, file=sys.stderr)
+            return 2
+
+    if args.state:
+        state[key] = upto
+        with open(args.state, "w") as fh:
+            json.dump(state, fh, indent=2)
+    print(f"exported {rows} {args.table} row(s) to {args.out}; watermark {upto}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Closure table for the organization hierarchy.
+
+WHY: "everything under this CFA" needed one self-join per level.
+WHAT: closes #org-closure-table
+HOW: rows are kept current by mapper events on ``Organization`` inserts and
+re-parenting; ``rebuild`` recomputes the table from parent links.
+
+Subtree queries become a single indexed join on ``organization_closure``.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import delete, event, func, insert, inspect, literal, select
+
+from . import models
+
+_c = models.OrganizationClosure.__table__
+
+
+class HierarchyError(Exception):
+    """Raised when a re-parent would create a cycle."""
+
+
+def subtree(org_id: str):
+    """Select the ids of ``org_id`` and all its descendants."""
+    return select(_c.c.descendant_id).where(_c.c.ancestor_id == org_id)
+
+
+def add_node(conn, org_id: str, parent_id: str | None):
+    """Insert closure rows for a new leaf organization."""
+    conn.execute(insert(_c).values(ancestor_id=org_id, descendant_id=org_id, depth=0))
+    if parent_id:
+        conn.execute(
+            insert(_c).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(_c.c.ancestor_id, literal(org_id), _c.c.depth + 1)
+                .where(_c.c.descendant_id == parent_id),
+            )
+        )
+
+
+def is_descendant(conn, org_id: str, candidate: str) -> bool:
+    """True if ``candidate`` is ``org_id`` or below it."""
+    return conn.execute(
+        select(func.count()).select_from(_c)
+        .where(_c.c.ancestor_id == org_id, _c.c.descendant_id == candidate)
+    ).scalar() > 0
+
+
+def move_subtree(conn, org_id: str, new_parent_id: str | None):
+    """Re-attach ``org_id`` and its descendants under ``new_parent_id``."""
+    if new_parent_id and is_descendant(conn, org_id, new_parent_id):
+        raise HierarchyError(f"{new_parent_id} is inside the subtree of {org_id}")
+    descendants = select(_c.c.descendant_id).where(_c.c.ancestor_id == org_id)
+    # Drop links from outside ancestors into the moving subtree
+    conn.execute(
+        delete(_c)
+        .where(_c.c.descendant_id.in_(descendants.scalar_subquery()))
+        .where(_c.c.ancestor_id.not_in(descendants.scalar_subquery()))
+    )
+    if new_parent_id:
+        above = select(_c.c.ancestor_id, _c.c.depth).where(_c.c.descendant_id == new_parent_id).subquery()
+        below = select(_c.c.descendant_id, _c.c.depth).where(_c.c.ancestor_id == org_id).subquery()
+        conn.execute(
+            insert(_c).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+                .select_from(above.join(below, literal(True))),
+            )
+        )
+
+
+def rebuild(conn) -> int:
+    """Recompute the whole closure table from ``parent_organization_id``."""
+    org = models.Organization.__table__
+    parents = dict(conn.execute(select(org.c.organization_id, org.c.parent_organization_id)).all())
+    children = defaultdict(list)
+    for child, parent in parents.items():
+        if parent in parents:
+            children[parent].append(child)
+    rows = []
+    for org_id in parents:
+        # Walk down from each org; depth-first with explicit stack
+        stack = [(org_id, 0)]
+        seen = set()
+        while stack:
+            node, depth = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            rows.append({"ancestor_id": org_id, "descendant_id": node, "depth": depth})
+            stack.extend((child, depth + 1) for child in children[node])
+    conn.execute(delete(_c))
+    if rows:
+        conn.execute(insert(_c), rows)
+    return len(rows)
+
+
+def needs_backfill(conn) -> bool:
+    """True when organizations exist but the closure table is empty."""
+    org = models.Organization.__table__
+    has_orgs = conn.execute(select(org.c.organization_id).limit(1)).first() is not None
+    has_rows = conn.execute(select(_c.c.ancestor_id).limit(1)).first() is not None
+    return has_orgs and not has_rows
+
+
+@event.listens_for(models.Organization, "after_insert")
+def _on_insert(mapper, connection, target):
+    add_node(connection, target.organization_id, target.parent_organization_id)
+
+
+@event.listens_for(models.Organization, "after_update")
+def _on_update(mapper, connection, target):
+    history = inspect(target).attrs.parent_organization_id.history
+    if history.has_changes():
+        move_subtree(connection, target.organization_id, target.parent_organization_id)
@@ -0,0 +1,194 @@
+"""Idempotency-Key support for POST endpoints.
+
+WHY: integrations retry POSTs on timeout and every retry inserted another
+row under a fresh uuid, leaving duplicates to reconcile by hand.
+WHAT: closes #idempotency-keys
+HOW: decorate a view with ``@idempotent`` below ``require_auth``. A request
+with an ``Idempotency-Key`` header first inserts a claim row keyed on
+(user, key) in the view's own session, so the claim commits or rolls back
+together with the view's writes. The response (any status below 500) is
+then stored on that row and replayed, with ``Idempotent-Replayed: true``,
+to retries with the same key and body. A view that rolled back before
+answering (a 409 for insufficient stock, say) loses its claim with the
+rollback, so the outcome is stored on a fresh row instead. A 5xx releases
+the key so a retry runs again.
+
+Concurrent retries race on the claim's primary key: one runs the view, the
+others get 409 until it has finished and the replay afterwards. Views
+commit their own work, so the claim may commit before the response is
+stored; if the process dies in between, the claim is only held for
+IDEMPOTENCY_LEASE_SECONDS, after which a retry takes the key over and
+runs the view again. Reusing a key for a different request gets 422. Keys
+expire after IDEMPOTENCY_TTL_SECONDS (default one day); expired rows are
+deleted while claiming new keys, at most once every
+IDEMPOTENCY_PURGE_SECONDS.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, g, jsonify, make_response, request
+from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from . import models
+from .database import get_session
+
+HEADER = "Idempotency-Key"
+TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+PURGE_SECONDS = float(os.environ.get("IDEMPOTENCY_PURGE_SECONDS", "300"))
+# A claim still without a response after this long is taken over by a retry
+LEASE_SECONDS = float(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+logger = logging.getLogger(__name__)
+
+_table = models.IdempotencyKey.__table__
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def fingerprint() -> str:
+    """Hash of the current request's method, path, query string and body."""
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.full_path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def purge_expired(session) -> int:
+    """Delete expired keys in ``session``'s transaction; return how many."""
+    return session.execute(delete(_table).where(_table.c.expires_at < datetime.utcnow())).rowcount
+
+
+def _purge_due() -> bool:
+    global _last_purge
+    now = time.monotonic()
+    with _purge_lock:
+        if now - _last_purge < PURGE_SECONDS:
+            return False
+        _last_purge = now
+        return True
+
+
+def _claim(session, user_id, key, digest):
+    """Return ``(True, None)`` once the claim row is inserted, else ``(False, row)``.
+
+    ``row`` is the live row holding the key, or None if it kept vanishing
+    under us (another request rolled back between our insert and select).
+    """
+    match = and_(_table.c.user_id == user_id, _table.c.idempotency_key == key)
+    row = None
+    for _ in range(3):
+        now = datetime.utcnow()
+        try:
+            session.execute(insert(_table).values(
+                user_id=user_id, idempotency_key=key, fingerprint=digest,
+                created_at=now, expires_at=now + timedelta(seconds=TTL_SECONDS),
+            ))
+        except IntegrityError:
+            # Nothing but the claim has been written yet, so this is safe
+            session.rollback()
+        else:
+            if _purge_due():
+                purge_expired(session)
+            return True, None
+        row = session.execute(select(_table).where(match)).first()
+        if row is None:
+            continue
+        if row.response_status is None and row.created_at < now - timedelta(seconds=LEASE_SECONDS):
+            # Abandoned claim: its request died before storing a response
+            session.execute(delete(_table).where(
+                match, _table.c.response_status.is_(None), _table.c.created_at == row.created_at,
+            ))
+            continue
+        if row.expires_at >= now:
+            return False, row
+        session.execute(delete(_table).where(match, _table.c.expires_at < now))
+    return False, row
+
+
+def _store(session, user_id, key, digest, resp):
+    """Save ``resp`` as the key's outcome, re-creating the claim if the view rolled it back."""
+    outcome = {
+        "response_status": resp.status_code,
+        "response_body": resp.get_data(as_text=True),
+        "response_mimetype": resp.mimetype,
+    }
+    match = and_(_table.c.user_id == user_id, _table.c.idempotency_key == key, _table.c.fingerprint == digest)
+    if session.execute(update(_table).where(match).values(**outcome)).rowcount:
+        return
+    now = datetime.utcnow()
+    session.execute(insert(_table).values(
+        user_id=user_id, idempotency_key=key, fingerprint=digest,
+        created_at=now, expires_at=now + timedelta(seconds=TTL_SECONDS), **outcome,
+    ))
+
+
+def _release(session, user_id, key, digest):
+    """Drop our claim, even if the view already committed it."""
+    session.rollback()
+    try:
+        session.execute(delete(_table).where(
+            _table.c.user_id == user_id, _table.c.idempotency_key == key,
+            _table.c.fingerprint == digest, _table.c.response_status.is_(None),
+        ))
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        logger.warning("could not release %s %r; it frees up after the lease", HEADER, key, exc_info=True)
+
+
+def _replay(row, digest):
+    if row is not None and row.fingerprint != digest:
+        return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+    if row is None or row.response_status is None:
+        resp = jsonify({"error": f"a request with this {HEADER} is still in progress"})
+        resp.status_code = 409
+        resp.headers["Retry-After"] = "1"
+        return resp
+    resp = Response(row.response_body, status=row.response_status, mimetype=row.response_mimetype)
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def idempotent(func):
+    """Run ``func`` at most once per ``Idempotency-Key`` and replay its response."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return func(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters"}), 400
+
+        session, user_id, digest = get_session(), g.current_user.user_id, fingerprint()
+        claimed, row = _claim(session, user_id, key, digest)
+        if not claimed:
+            return _replay(row, digest)
+
+        try:
+            resp = make_response(func(*args, **kwargs))
+        except Exception:
+            _release(session, user_id, key, digest)
+            raise
+        if resp.status_code >= 500:
+            # Release the key (and anything uncommitted) so a retry runs again
+            _release(session, user_id, key, digest)
+            return resp
+        try:
+            _store(session, user_id, key, digest, resp)
+            session.commit()
+        except SQLAlchemyError:
+            # The view's work stands; the lease lets a retry take the key over
+            session.rollback()
+            logger.warning("could not store the response for %s %r", HEADER, key, exc_info=True)
+        return resp
+
+    return wrapper
@@ -0,0 +1,358 @@
+"""Stock ledger: keep ``Inventory`` in step with ``Transaction`` history.
+
+WHY: on-hand stock could only be found by re-aggregating every transaction.
+WHAT: closes #stock-ledger
+HOW: record movements through ``record_transaction`` / ``apply`` so each
+one adjusts the per-(org, batch) balance in the same DB transaction; run
+``python -m backend.ledger verify`` to report drift and ``rebuild`` to
+recompute balances from history. Balances from before the ledger get an
+opening adjustment when the schema is upgraded (``record_opening_balances``).
+
+``Inventory`` is the materialized balance (one row per org and batch).
+Debit types reduce the source organization's stock, credit types increase
+the destination's; other types (quality holds etc.) do not move stock.
+"""
+
+import sys
+import uuid
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, literal, select, tuple_, union_all, update
+
+from .database import after_commit
+from . import models
+
+ADJUST_ADD = "Inventory Adjustment (Add)"
+ADJUST_SUBTRACT = "Inventory Adjustment (Subtract)"
+DEBIT_TYPES = ("Dispatch", "Return Out", ADJUST_SUBTRACT)
+CREDIT_TYPES = ("Receipt", "Return In", ADJUST_ADD)
+
+
+# Schema version whose upgrade records opening balances for pre-ledger stock
+OPENING_BALANCES_VERSION = 9
+OPENING_NOTE = "Opening balance"
+
+# Callables taking the ``deltas()`` dict, run after the balances commit
+listeners = []
+
+
+class LedgerError(ValueError):
+    """Raised when a movement would take a balance below zero."""
+
+
+def _get(txn, name):
+    return txn[name] if isinstance(txn, dict) else getattr(txn, name)
+
+
+def deltas(txns) -> dict:
+    """Aggregate ``{(org, batch): [product_id, delta]}`` for ``txns``."""
+    out = {}
+    for txn in txns:
+        kind = _get(txn, "transaction_type")
+        if kind in DEBIT_TYPES:
+            org, sign = _get(txn, "source_org_id"), -1
+        elif kind in CREDIT_TYPES:
+            org, sign = _get(txn, "destination_org_id"), 1
+        else:
+            continue
+        if org is None:
+            continue
+        key = (org, _get(txn, "batch_id"))
+        entry = out.setdefault(key, [_get(txn, "product_id"), 0])
+        entry[1] += sign * int(_get(txn, "quantity"))
+    return out
+
+
+_inventory = models.Inventory.__table__
+_add_stmt = (
+    update(_inventory)
+    .where(_inventory.c.organization_id == bindparam("k_org"))
+    .where(_inventory.c.batch_id == bindparam("k_batch"))
+    .values(
+        quantity=_inventory.c.quantity + bindparam("k_delta"),
+        last_updated_at=bindparam("k_now"),
+    )
+)
+# Debits check the balance in the UPDATE itself, so concurrent movements
+# cannot both pass a separate read and overdraw the same stock
+_debit_stmt = _add_stmt.where(_inventory.c.quantity + bindparam("k_delta") >= 0)
+
+
+def apply(session, txns):
+    """Apply ``txns`` to the materialized balances within ``session``.
+
+    Deltas are summed per (org, batch) first, so a chunk of thousands of
+    movements costs one UPDATE per touched balance plus inserts for new ones.
+    Raises ``LedgerError`` if a net debit exceeds the stock held; the caller
+    rolls back.
+    """
+    changes = deltas(txns)
+    if not changes:
+        return changes
+    now = datetime.utcnow()
+    missing = []
+    for (org, batch), (product, delta) in changes.items():
+        if not delta:
+            continue
+        params = {"k_org": org, "k_batch": batch, "k_delta": delta, "k_now": now}
+        if delta < 0:
+            if session.execute(_debit_stmt, params).rowcount != 1:
+                available = balance(session, org, batch)
+                raise LedgerError(f"{org} holds {available} of batch {batch}, cannot move {-delta}")
+            continue
+        result = session.execute(_add_stmt, params)
+        if result.rowcount == 0:
+            missing.append(
+                {
+                    "inventory_record_id": str(uuid.uuid4()),
+                    "organization_id": org,
+                    "product_id": product,
+                    "batch_id": batch,
+                    "quantity": delta,
+                    "last_updated_at": now,
+                }
+            )
+    if missing:
+        session.execute(insert(_inventory), missing)
+    for listener in listeners:
+        after_commit(session, lambda listener=listener: listener(changes))
+    return changes
+
+
+def balance(session, organization_id: str, batch_id: str) -> int:
+    """Return on-hand quantity via the (org, batch) unique index."""
+    qty = session.execute(
+        select(_inventory.c.quantity)
+        .where(_inventory.c.organization_id == organization_id)
+        .where(_inventory.c.batch_id == batch_id)
+    ).scalar()
+    return qty or 0
+
+
+def record_transaction(session, **fields) -> models.Transaction:
+    """Add a ``Transaction`` and apply it; reject movements that overdraw stock."""
+    fields.setdefault("transaction_id", str(uuid.uuid4()))
+    txn = models.Transaction(**fields)
+    session.add(txn)
+    apply(session, [txn])
+    return txn
+
+
+def set_quantities(session, rows, user_id: str) -> list:
+    """Bring balances to the counted quantities in ``rows`` via adjustments.
+
+    Each row needs ``organization_id``, ``product_id``, ``batch_id`` and
+    ``quantity``. The difference from the current balance is recorded as an
+    ``Inventory Adjustment`` transaction so history and balances agree.
+    Returns the adjustment rows written.
+    """
+    keys = {(r["organization_id"], r["batch_id"]) for r in rows}
+    current = dict(
+        ((org, batch), qty)
+        for org, batch, qty in session.execute(
+            select(_inventory.c.organization_id, _inventory.c.batch_id, _inventory.c.quantity)
+            .where(tuple_(_inventory.c.organization_id, _inventory.c.batch_id).in_(keys))
+        )
+    )
+    now = datetime.utcnow()
+    adjustments = []
+    for row in rows:
+        key = (row["organization_id"], row["batch_id"])
+        delta = int(row["quantity"]) - current.get(key, 0)
+        current[key] = int(row["quantity"])
+        if not delta:
+            continue
+        adjustments.append(
+            {
+                "transaction_id": str(uuid.uuid4()),
+                "request_id": None,
+                "product_id": row["product_id"],
+                "batch_id": row["batch_id"],
+                "quantity": abs(delta),
+                "transaction_type": ADJUST_ADD if delta > 0 else ADJUST_SUBTRACT,
+                "source_org_id": None if delta > 0 else row["organization_id"],
+                "destination_org_id": row["organization_id"] if delta > 0 else None,
+                "transaction_date": now,
+                "recorded_by_user_id": user_id,
+                "notes": "Stock count",
+            }
+        )
+    if adjustments:
+        session.execute(insert(models.Transaction.__table__), adjustments)
+        apply(session, adjustments)
+    conditions = [r for r in rows if r.get("storage_condition")]
+    if conditions:
+        session.execute(
+            update(_inventory)
+            .where(_inventory.c.organization_id == bindparam("k_org"))
+            .where(_inventory.c.batch_id == bindparam("k_batch"))
+            .values(storage_condition=bindparam("k_cond")),
+            [
+                {"k_org": r["organization_id"], "k_batch": r["batch_id"], "k_cond": r["storage_condition"]}
+                for r in conditions
+            ],
+        )
+    return adjustments
+
+
+def compute_balances(session) -> dict:
+    """Recompute ``{(org, batch): [product_id, qty]}`` from full history in SQL."""
+    t = models.Transaction.__table__
+    debits = (
+        select(
+            t.c.source_org_id.label("org"), t.c.batch_id, t.c.product_id,
+            (literal(0) - func.sum(t.c.quantity)).label("qty"),
+        )
+        .where(t.c.transaction_type.in_(DEBIT_TYPES), t.c.source_org_id.is_not(None))
+        .group_by(t.c.source_org_id, t.c.batch_id, t.c.product_id)
+    )
+    credits = (
+        select(
+            t.c.destination_org_id.label("org"), t.c.batch_id, t.c.product_id,
+            func.sum(t.c.quantity).label("qty"),
+        )
+        .where(t.c.transaction_type.in_(CREDIT_TYPES), t.c.destination_org_id.is_not(None))
+        .group_by(t.c.destination_org_id, t.c.batch_id, t.c.product_id)
+    )
+    movements = union_all(debits, credits).subquery()
+    totals = select(
+        movements.c.org, movements.c.batch_id,
+        func.min(movements.c.product_id), func.sum(movements.c.qty),
+    ).group_by(movements.c.org, movements.c.batch_id)
+    return {(org, batch): [product, qty] for org, batch, product, qty in session.execute(totals)}
+
+
+def verify(session, expected=None) -> list:
+    """Return one drift record per balance that disagrees with history."""
+    expected = dict(expected if expected is not None else compute_balances(session))
+    drift = []
+    stored = session.execute(
+        select(_inventory.c.organization_id, _inventory.c.batch_id, _inventory.c.quantity)
+    )
+    for org, batch, qty in stored:
+        want = expected.pop((org, batch), [None, 0])[1]
+        if qty != want:
+            drift.append({"organization_id": org, "batch_id": batch, "stored": qty, "expected": want})
+    for (org, batch), (_, want) in expected.items():
+        if want:
+            drift.append({"organization_id": org, "batch_id": batch, "stored": None, "expected": want})
+    return drift
+
+
+def record_opening_balances(conn) -> list:
+    """Write an adjustment for every balance its history does not explain.
+
+    Databases from before the ledger hold ``Inventory`` rows with no
+    transactions behind them; ``migrations.upgrade`` runs this once so
+    ``verify`` and ``rebuild`` agree with the stock on hand. Each adjustment
+    is attributed to a user of the balance's organization (any user if it
+    has none). Returns the transaction rows written.
+    """
+    expected = compute_balances(conn)
+    users = models.User.__table__
+    recorder = dict(conn.execute(
+        select(users.c.organization_id, func.min(users.c.user_id)).group_by(users.c.organization_id)
+    ).all())
+    fallback = conn.execute(select(func.min(users.c.user_id))).scalar()
+    now = datetime.utcnow()
+    rows = []
+    stored = conn.execute(
+        select(_inventory.c.organization_id, _inventory.c.batch_id, _inventory.c.product_id, _inventory.c.quantity)
+    )
+    for org, batch, product, qty in stored:
+        delta = qty - expected.get((org, batch), [None, 0])[1]
+        user_id = recorder.get(org, fallback)
+        if not delta or user_id is None:
+            continue
+        rows.append(
+            {
+                "transaction_id": str(uuid.uuid4()),
+                "request_id": None,
+                "product_id": product,
+                "batch_id": batch,
+                "quantity": abs(delta),
+                "transaction_type": ADJUST_ADD if delta > 0 else ADJUST_SUBTRACT,
+                "source_org_id": None if delta > 0 else org,
+                "destination_org_id": org if delta > 0 else None,
+                "transaction_date": now,
+                "recorded_by_user_id": user_id,
+                "notes": OPENING_NOTE,
+            }
+        )
+    if rows:
+        # History only: the balances already hold these quantities
+        conn.execute(insert(models.Transaction.__table__), rows)
+    return rows
+
+
+def rebuild(session) -> list:
+    """Overwrite drifting balances with the values recomputed from history.
+
+    Raises ``LedgerError`` rather than zero balances that have no history
+    at all while the opening-balance upgrade has not run yet.
+    """
+    expected = compute_balances(session)
+    drift = verify(session, expected)
+    from .migrations import current_version
+
+    if (current_version(session.get_bind()) or 0) < OPENING_BALANCES_VERSION:
+        unexplained = [d for d in drift if d["stored"] and (d["organization_id"], d["batch_id"]) not in expected]
+        if unexplained:
+            raise LedgerError(
+                f"{len(unexplained)} balance(s) have no transaction history; "
+                "run `python -m backend.migrations upgrade` to record opening balances first"
+            )
+    now = datetime.utcnow()
+    updates = [
+        {"k_org": d["organization_id"], "k_batch": d["batch_id"], "k_qty": d["expected"], "k_now": now}
+        for d in drift if d["stored"] is not None
+    ]
+    if updates:
+        session.execute(
+            update(_inventory)
+            .where(_inventory.c.organization_id == bindparam("k_org"))
+            .where(_inventory.c.batch_id == bindparam("k_batch"))
+            .values(quantity=bindparam("k_qty"), last_updated_at=bindparam("k_now")),
+            updates,
+        )
+    inserts = [
+        {
+            "inventory_record_id": str(uuid.uuid4()),
+            "organization_id": d["organization_id"],
+            "product_id": expected[(d["organization_id"], d["batch_id"])][0],
+            "batch_id": d["batch_id"],
+            "quantity": d["expected"],
+            "last_updated_at": now,
+        }
+        for d in drift if d["stored"] is None
+    ]
+    if inserts:
+        session.execute(insert(_inventory), inserts)
+    return drift
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "verify"
+    if command not in ("verify", "rebuild"):
+        print("usage: python -m backend.ledger [verify|rebuild]")
+        return 2
+    session = SessionLocal()
+    try:
+        drift = rebuild(session) if command == "rebuild" else verify(session)
+        session.commit()
+    except LedgerError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    finally:
+        session.close()
+    for d in drift:
+        print(f"{d['organization_id']}/{d['batch_id']}: stored={d['stored']} expected={d['expected']}")
+    print(f"{len(drift)} balance(s) drifted" + (" and were rebuilt" if command == "rebuild" and drift else ""))
+    return 1 if drift and command == "verify" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
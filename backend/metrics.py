@@ -0,0 +1,225 @@
+"""Per-request performance metrics exported in Prometheus text format.
+
+WHY: there was no way to see where request time goes in production.
+WHAT: closes #request-metrics
+HOW: ``install(blueprint, *engines)`` times every blueprint request and
+counts its SQL statements and DB time via engine events; ``TimedQueuePool``
+records how long checkouts wait for a connection. ``GET /api/metrics``
+renders the registry.
+
+Set SLOW_REQUEST_MS to log requests slower than that, with their SQL.
+Unset (the default), statements are counted but their text is not kept.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0")) or None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                yield f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}'
+            yield f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}'
+            suffix = f"{{{labels}}}" if labels else ""
+            yield f"{self.name}_sum{suffix} {series[-2]:.6f}"
+            yield f"{self.name}_count{suffix} {series[-1]}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _gauges(prefix, stats):
+    """Render numeric entries of a stats dict as gauges."""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        yield f"# TYPE {prefix}_{key} gauge"
+        yield f"{prefix}_{key} {value}"
+
+
+class Registry:
+    """Thread-safe collection of the request, SQL and pool metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = Histogram(
+            "api_request_duration_seconds", "Request latency.", ("endpoint", "method"), LATENCY_BUCKETS
+        )
+        self.statements = Histogram(
+            "api_request_sql_statements", "SQL statements per request.", ("endpoint",), STATEMENT_BUCKETS
+        )
+        self.db_time = Histogram(
+            "api_request_db_seconds", "Time spent executing SQL per request.", ("endpoint",), LATENCY_BUCKETS
+        )
+        self.response_size = Histogram(
+            "api_response_size_bytes", "Response body size.", ("endpoint",), SIZE_BUCKETS
+        )
+        self.checkout_wait = Histogram(
+            "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection.", (), WAIT_BUCKETS
+        )
+
+    def observe_request(self, endpoint, method, status, seconds, statements, db_seconds, size):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.observe(seconds, endpoint, method)
+            self.statements.observe(statements, endpoint)
+            self.db_time.observe(db_seconds, endpoint)
+            if size is not None:
+                self.response_size.observe(size, endpoint)
+
+    def observe_checkout(self, seconds):
+        with self._lock:
+            self.checkout_wait.observe(seconds)
+
+    def render(self, gauges=None) -> str:
+        """Return the Prometheus exposition text; ``gauges`` maps prefix -> stats dict."""
+        with self._lock:
+            lines = ["# HELP api_requests_total Requests handled.", "# TYPE api_requests_total counter"]
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f"api_requests_total{{{_labels(('endpoint', 'method', 'status'), labels)}}} {count}")
+            for histogram in (self.latency, self.statements, self.db_time, self.response_size, self.checkout_wait):
+                lines.extend(histogram.render())
+        for prefix, stats in (gauges or {}).items():
+            lines.extend(_gauges(prefix, stats))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class TimedQueuePool(QueuePool):
+    """``QueuePool`` that records how long each checkout waited."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe_checkout(time.perf_counter() - start)
+
+
+class _RequestStats:
+    __slots__ = ("start", "statements", "db_seconds", "sql", "done")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.sql = [] if SLOW_REQUEST_MS else None
+        self.done = False
+
+
+def _current():
+    return g.get("request_stats") if has_request_context() else None
+
+
+def _before_request():
+    g.request_stats = _RequestStats()
+
+
+def _finish(stats, status, size):
+    stats.done = True
+    elapsed = time.perf_counter() - stats.start
+    endpoint = request.endpoint or "unknown"
+    registry.observe_request(endpoint, request.method, status, elapsed, stats.statements, stats.db_seconds, size)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        logger.warning(
+            "slow request %s %s -> %s in %.1f ms (%d statements, %.1f ms in SQL)\n%s",
+            request.method, request.full_path, status, elapsed * 1000,
+            stats.statements, stats.db_seconds * 1000,
+            "\n".join(f"  {ms:8.2f} ms  {sql}" for ms, sql in stats.sql),
+        )
+
+
+def _after_request(response):
+    stats = _current()
+    if stats is not None and not stats.done:
+        # Streamed bodies have no length yet; they are counted without a size
+        size = None if response.is_streamed else response.calculate_content_length()
+        _finish(stats, response.status_code, size)
+    return response
+
+
+def _teardown_request(exc=None):
+    stats = _current()
+    if stats is not None and not stats.done:
+        _finish(stats, 500, None)  # the view raised before producing a response
+
+
+def install(blueprint, *engines):
+    """Time ``blueprint``'s requests and attribute the engines' SQL to them."""
+    blueprint.before_request(_before_request)
+    blueprint.after_request(_after_request)
+    blueprint.teardown_request(_teardown_request)
+    for engine in dict.fromkeys(engines):
+        _instrument(engine)
+
+
+def _instrument(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current()
+        if stats is None:
+            return
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed * 1000, " ".join(statement.split())))
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # after_cursor_execute never fires for a failed statement
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
@@ -0,0 +1,203 @@
+"""Schema upgrades for existing databases and a hot-query plan check.
+
+WHY: ``create_all`` only creates missing tables, so indexes added to
+existing tables never reach deployed databases.
+WHAT: closes #query-indexes
+HOW: run ``python -m backend.migrations upgrade`` after deploying new
+models; ``python -m backend.migrations check-plans`` exits non-zero when a
+hot query stops using its index.
+
+Boot calls ``ensure_schema`` which reads one row from ``schema_version``
+and skips all DDL when it already matches ``SCHEMA_VERSION``.
+"""
+
+import sys
+
+from sqlalchemy import delete, insert, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+from .database import Base, engine
+
+# Bump whenever models, indexes or backfills change so boot re-runs upgrade()
+SCHEMA_VERSION = 10
+
+# (name, SQL, expected index) for the queries the API runs most often.
+# Keep these in step with the filters in routes.py.
+HOT_QUERIES = [
+    (
+        "inventory by org and product",
+        "SELECT * FROM inventory WHERE organization_id = :o AND product_id = :p",
+        "ix_inventory_org_product",
+    ),
+    (
+        "transactions by batch",
+        "SELECT * FROM transactions WHERE batch_id = :b ORDER BY transaction_date",
+        "ix_transactions_batch_date",
+    ),
+    (
+        "transactions from org by date",
+        "SELECT * FROM transactions WHERE source_org_id = :o AND transaction_date >= :d",
+        "ix_transactions_source_date",
+    ),
+    (
+        "transactions to org by date",
+        "SELECT * FROM transactions WHERE destination_org_id = :o AND transaction_date >= :d",
+        "ix_transactions_destination_date",
+    ),
+    (
+        "requests by target and status",
+        "SELECT * FROM requests WHERE target_org_id = :o AND status = :s",
+        "ix_requests_target_status",
+    ),
+    (
+        "audit logs by time range",
+        "SELECT * FROM audit_logs WHERE timestamp >= :t ORDER BY timestamp",
+        "ix_audit_logs_timestamp",
+    ),
+    (
+        "batches by expiry window",
+        "SELECT * FROM batches WHERE expiry_date BETWEEN :a AND :b",
+        "ix_batches_expiry_date",
+    ),
+]
+
+_PLAN_PARAMS = {"o": "X", "p": "X", "b": "X", "s": "X", "d": "2000-01-01",
+                "t": "2000-01-01", "a": "2000-01-01"}
+
+
+def ensure_indexes(bind=engine) -> list:
+    """Create any model index missing from the database; return their names."""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(bind)
+                created.append(index.name)
+    return created
+
+
+def ensure_columns(bind=engine) -> list:
+    """Add model columns missing from existing tables; return ``table.column`` names.
+
+    New columns must be nullable or have a ``server_default`` so existing
+    rows get a value.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with bind.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                ddl += column.type.compile(conn.dialect)
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def upgrade(bind=engine) -> list:
+    """Create missing tables, columns and indexes, backfill, then stamp the version."""
+    from . import hierarchy, ledger, models, search
+
+    previous = current_version(bind)
+    Base.metadata.create_all(bind=bind)
+    ensure_columns(bind)
+    created = ensure_indexes(bind)
+    with bind.begin() as conn:
+        if hierarchy.needs_backfill(conn):
+            hierarchy.rebuild(conn)
+        if search.BACKEND != "memory" and search.fts5_supported(conn):
+            search.ensure_fts(conn)
+        # Give every table a version row so writers only ever UPDATE it
+        versions = models.TableVersion.__table__
+        known = set(conn.execute(select(versions.c.table_name)).scalars())
+        missing = [t.name for t in Base.metadata.sorted_tables if t.name not in known]
+        if missing:
+            conn.execute(insert(versions), [{"table_name": name, "version": 1} for name in missing])
+        if previous is None or previous < ledger.OPENING_BALANCES_VERSION:
+            # Stock counted before the ledger existed has no history behind it
+            ledger.record_opening_balances(conn)
+        table = models.SchemaVersion.__table__
+        conn.execute(delete(table))
+        conn.execute(insert(table).values(version=SCHEMA_VERSION))
+    return created
+
+
+def current_version(bind=engine):
+    """Return the stamped schema version, or None for a fresh database."""
+    from . import models
+
+    try:
+        with bind.connect() as conn:
+            return conn.execute(select(models.SchemaVersion.version)).scalar()
+    except DBAPIError:
+        # Table missing: database predates versioning or is empty
+        return None
+
+
+def ensure_schema(bind=engine) -> bool:
+    """Run ``upgrade`` only if the schema is behind; return whether it ran."""
+    if current_version(bind) == SCHEMA_VERSION:
+        return False
+    upgrade(bind)
+    return True
+
+
+def explain(conn, sql: str) -> str:
+    """Return the query plan for ``sql`` as one lowercase string."""
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), _PLAN_PARAMS)
+        return " | ".join(row[-1] for row in rows).lower()
+    # Small test tables make seq scans cheapest; ask whether an index is usable
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    rows = conn.execute(text("EXPLAIN " + sql), _PLAN_PARAMS)
+    return " | ".join(row[0] for row in rows).lower()
+
+
+def check_query_plans(bind=engine) -> list:
+    """Return ``(name, plan)`` for each hot query not using its index."""
+    failures = []
+    with bind.connect() as conn:
+        for name, sql, index in HOT_QUERIES:
+            plan = explain(conn, sql)
+            if index.lower() not in plan:
+                failures.append((name, plan))
+        conn.rollback()
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "upgrade"
+    if command == "upgrade":
+        created = upgrade()
+        print("created indexes: " + (", ".join(created) or "none"))
+        print(f"schema version {SCHEMA_VERSION}")
+        return 0
+    if command == "check-plans":
+        failures = check_query_plans()
+        for name, plan in failures:
+            print(f"FAIL {name}: {plan}")
+        print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use their index")
+        return 1 if failures else 0
+    print("usage: python -m backend.migrations [upgrade|check-plans]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,19 +6,42 @@ Derived from dbsetup.md schema. Each table includes timestamps for auditing.
 from sqlalchemy import (
     Column,
     Integer,
+    Float,
     String,
     Text,
     Date,
     DateTime,
     ForeignKey,
+    Index,
     UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from .changes import commit_seq
 from .database import Base
 
 
+class SchemaVersion(Base):
+    """Single-row marker of the schema revision applied by migrations.py."""
+
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TableVersion(Base):
+    """Per-table change counter bumped by ``backend.changes`` on every write."""
+
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Organization(Base):
     __tablename__ = "organizations"
 
@@ -40,6 +63,24 @@ class Organization(Base):
     parent = relationship("Organization", remote_side=[organization_id])
 
 
+class OrganizationClosure(Base):
+    """Ancestor/descendant pairs of the organization hierarchy.
+
+    Every organization has a depth-0 row for itself; maintained by
+    ``backend.hierarchy``.
+    """
+
+    __tablename__ = "organization_closure"
+
+    ancestor_id = Column(String, ForeignKey("organizations.organization_id"), primary_key=True)
+    descendant_id = Column(String, ForeignKey("organizations.organization_id"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_organization_closure_descendant", "descendant_id", "depth"),
+    )
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -67,6 +108,13 @@ class Product(Base):
     manufacturer_org_id = Column(String, ForeignKey("organizations.organization_id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # table_versions value of the writing transaction (see Inventory.change_seq)
+    change_seq = Column(Integer, nullable=False, server_default=text("0"), default=commit_seq, onupdate=commit_seq)
+
+    __table_args__ = (
+        # the in-memory search index re-reads rows changed since its last refresh
+        Index("ix_products_change_seq", "change_seq"),
+    )
 
 
 class Batch(Base):
@@ -81,9 +129,15 @@ class Batch(Base):
     quality_control_status = Column(Text, default="Released")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # table_versions value of the writing transaction (see Inventory.change_seq)
+    change_seq = Column(Integer, nullable=False, server_default=text("0"), default=commit_seq, onupdate=commit_seq)
 
     __table_args__ = (
         UniqueConstraint("product_id", "batch_number", name="uix_product_batch"),
+        # expiry window filters on GET /api/batches
+        Index("ix_batches_expiry_date", "expiry_date"),
+        # the in-memory search index re-reads rows changed since its last refresh
+        Index("ix_batches_change_seq", "change_seq"),
     )
 
 
@@ -97,9 +151,21 @@ class Inventory(Base):
     quantity = Column(Integer, nullable=False)
     storage_condition = Column(Text)
     last_updated_at = Column(DateTime, default=datetime.utcnow)
+    # table_versions value of the writing transaction: commit-ordered, unlike
+    # last_updated_at, so incremental exports cannot skip late commits
+    change_seq = Column(
+        Integer, nullable=False, server_default=text("0"),
+        default=commit_seq, onupdate=commit_seq,
+    )
 
     __table_args__ = (
         UniqueConstraint("organization_id", "batch_id", name="uix_org_batch"),
+        Index("ix_inventory_org_product", "organization_id", "product_id"),
+        Index("ix_inventory_batch", "batch_id"),
+        # reorder planning finds recently counted balances by update time
+        Index("ix_inventory_updated", "last_updated_at", "inventory_record_id"),
+        # incremental exports walk balances in commit order
+        Index("ix_inventory_change_seq", "change_seq", "inventory_record_id"),
     )
 
 
@@ -117,6 +183,15 @@ class Request(Base):
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # Optimistic concurrency for approval decisions (see backend.workflow)
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        Index("ix_requests_target_status", "target_org_id", "status"),
+        Index("ix_requests_initiator_status", "initiator_org_id", "status"),
+    )
 
 
 class RequestItem(Base):
@@ -132,6 +207,10 @@ class RequestItem(Base):
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_request_items_request", "request_id"),
+    )
+
 
 class Approval(Base):
     __tablename__ = "approvals"
@@ -165,6 +244,18 @@ class Transaction(Base):
     recorded_by_user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # table_versions value of the inserting transaction (see Inventory.change_seq)
+    change_seq = Column(Integer, nullable=False, server_default=text("0"), default=commit_seq)
+
+    __table_args__ = (
+        Index("ix_transactions_batch_date", "batch_id", "transaction_date"),
+        Index("ix_transactions_source_date", "source_org_id", "transaction_date"),
+        Index("ix_transactions_destination_date", "destination_org_id", "transaction_date"),
+        # reorder planning finds recent dispatches by insert time
+        Index("ix_transactions_created", "created_at", "transaction_id"),
+        # incremental exports walk history in commit order
+        Index("ix_transactions_change_seq", "change_seq", "transaction_id"),
+    )
 
 
 class AuditLog(Base):
@@ -179,3 +270,69 @@ class AuditLog(Base):
     new_value = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp", "timestamp"),
+    )
+
+
+
+class RevokedToken(Base):
+    """Signed tokens revoked before their natural expiry (see tokens.py)."""
+
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.user_id"))
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """Outcome of a POST sent with an ``Idempotency-Key`` (see idempotency.py)."""
+
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(String, primary_key=True)
+    idempotency_key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    # NULL until the handler has finished; a retry then gets 409
+    response_status = Column(Integer)
+    response_body = Column(Text)
+    response_mimetype = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires", "expires_at"),
+    )
+
+
+class ReorderPoint(Base):
+    """Latest reorder suggestion per organization and product (see planning.py)."""
+
+    __tablename__ = "reorder_points"
+
+    organization_id = Column(String, ForeignKey("organizations.organization_id"), primary_key=True)
+    product_id = Column(String, ForeignKey("products.product_id"), primary_key=True)
+    avg_daily_demand = Column(Float, nullable=False)
+    forecast_daily_demand = Column(Float, nullable=False)
+    demand_std = Column(Float, nullable=False)
+    safety_stock = Column(Float, nullable=False)
+    reorder_point = Column(Float, nullable=False)
+    on_hand = Column(Integer, nullable=False)
+    days_of_cover = Column(Float)
+    suggested_order = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PlanningRun(Base):
+    """One reorder-point computation; the latest row is the incremental watermark."""
+
+    __tablename__ = "planning_runs"
+
+    run_id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, nullable=False)
+    # Rows written after this are picked up by the next incremental run
+    watermark = Column(DateTime, nullable=False)
+    full = Column(Integer, nullable=False, default=0)
+    pairs = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,58 @@
+"""Keyset pagination and NDJSON streaming helpers for list endpoints.
+
+WHY: unbounded ``.all()`` queries load whole tables into memory.
+WHAT: closes #keyset-pagination
+HOW: pass ``?after=<id>&limit=`` for pages or ``?format=ndjson`` to stream.
+"""
+
+import json
+
+from flask import Response, request
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_CHUNK_SIZE = 1000
+
+
+def parse_limit(value, default: int = DEFAULT_LIMIT) -> int:
+    """Return a page size clamped to ``1..MAX_LIMIT``; raise ValueError if bad."""
+    if value in (None, ""):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_LIMIT)
+
+
+def keyset_page(query, key_column, after: str | None, limit: int):
+    """Return ``(rows, next_after)`` for one page ordered by ``key_column``.
+
+    One extra row is fetched to know whether another page exists without a
+    separate COUNT query.
+    """
+    if after:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], key_column.key)
+    return rows, None
+
+
+def page_response(rows, next_after, serialize):
+    """Build a JSON list response with the next cursor in ``X-Next-Cursor``."""
+    resp = Response(
+        json.dumps([serialize(r) for r in rows]),
+        mimetype="application/json",
+    )
+    if next_after:
+        resp.headers["X-Next-Cursor"] = next_after
+    return resp
+
+
+def wants_stream() -> bool:
+    """True when the client asked for NDJSON via ``?format=`` or Accept."""
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
@@ -0,0 +1,205 @@
+"""Demand forecasts and reorder points per organization and product.
+
+WHY: CFAs and stockists had no reorder suggestions, and working them out
+per row from ``Transaction`` history in Python does not scale to thousands
+of org x product pairs.
+WHAT: closes #reorder-points
+HOW: ``python -m backend.planning`` (or ``POST /api/planning/recompute``)
+loads dispatch history for the last PLANNING_WINDOW_DAYS as daily totals
+in one grouped query and on-hand stock in another, lays them out as a
+pairs x days matrix and computes, for every pair at once:
+
+- average daily demand and its standard deviation over the window;
+- a forecast: exponentially weighted daily demand (PLANNING_HALFLIFE_DAYS);
+- safety stock = z(PLANNING_SERVICE_LEVEL) * std * sqrt(lead time);
+- reorder point = forecast * PLANNING_LEAD_TIME_DAYS + safety stock;
+- a suggested order when on hand is at or below the reorder point, enough
+  to cover the reorder point plus PLANNING_REVIEW_DAYS of forecast demand.
+
+Results replace the pair's row in ``reorder_points``. Each run is logged
+in ``planning_runs``; the next run recomputes only pairs with dispatches or
+stock changes since that watermark. The first run of a day is full, since
+the window moves every day even for pairs nothing happened to.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, select, tuple_
+
+from . import models
+
+WINDOW_DAYS = int(os.environ.get("PLANNING_WINDOW_DAYS", "90"))
+HALFLIFE_DAYS = float(os.environ.get("PLANNING_HALFLIFE_DAYS", "14"))
+LEAD_TIME_DAYS = float(os.environ.get("PLANNING_LEAD_TIME_DAYS", "7"))
+REVIEW_DAYS = float(os.environ.get("PLANNING_REVIEW_DAYS", "14"))
+SERVICE_LEVEL = float(os.environ.get("PLANNING_SERVICE_LEVEL", "0.95"))
+# Rows this close to "now" may belong to transactions still committing
+LAG_SECONDS = float(os.environ.get("PLANNING_LAG_SECONDS", "5"))
+# Outbound movements that count as consumption at the source organization
+DEMAND_TYPES = ("Dispatch",)
+# Pairs per statement when filtering or deleting by (org, product)
+PAIR_CHUNK = 400
+
+PAIR = ["organization_id", "product_id"]
+RESULT_COLUMNS = [
+    "avg_daily_demand", "forecast_daily_demand", "demand_std", "safety_stock",
+    "reorder_point", "on_hand", "days_of_cover", "suggested_order",
+]
+
+
+def _chunks(items, size=PAIR_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def demand_history(conn, since: date, pairs=None) -> pd.DataFrame:
+    """Daily dispatched quantity per (org, product) from ``since`` on."""
+    t = models.Transaction.__table__
+    day = func.date(t.c.transaction_date).label("day")
+    query = (
+        select(t.c.source_org_id.label("organization_id"), t.c.product_id, day,
+               func.sum(t.c.quantity).label("quantity"))
+        .where(t.c.transaction_type.in_(DEMAND_TYPES), t.c.source_org_id.is_not(None),
+               t.c.transaction_date >= datetime.combine(since, datetime.min.time()))
+        .group_by(t.c.source_org_id, t.c.product_id, day)
+    )
+    if pairs is None:
+        frames = [pd.read_sql(query, conn)]
+    else:
+        frames = [pd.read_sql(query.where(tuple_(t.c.source_org_id, t.c.product_id).in_(chunk)), conn)
+                  for chunk in _chunks(pairs)]
+    frame = pd.concat(frames, ignore_index=True)
+    frame["day"] = pd.to_datetime(frame["day"])
+    return frame
+
+
+def on_hand(conn, pairs=None) -> pd.DataFrame:
+    """Total stock per (org, product)."""
+    i = models.Inventory.__table__
+    query = (
+        select(i.c.organization_id, i.c.product_id, func.sum(i.c.quantity).label("on_hand"))
+        .group_by(i.c.organization_id, i.c.product_id)
+    )
+    if pairs is None:
+        return pd.read_sql(query, conn)
+    return pd.concat(
+        [pd.read_sql(query.where(tuple_(i.c.organization_id, i.c.product_id).in_(chunk)), conn)
+         for chunk in _chunks(pairs)],
+        ignore_index=True,
+    )
+
+
+def changed_pairs(conn, since: datetime) -> list:
+    """(org, product) pairs with dispatches or stock changes written after ``since``."""
+    t, i = models.Transaction.__table__, models.Inventory.__table__
+    dispatched = select(t.c.source_org_id, t.c.product_id).where(
+        t.c.created_at > since, t.c.transaction_type.in_(DEMAND_TYPES), t.c.source_org_id.is_not(None)
+    )
+    counted = select(i.c.organization_id, i.c.product_id).where(i.c.last_updated_at > since)
+    return sorted({tuple(row) for row in conn.execute(dispatched.union(counted))})
+
+
+def compute(history: pd.DataFrame, stock: pd.DataFrame, today: date, pairs=None,
+            window: int = WINDOW_DAYS) -> pd.DataFrame:
+    """Reorder figures for every pair in ``history``/``stock`` (or ``pairs``).
+
+    Group-wise statistics are taken over a dense pairs x days matrix, so the
+    cost is a few NumPy reductions whatever the number of pairs.
+    """
+    if pairs is None:
+        keys = pd.MultiIndex.from_frame(pd.concat([history[PAIR], stock[PAIR]]).drop_duplicates())
+    else:
+        keys = pd.MultiIndex.from_tuples(pairs, names=PAIR)
+    start = pd.Timestamp(today) - pd.Timedelta(days=window - 1)
+    matrix = np.zeros((len(keys), window))
+    history = history[history["day"] >= start]
+    rows = keys.get_indexer(pd.MultiIndex.from_frame(history[PAIR]))
+    cols = (history["day"] - start).dt.days.to_numpy()
+    known = (rows >= 0) & (cols < window)
+    np.add.at(matrix, (rows[known], cols[known]), history["quantity"].to_numpy()[known])
+
+    avg = matrix.mean(axis=1)
+    std = matrix.std(axis=1, ddof=1) if window > 1 else np.zeros(len(keys))
+    weights = 0.5 ** (np.arange(window)[::-1] / HALFLIFE_DAYS)
+    forecast = matrix @ weights / weights.sum()
+    safety = NormalDist().inv_cdf(SERVICE_LEVEL) * std * np.sqrt(LEAD_TIME_DAYS)
+    reorder_point = forecast * LEAD_TIME_DAYS + safety
+    held = stock.set_index(PAIR)["on_hand"].reindex(keys).fillna(0).to_numpy()
+    order = np.where(held <= reorder_point, np.ceil(reorder_point + forecast * REVIEW_DAYS - held), 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(forecast > 0, held / forecast, np.nan)
+
+    frame = keys.to_frame(index=False)
+    frame["avg_daily_demand"] = avg.round(3)
+    frame["forecast_daily_demand"] = forecast.round(3)
+    frame["demand_std"] = std.round(3)
+    frame["safety_stock"] = safety.round(2)
+    frame["reorder_point"] = reorder_point.round(2)
+    frame["on_hand"] = held.astype(int)
+    frame["days_of_cover"] = np.round(cover, 1)
+    frame["suggested_order"] = np.clip(order, 0, None).astype(int)
+    return frame
+
+
+def _records(frame, now):
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    for record in records:
+        record["computed_at"] = now
+    return records
+
+
+def recompute(bind=None, full: bool = False, today: date | None = None) -> dict:
+    """Refresh ``reorder_points``; incremental unless ``full`` or a new day."""
+    from .database import engine
+
+    bind = bind or engine
+    today = today or date.today()
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    watermark = now - timedelta(seconds=LAG_SECONDS)
+    runs, points = models.PlanningRun.__table__, models.ReorderPoint.__table__
+    with bind.begin() as conn:
+        last = conn.execute(select(runs).order_by(runs.c.run_id.desc()).limit(1)).first()
+        full = full or last is None or last.started_at.date() != now.date()
+        pairs = None if full else changed_pairs(conn, last.watermark)
+        if pairs == []:
+            frame = pd.DataFrame(columns=PAIR + RESULT_COLUMNS)
+        else:
+            since = today - timedelta(days=WINDOW_DAYS - 1)
+            frame = compute(demand_history(conn, since, pairs), on_hand(conn, pairs), today, pairs)
+        if full:
+            conn.execute(delete(points))
+        else:
+            for chunk in _chunks(pairs):
+                conn.execute(delete(points).where(tuple_(points.c.organization_id, points.c.product_id).in_(chunk)))
+        records = _records(frame, now)
+        if records:
+            conn.execute(insert(points), records)
+        conn.execute(insert(runs).values(started_at=now, watermark=watermark, full=int(full), pairs=len(records)))
+    return {
+        "full": full,
+        "pairs": len(records),
+        "reorder": int((frame["suggested_order"] > 0).sum()) if len(frame) else 0,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.planning", description="Recompute reorder points.")
+    parser.add_argument("--full", action="store_true", help="recompute every pair, not just changed ones")
+    args = parser.parse_args(argv)
+    result = recompute(full=args.full)
+    kind = "full" if result["full"] else "incremental"
+    print(f"{kind} run: {result['pairs']} pair(s), {result['reorder']} to reorder, {result['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Bounded TTL/LRU cache of authenticated principals.
+
+WHY: ``require_auth`` hit the database on every API call just to read a role.
+WHAT: closes #auth-principal-cache
+HOW: tune with AUTH_CACHE_SIZE / AUTH_CACHE_TTL; set AUTH_CACHE_SIZE=0 to
+disable caching.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The slice of a ``User`` that authorization needs."""
+
+    user_id: str
+    organization_id: str
+    role: str
+    status: str
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.user_id, user.organization_id, user.role, user.status or "active")
+
+    @property
+    def active(self) -> bool:
+        return self.status == "active"
+
+
+class PrincipalCache:
+    """Thread-safe LRU keyed by token with per-entry expiry.
+
+    A reverse index from user id to tokens makes ``invalidate_user`` cheap
+    even with many live sessions per user.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (expires_at, principal)
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        """Return the cached principal for ``token`` or ``None``."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (time.monotonic() + self.ttl, principal)
+            self._by_user.setdefault(principal.user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+
+    def invalidate_user(self, user_id: str):
+        """Forget every cached token belonging to ``user_id``."""
+        with self._lock:
+            for token in self._by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, token: str):
+        _, principal = self._entries.pop(token)
+        tokens = self._by_user.get(principal.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[principal.user_id]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", "60")),
+)
@@ -1,41 +1,67 @@
 """Flask routes exposing basic CRUD operations and authentication."""
 
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g, send_file, stream_with_context
 from .version import VERSION
 from sqlalchemy.orm import Session
-from .database import SessionLocal
+from sqlalchemy.orm.exc import StaleDataError
+from .database import after_commit, engine, get_read_session, get_session, pool_stats, read_engine
+from .pagination import keyset_page, page_response, parse_limit, wants_stream
+from .serializers import RowSerializer, json_page, ndjson_stream
+from .bulk import SPECS, BulkLoader, insert_rows, iter_records
+from .conditional import body_cache, conditional
+from .idempotency import idempotent
+from . import audit, events, export, hierarchy, ledger, metrics, planning, search, workflow
+from .allocation import allocate, fefo_index, stale_products
+from .trace import trace_batch
+from .principals import Principal, principal_cache
+from .tokens import TokenError, issue_token, revocations, verify_token
 from . import models
 import uuid
 import hashlib
-from datetime import date
-
-# In-memory token store for demo purposes
-tokens = {}
-
+import sys
+import tempfile
+from datetime import date, datetime
 
 def hash_password(password: str) -> str:
     """Return SHA256 hash of password."""
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+# Methods whose handlers only read, so auth may use the read-only session
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
 def require_auth(role: str | None = None):
-    """Decorator to require valid token and optional role."""
+    """Decorator to require valid token and optional role.
+
+    Resolved principals are cached per token so the common case costs no
+    database round trip; see ``backend.principals``.
+    """
 
     def decorator(func):
         def wrapper(*args, **kwargs):
             auth = request.headers.get("Authorization", "")
             token = auth.replace("Bearer ", "")
-            user_id = tokens.get(token)
-            if not user_id:
+            try:
+                claims = verify_token(token)
+            except TokenError:
                 return jsonify({"error": "Unauthorized"}), 401
 
-            session = SessionLocal()
-            user = session.get(models.User, user_id)
-            if not user:
+            principal = principal_cache.get(token)
+            if principal is None:
+                # Writes already hold the request's session; don't open a second connection
+                session = get_read_session() if request.method in READ_METHODS else get_session()
+                user = session.get(models.User, claims["sub"])
+                if not user:
+                    return jsonify({"error": "Unauthorized"}), 401
+                principal = Principal.from_user(user)
+                principal_cache.put(token, principal)
+            if not principal.active:
                 return jsonify({"error": "Unauthorized"}), 401
-            if role and user.role != role:
+            if role and principal.role != role:
                 return jsonify({"error": "Forbidden"}), 403
-            g.current_user = user
+            g.current_user = principal
+            g.token_claims = claims
             return func(*args, **kwargs)
 
         wrapper.__name__ = func.__name__
@@ -43,20 +69,49 @@ def require_auth(role: str | None = None):
 
     return decorator
 
+def _truthy(value) -> bool:
+    """Interpret a query-string flag such as ``?atomic=1``."""
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _parse_date(value):
+    """Parse an optional ISO date query parameter."""
+    return date.fromisoformat(value) if value else None
+
+
+def _parse_datetime(value):
+    """Parse an optional ISO datetime query parameter."""
+    return datetime.fromisoformat(value) if value else None
+
+
 api_bp = Blueprint("api", __name__)
+# Latency, SQL and response-size metrics for every API request
+metrics.install(api_bp, engine, read_engine)
 
 
 @api_bp.route("/login", methods=["POST"])
 def login():
     """Authenticate a user and return a token."""
     data = request.get_json() or {}
-    session = SessionLocal()
+    session = get_session()
     user = session.query(models.User).filter_by(email=data.get("email")).first()
     if not user or user.password_hash != hash_password(data.get("password", "")):
         return jsonify({"error": "Invalid credentials"}), 401
-    token = str(uuid.uuid4())
-    tokens[token] = user.user_id
-    return jsonify({"token": token})
+    if (user.status or "active") != "active":
+        return jsonify({"error": "Invalid credentials"}), 401
+    return jsonify({"token": issue_token(user)})
+
+
+@api_bp.route("/logout", methods=["POST"])
+@require_auth()
+def logout():
+    """Revoke the caller's token before it expires."""
+    session = get_session()
+    revocations.revoke(session, g.token_claims)
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    after_commit(session, lambda: principal_cache.invalidate_token(token))
+    session.commit()
+    return jsonify({"status": "logged out"})
 
 
 @api_bp.route("/version", methods=["GET"])
@@ -70,6 +125,30 @@ def get_version():
     return jsonify({"version": VERSION})
 
 
+@api_bp.route("/pool-stats", methods=["GET"])
+@require_auth()
+def get_pool_stats():
+    """Report connection pool usage so operators can size it."""
+    return jsonify(pool_stats())
+
+
+@api_bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Expose request, SQL, pool and cache metrics in Prometheus text format."""
+    pools = pool_stats()
+    gauges = {
+        "db_pool": pools,
+        "db_read_pool": pools.get("read", {}),
+        "auth_cache": principal_cache.stats(),
+        "audit_writer": audit.writer.stats(),
+        "etag_cache": body_cache.stats(),
+    }
+    analytics = sys.modules.get("backend.analytics")
+    if analytics is not None:  # only loaded when the dashboards are mounted
+        gauges["analytics_cache"] = {"hits": analytics.cache.hits, "misses": analytics.cache.misses}
+    return Response(metrics.registry.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
 @api_bp.route("/organizations", methods=["POST"])
 @require_auth(role="Manufacturer")
 def create_organization():
@@ -85,19 +164,167 @@ def create_organization():
         name=data.get("name"),
         type=data.get("type"),
         address=data.get("address"),
+        parent_organization_id=data.get("parent_organization_id"),
     )
-    session: Session = SessionLocal()
+    session: Session = get_session()
     session.add(org)
     session.commit()
     return jsonify({"organization_id": org.organization_id}), 201
 
 
+@api_bp.route("/organizations/<org_id>", methods=["PATCH"])
+@require_auth(role="Manufacturer")
+def update_organization(org_id):
+    """Update organization details or move it under a new parent.
+
+    Re-parenting moves the whole subtree; the closure table follows.
+    """
+    data = request.get_json() or {}
+    session = get_session()
+    org = session.get(models.Organization, org_id)
+    if not org:
+        return jsonify({"error": "Not found"}), 404
+    for field in ("name", "type", "address", "city", "state", "country",
+                  "postal_code", "phone", "fax", "email", "parent_organization_id"):
+        if field in data:
+            setattr(org, field, data[field])
+    org.updated_at = datetime.utcnow()
+    try:
+        session.commit()
+    except hierarchy.HierarchyError as exc:
+        session.rollback()
+        return jsonify({"error": str(exc)}), 409
+    return jsonify({"organization_id": org.organization_id, "parent_organization_id": org.parent_organization_id})
+
+
+@api_bp.route("/organizations/<org_id>/descendants", methods=["GET"])
+@require_auth()
+@conditional("organizations", "organization_closure")
+def list_descendants(org_id):
+    """List every organization below ``org_id`` with its depth; filter by ``type``."""
+    session = get_read_session()
+    closure = models.OrganizationClosure
+    query = (
+        session.query(models.Organization, closure.depth)
+        .join(closure, closure.descendant_id == models.Organization.organization_id)
+        .filter(closure.ancestor_id == org_id, closure.depth > 0)
+    )
+    if request.args.get("type"):
+        query = query.filter(models.Organization.type == request.args["type"])
+    return jsonify([
+        {
+            "organization_id": org.organization_id,
+            "name": org.name,
+            "type": org.type,
+            "parent_organization_id": org.parent_organization_id,
+            "depth": depth,
+        }
+        for org, depth in query.order_by(closure.depth, models.Organization.organization_id)
+    ])
+
+
+def _inventory_to_dict(inv):
+    return {
+        "inventory_record_id": inv.inventory_record_id,
+        "organization_id": inv.organization_id,
+        "product_id": inv.product_id,
+        "batch_id": inv.batch_id,
+        "quantity": inv.quantity,
+    }
+
+
+def _request_to_dict(r):
+    return {
+        "request_id": r.request_id,
+        "request_type": r.request_type,
+        "initiator_org_id": r.initiator_org_id,
+        "target_org_id": r.target_org_id,
+        "status": r.status,
+        "request_date": r.request_date.isoformat() if r.request_date else None,
+        "version": r.version,
+    }
+
+
+def _transaction_to_dict(t):
+    return {
+        "transaction_id": t.transaction_id,
+        "request_id": t.request_id,
+        "product_id": t.product_id,
+        "batch_id": t.batch_id,
+        "quantity": t.quantity,
+        "transaction_type": t.transaction_type,
+        "source_org_id": t.source_org_id,
+        "destination_org_id": t.destination_org_id,
+        "transaction_date": t.transaction_date.isoformat() if t.transaction_date else None,
+    }
+
+
+@api_bp.route("/organizations/<org_id>/inventory", methods=["GET"])
+@require_auth()
+@conditional("inventory", "organization_closure")
+def subtree_inventory(org_id):
+    """Inventory held by ``org_id`` and every organization below it."""
+    try:
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    query = get_read_session().query(models.Inventory).filter(
+        models.Inventory.organization_id.in_(hierarchy.subtree(org_id))
+    )
+    if request.args.get("product_id"):
+        query = query.filter(models.Inventory.product_id == request.args["product_id"])
+    rows, next_after = keyset_page(query, models.Inventory.inventory_record_id, request.args.get("after"), limit)
+    return page_response(rows, next_after, _inventory_to_dict)
+
+
+@api_bp.route("/organizations/<org_id>/requests", methods=["GET"])
+@require_auth()
+@conditional("requests", "organization_closure")
+def subtree_requests(org_id):
+    """Requests initiated anywhere in the subtree of ``org_id``; filter by ``status``."""
+    try:
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    query = get_read_session().query(models.Request).filter(
+        models.Request.initiator_org_id.in_(hierarchy.subtree(org_id))
+    )
+    if request.args.get("status"):
+        query = query.filter(models.Request.status == request.args["status"])
+    rows, next_after = keyset_page(query, models.Request.request_id, request.args.get("after"), limit)
+    return page_response(rows, next_after, _request_to_dict)
+
+
+@api_bp.route("/organizations/<org_id>/transactions", methods=["GET"])
+@require_auth()
+@conditional("transactions", "organization_closure")
+def subtree_transactions(org_id):
+    """Movements into or out of the subtree of ``org_id`` in a ``since``/``until`` range."""
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        since = _parse_datetime(request.args.get("since"))
+        until = _parse_datetime(request.args.get("until"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    members = hierarchy.subtree(org_id)
+    txn = models.Transaction
+    query = get_read_session().query(txn).filter(
+        txn.source_org_id.in_(members) | txn.destination_org_id.in_(members)
+    )
+    if since:
+        query = query.filter(txn.transaction_date >= since)
+    if until:
+        query = query.filter(txn.transaction_date <= until)
+    rows, next_after = keyset_page(query, txn.transaction_id, request.args.get("after"), limit)
+    return page_response(rows, next_after, _transaction_to_dict)
+
+
 @api_bp.route("/users", methods=["POST"])
 @require_auth(role="Manufacturer")
 def create_user():
     """Add a new user linked to an organization."""
     data = request.get_json() or {}
-    session = SessionLocal()
+    session = get_session()
     user = models.User(
         user_id=data.get("user_id") or str(uuid.uuid4()),
         organization_id=data.get("organization_id"),
@@ -108,16 +335,48 @@ def create_user():
         last_name=data.get("last_name"),
     )
     session.add(user)
+    after_commit(session, lambda: principal_cache.invalidate_user(user.user_id))
     session.commit()
     return jsonify({"user_id": user.user_id}), 201
 
 
+@api_bp.route("/users/<user_id>", methods=["PATCH"])
+@require_auth(role="Manufacturer")
+def update_user(user_id):
+    """Update a user's profile, role or status.
+
+    Send ``{"status": "inactive"}`` to deactivate; cached principals for the
+    user are dropped once the change commits.
+    """
+    data = request.get_json() or {}
+    session = get_session()
+    user = session.get(models.User, user_id)
+    if not user:
+        return jsonify({"error": "Not found"}), 404
+    for field in ("organization_id", "email", "first_name", "last_name", "role", "status"):
+        if field in data:
+            setattr(user, field, data[field])
+    if "password" in data:
+        user.password_hash = hash_password(data["password"])
+    user.updated_at = datetime.utcnow()
+    after_commit(session, lambda: principal_cache.invalidate_user(user_id))
+    session.commit()
+    return jsonify({"user_id": user.user_id, "role": user.role, "status": user.status})
+
+
+@api_bp.route("/auth/cache-stats", methods=["GET"])
+@require_auth()
+def get_auth_cache_stats():
+    """Report principal cache size and hit ratio."""
+    return jsonify(principal_cache.stats())
+
+
 @api_bp.route("/products", methods=["POST"])
 @require_auth(role="Manufacturer")
 def create_product():
     """Create a product entry."""
     data = request.get_json() or {}
-    session = SessionLocal()
+    session = get_session()
     prod = models.Product(
         product_id=data.get("product_id") or str(uuid.uuid4()),
         name=data.get("name"),
@@ -131,6 +390,7 @@ def create_product():
 
 @api_bp.route("/batches", methods=["POST"])
 @require_auth(role="Manufacturer")
+@idempotent
 def create_batch():
     """Register a production batch.
 
@@ -139,7 +399,7 @@ def create_batch():
     HOW: extend with more fields or delete to roll back.
     """
     data = request.get_json() or {}
-    session = SessionLocal()
+    session = get_session()
     batch = models.Batch(
         batch_id=data.get("batch_id") or str(uuid.uuid4()),
         product_id=data.get("product_id"),
@@ -154,50 +414,285 @@ def create_batch():
     return jsonify({"batch_id": batch.batch_id}), 201
 
 
+BATCH_FIELDS = RowSerializer(
+    models.Batch.batch_id,
+    models.Batch.product_id,
+    models.Batch.batch_number,
+    models.Batch.manufacturing_date,
+    models.Batch.expiry_date,
+    models.Batch.manufacturing_site_name,
+    models.Batch.quality_control_status,
+)
+
+
 @api_bp.route("/batches", methods=["GET"])
 @require_auth()
+@conditional("batches")
 def list_batches():
-    """List all batches for reference."""
-    session = SessionLocal()
-    batches = session.query(models.Batch).all()
-    return jsonify([
-        {
-            "batch_id": b.batch_id,
-            "product_id": b.product_id,
-            "batch_number": b.batch_number,
-            "manufacturing_date": b.manufacturing_date.isoformat() if b.manufacturing_date else None,
-            "expiry_date": b.expiry_date.isoformat() if b.expiry_date else None,
-            "manufacturing_site_name": b.manufacturing_site_name,
-            "quality_control_status": b.quality_control_status,
-        }
-        for b in batches
-    ])
+    """List batches one keyset page at a time, or stream them as NDJSON.
+
+    Filters: ``product_id``, ``expires_after`` and ``expires_before``
+    (ISO dates, inclusive). Paginate with ``after`` and ``limit``.
+    """
+    args = request.args
+    try:
+        limit = parse_limit(args.get("limit"))
+        expires_after = _parse_date(args.get("expires_after"))
+        expires_before = _parse_date(args.get("expires_before"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    # Column tuples through Core: no ORM objects for pages of plain rows
+    stmt = BATCH_FIELDS.select()
+    if args.get("product_id"):
+        stmt = stmt.where(models.Batch.product_id == args["product_id"])
+    if expires_after:
+        stmt = stmt.where(models.Batch.expiry_date >= expires_after)
+    if expires_before:
+        stmt = stmt.where(models.Batch.expiry_date <= expires_before)
+
+    session, key = get_read_session(), models.Batch.batch_id
+    if wants_stream():
+        return ndjson_stream(session, BATCH_FIELDS, stmt, key, args.get("after"))
+    return json_page(session, BATCH_FIELDS, stmt, key, args.get("after"), limit)
+
+
+@api_bp.route("/batches/<batch_id>/trace", methods=["GET"])
+@require_auth()
+def trace_batch_distribution(batch_id):
+    """Return every organization downstream of a batch with stock on hand.
+
+    Pass ``from_org`` to trace only below one organization.
+    """
+    session = get_read_session()
+    batch = session.get(models.Batch, batch_id)
+    if not batch:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(trace_batch(session, batch, from_org=request.args.get("from_org")))
+
+
+@api_bp.route("/search", methods=["GET"])
+@require_auth()
+@conditional("products", "batches")
+def search_catalog():
+    """Ranked prefix search over products and batches.
+
+    ``q`` is required; ``kind`` (``product`` or ``batch``) and ``limit``
+    (default 20) narrow the results.
+    """
+    args = request.args
+    kind = args.get("kind") or None
+    try:
+        limit = parse_limit(args.get("limit"), default=search.DEFAULT_LIMIT)
+        if kind is not None and kind not in search.KINDS:
+            raise ValueError(f"kind must be one of {', '.join(search.KINDS)}")
+        if not search.tokenize(args.get("q")):
+            raise ValueError("q must contain at least one word")
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    conn = get_read_session().connection()
+    resp = jsonify(search.search(conn, args["q"], kind=kind, limit=limit))
+    resp.headers["X-Search-Backend"] = search.backend_name(conn)
+    return resp
+
+
+def _bulk_import(table: str, defaults=None, writer=insert_rows):
+    """Stream-parse the request body into ``table`` and return the report."""
+    content_type = request.mimetype
+    if content_type not in ("text/csv", "application/x-ndjson", "application/jsonl"):
+        return jsonify({"error": "Content-Type must be text/csv or application/x-ndjson"}), 415
+    session = get_session()
+    loader = BulkLoader(
+        session,
+        SPECS[table],
+        atomic=_truthy(request.args.get("atomic")),
+        defaults=defaults,
+        writer=writer,
+    )
+    try:
+        report = loader.load(iter_records(request.stream, content_type))
+    except UnicodeDecodeError:
+        session.rollback()
+        # Chunks committed before the bad bytes (non-atomic loads) stay in
+        report = {**loader.report(), "inserted": 0 if loader.atomic else loader.inserted}
+        report["error"] = "body is not valid UTF-8"
+        return jsonify(report), 400
+    if report["inserted"]:
+        # Core inserts bypass the ORM hooks, so audit the load as a whole
+        audit.writer.submit([
+            audit.make_record(
+                "Bulk Import", SPECS[table].model.__tablename__, None,
+                new={"inserted": report["inserted"], "failed": report["failed"]},
+                user_id=g.current_user.user_id,
+            )
+        ])
+    status = 422 if report["atomic"] and report["failed"] else 200
+    return jsonify(report), status
+
+
+@api_bp.route("/batches/bulk", methods=["POST"])
+@require_auth(role="Manufacturer")
+def bulk_create_batches():
+    """Import many batches from a CSV or NDJSON body.
+
+    Pass ``?atomic=1`` to reject the whole file if any row is invalid.
+    """
+    return _bulk_import("batches")
 
 
 @api_bp.route("/inventory", methods=["POST"])
 @require_auth()
+@idempotent
 def add_inventory():
-    """Record inventory quantities by batch."""
+    """Record a stock count for a batch at an organization.
+
+    The difference from the ledger balance is booked as an inventory
+    adjustment transaction, so ``Inventory`` always matches history.
+    """
     data = request.get_json() or {}
-    session = SessionLocal()
-    inv = models.Inventory(
-        inventory_record_id=str(uuid.uuid4()),
-        organization_id=data.get("organization_id"),
-        product_id=data.get("product_id"),
-        batch_id=data.get("batch_id"),
-        quantity=data.get("quantity"),
+    try:
+        quantity = int(data["quantity"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "quantity must be an integer"}), 400
+    if quantity < 0:
+        return jsonify({"error": "quantity must not be negative"}), 400
+    session = get_session()
+    org_id, batch_id = data.get("organization_id"), data.get("batch_id")
+    old_quantity = ledger.balance(session, org_id, batch_id)
+    try:
+        ledger.set_quantities(
+            session,
+            [
+                {
+                    "organization_id": org_id,
+                    "product_id": data.get("product_id"),
+                    "batch_id": batch_id,
+                    "quantity": quantity,
+                    "storage_condition": data.get("storage_condition"),
+                }
+            ],
+            g.current_user.user_id,
+        )
+    except ledger.LedgerError as exc:
+        # A concurrent movement changed the balance between read and write
+        session.rollback()
+        return jsonify({"error": str(exc)}), 409
+    audit.record_after_commit(session, [
+        audit.make_record(
+            "Inventory Counted", "inventory", f"{org_id},{batch_id}",
+            old={"quantity": old_quantity}, new={"quantity": quantity},
+            user_id=g.current_user.user_id,
+        )
+    ])
+    events.publish_after_commit(session, "inventory.counted", (org_id,), {
+        "organization_id": org_id,
+        "product_id": data.get("product_id"),
+        "batch_id": batch_id,
+        "old_quantity": old_quantity,
+        "quantity": quantity,
+    })
+    session.commit()
+    inv = session.query(models.Inventory).filter_by(organization_id=org_id, batch_id=batch_id).first()
+    return jsonify({"inventory_record_id": inv.inventory_record_id if inv else None}), 201
+
+
+@api_bp.route("/inventory/bulk", methods=["POST"])
+@require_auth()
+def bulk_add_inventory():
+    """Import many stock counts from a CSV or NDJSON body via the ledger."""
+    user_id = g.current_user.user_id
+    return _bulk_import(
+        "inventory", writer=lambda session, spec, rows: ledger.set_quantities(session, rows, user_id)
     )
-    session.add(inv)
+
+
+def _insert_and_apply(session, spec, rows):
+    insert_rows(session, spec, rows)
+    ledger.apply(session, rows)
+
+
+@api_bp.route("/transactions", methods=["POST"])
+@require_auth()
+def create_transaction():
+    """Record a stock movement and update the affected balances atomically."""
+    data = request.get_json() or {}
+    try:
+        quantity = int(data["quantity"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "quantity must be an integer"}), 400
+    if quantity <= 0 or not data.get("transaction_type"):
+        return jsonify({"error": "positive quantity and transaction_type required"}), 400
+    session = get_session()
+    try:
+        txn = ledger.record_transaction(
+            session,
+            request_id=data.get("request_id"),
+            product_id=data.get("product_id"),
+            batch_id=data.get("batch_id"),
+            quantity=quantity,
+            transaction_type=data["transaction_type"],
+            source_org_id=data.get("source_org_id"),
+            destination_org_id=data.get("destination_org_id"),
+            recorded_by_user_id=g.current_user.user_id,
+            notes=data.get("notes"),
+        )
+    except ledger.LedgerError as exc:
+        session.rollback()
+        return jsonify({"error": str(exc)}), 409
     session.commit()
-    return jsonify({"inventory_record_id": inv.inventory_record_id}), 201
+    return jsonify({"transaction_id": txn.transaction_id}), 201
+
+
+@api_bp.route("/transactions/bulk", methods=["POST"])
+@require_auth()
+def bulk_add_transactions():
+    """Import many transactions; ``recorded_by_user_id`` defaults to the caller.
+
+    Each chunk's balance changes are applied in the same DB transaction.
+    Rows that would overdraw a balance are reported as failed.
+    """
+    return _bulk_import(
+        "transactions",
+        defaults={"recorded_by_user_id": g.current_user.user_id},
+        writer=_insert_and_apply,
+    )
+
+
+@api_bp.route("/stock", methods=["GET"])
+@require_auth()
+@conditional("inventory")
+def get_stock():
+    """Return on-hand balances for an organization from the ledger.
+
+    ``organization_id`` is required; narrow with ``batch_id`` or
+    ``product_id``. Both paths are single index lookups.
+    """
+    org_id = request.args.get("organization_id")
+    if not org_id:
+        return jsonify({"error": "organization_id required"}), 400
+    query = get_read_session().query(models.Inventory).filter_by(organization_id=org_id)
+    if request.args.get("batch_id"):
+        query = query.filter_by(batch_id=request.args["batch_id"])
+    if request.args.get("product_id"):
+        query = query.filter_by(product_id=request.args["product_id"])
+    return jsonify([
+        {
+            "organization_id": inv.organization_id,
+            "product_id": inv.product_id,
+            "batch_id": inv.batch_id,
+            "quantity": inv.quantity,
+        }
+        for inv in query
+    ])
 
 
 @api_bp.route("/requests", methods=["POST"])
 @require_auth()
+@idempotent
 def create_request():
     """Submit a dispatch or return request."""
     data = request.get_json() or {}
-    session = SessionLocal()
+    session = get_session()
     req = models.Request(
         request_id=str(uuid.uuid4()),
         request_type=data.get("request_type"),
@@ -207,41 +702,285 @@ def create_request():
         notes=data.get("notes"),
     )
     session.add(req)
+    events.publish_after_commit(session, "request.created", (req.initiator_org_id, req.target_org_id), {
+        "request_id": req.request_id,
+        "request_type": req.request_type,
+        "initiator_org_id": req.initiator_org_id,
+        "target_org_id": req.target_org_id,
+    })
     session.commit()
     return jsonify({"request_id": req.request_id}), 201
 
 
+@api_bp.route("/allocations", methods=["POST"])
+@require_auth()
+def allocate_stock():
+    """Suggest FEFO batch allocations for product quantities.
+
+    Body: ``{"organization_id", "lines": [{"product_id", "quantity"}]}``.
+    With ``request_id`` the stock comes from the request's target org and
+    the picks are saved as ``RequestItem`` rows; a request that already has
+    items gets 409, so a retry cannot save the picks twice.
+    """
+    data = request.get_json() or {}
+    session = get_session()
+    req = None
+    if data.get("request_id"):
+        req = session.get(models.Request, data["request_id"])
+        if not req:
+            return jsonify({"error": "Not found"}), 404
+        if session.query(models.RequestItem.request_item_id).filter_by(request_id=req.request_id).first():
+            return jsonify({"error": "request already has items"}), 409
+    org_id = data.get("organization_id") or (req.target_org_id if req else None)
+    lines = data.get("lines") or []
+    try:
+        if not org_id or not all(int(l["quantity"]) > 0 and l.get("product_id") for l in lines):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "organization_id and lines of product_id/quantity required"}), 400
+
+    results = allocate(session, org_id, lines)
+    if req:
+        stale = stale_products(session, org_id, results)
+        if stale:
+            # The index missed another worker's movement or a QC change; reload those pairs
+            for product_id in stale:
+                fefo_index.invalidate(org_id, product_id)
+            results = allocate(session, org_id, lines)
+        session.add_all(
+            models.RequestItem(
+                request_item_id=str(uuid.uuid4()),
+                request_id=req.request_id,
+                product_id=line["product_id"],
+                batch_id=pick["batch_id"],
+                requested_quantity=pick["quantity"],
+            )
+            for line in results
+            for pick in line["batches"]
+        )
+        # Bumps the request's version, so a concurrent allocation fails here
+        req.updated_at = datetime.utcnow()
+        try:
+            session.commit()
+        except StaleDataError:
+            session.rollback()
+            return jsonify({"error": "request already has items"}), 409
+    return jsonify({"organization_id": org_id, "lines": results})
+
+
+REORDER_POINT_FIELDS = RowSerializer(
+    models.ReorderPoint.organization_id,
+    models.ReorderPoint.product_id,
+    models.ReorderPoint.avg_daily_demand,
+    models.ReorderPoint.forecast_daily_demand,
+    models.ReorderPoint.demand_std,
+    models.ReorderPoint.safety_stock,
+    models.ReorderPoint.reorder_point,
+    models.ReorderPoint.on_hand,
+    models.ReorderPoint.days_of_cover,
+    models.ReorderPoint.suggested_order,
+    models.ReorderPoint.computed_at,
+)
+
+
+@api_bp.route("/planning/reorder-points", methods=["GET"])
+@require_auth()
+@conditional("reorder_points")
+def list_reorder_points():
+    """Reorder points from the last planning run, largest suggested order first.
+
+    Filter with ``organization_id`` and ``product_id``; ``?reorder=1``
+    keeps only pairs with a suggested order. ``limit`` defaults to 100.
+    """
+    args = request.args
+    try:
+        limit = parse_limit(args.get("limit"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    rp = models.ReorderPoint
+    stmt = REORDER_POINT_FIELDS.select()
+    for field in ("organization_id", "product_id"):
+        if args.get(field):
+            stmt = stmt.where(getattr(rp, field) == args[field])
+    if _truthy(args.get("reorder")):
+        stmt = stmt.where(rp.suggested_order > 0)
+    stmt = stmt.order_by(rp.suggested_order.desc(), rp.organization_id, rp.product_id).limit(limit)
+    body = REORDER_POINT_FIELDS.dumps(get_read_session().execute(stmt))
+    return Response(body, mimetype="application/json")
+
+
+@api_bp.route("/planning/recompute", methods=["POST"])
+@require_auth(role="Manufacturer")
+def recompute_reorder_points():
+    """Recompute reorder points; body ``{"full": true}`` forces a full run."""
+    data = request.get_json(silent=True) or {}
+    return jsonify(planning.recompute(full=bool(data.get("full"))))
+
+
 @api_bp.route("/approvals", methods=["POST"])
 @require_auth()
 def approve_request():
-    """Record an approval step for a request."""
-    data = request.get_json() or {}
-    session = SessionLocal()
-    appr = models.Approval(
-        approval_record_id=str(uuid.uuid4()),
-        request_id=data.get("request_id"),
-        approver_user_id=g.current_user.user_id,
-        approval_step=data.get("approval_step", 1),
-        status=data.get("status"),
-    )
-    session.add(appr)
+    """Approve or reject the current step of a request.
+
+    Body: ``request_id``, ``status`` (Approved/Rejected), optional
+    ``rationale`` and the ``approval_step`` / ``version`` the client saw.
+    Returns 409 if the request moved on meanwhile.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    try:
+        decision = workflow.Decision.from_dict(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "approval_step and version must be integers"}), 400
+    session = get_session()
+    try:
+        result = workflow.decide(session, g.current_user, decision)
+    except workflow.WorkflowError as exc:
+        session.rollback()
+        return jsonify({"error": str(exc)}), exc.status
     session.commit()
-    return jsonify({"approval_record_id": appr.approval_record_id}), 201
+    return jsonify(result), 201
+
+
+@api_bp.route("/approvals/bulk", methods=["POST"])
+@require_auth()
+def bulk_approve_requests():
+    """Apply many approval decisions in one transaction.
+
+    Body: ``{"decisions": [...]}`` with the fields of ``POST /approvals``.
+    Returns a result per decision; pass ``?atomic=1`` to apply none of
+    them if any fails.
+    """
+    data = request.get_json()
+    items = data.get("decisions") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "decisions must be a non-empty list"}), 400
+    try:
+        decisions = [workflow.Decision.from_dict(item) for item in items]
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({"error": "each decision must be an object; approval_step and version integers"}), 400
+    session = get_session()
+    results = workflow.decide_many(session, g.current_user, decisions)
+    failed = sum(1 for r in results if not r["ok"])
+    atomic = _truthy(request.args.get("atomic"))
+    if atomic and failed:
+        session.rollback()
+    else:
+        session.commit()
+    report = {"applied": 0 if atomic and failed else len(results) - failed, "failed": failed, "results": results}
+    return jsonify(report), 422 if atomic and failed else 200
+
+
+@api_bp.route("/events", methods=["GET"])
+@require_auth()
+def event_stream():
+    """Server-sent events for request, approval and stock changes.
+
+    ``org`` (repeatable or comma-separated) limits events to those
+    organizations; non-Manufacturers only see their own. ``type`` filters
+    by event type. Resume with ``Last-Event-ID`` or ``?last_event_id=``.
+    """
+    args, principal = request.args, g.current_user
+    orgs = {o for value in args.getlist("org") for o in value.split(",") if o} or None
+    if principal.role != "Manufacturer":
+        if orgs and orgs != {principal.organization_id}:
+            return jsonify({"error": "Forbidden"}), 403
+        orgs = {principal.organization_id}
+    types = {t for value in args.getlist("type") for t in value.split(",") if t} or None
+    try:
+        raw = request.headers.get("Last-Event-ID") or args.get("last_event_id")
+        last_id = int(raw) if raw else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+    # Plain generator, not stream_with_context: the stream must not pin a DB session
+    resp = Response(events.stream(last_id, orgs, types), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@api_bp.route("/exports/<table>", methods=["GET"])
+@require_auth(role="Manufacturer")
+def export_table(table):
+    """Export ``transactions`` or ``inventory`` as streamed CSV or Parquet.
+
+    Filters: ``since`` / ``until`` (business date), ``org`` and ``after``,
+    the ``X-Export-Watermark`` of a previous export, for only rows committed
+    since. The watermark is a commit-ordered counter, so rows from slow
+    transactions are never skipped.
+    """
+    args = request.args
+    fmt = args.get("format", "csv")
+    try:
+        spec = export.get_spec(table)
+        if fmt not in export.FORMATS:
+            raise export.ExportError(f"format must be one of {', '.join(export.FORMATS)}")
+        if fmt == "parquet" and not export.parquet_available():
+            raise export.ExportError("parquet export requires pyarrow on the server")
+        since = _parse_datetime(args.get("since"))
+        until = _parse_datetime(args.get("until"))
+        after = export.parse_after(args.get("after"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    conn = get_read_session().connection()
+    upto = export.high_water_mark(conn, spec)
+    chunks = export.iter_chunks(
+        conn, spec, since=since, until=until, org=args.get("org"), after=after, upto=upto,
+    )
+    headers = {"X-Export-Watermark": str(upto)}
+    if fmt == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{table}.csv"'
+        return Response(
+            stream_with_context(export.iter_csv(chunks, spec.columns)), mimetype="text/csv", headers=headers
+        )
+    # Parquet needs its footer written last; spill to disk beyond 16 MB
+    sink = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    export.write_parquet(chunks, spec, sink)
+    sink.seek(0)
+    resp = send_file(sink, mimetype="application/vnd.apache.parquet", as_attachment=True,
+                     download_name=f"{table}.parquet")
+    resp.headers.update(headers)
+    return resp
+
+
+AUDIT_LOG_FIELDS = RowSerializer(
+    models.AuditLog.log_id,
+    models.AuditLog.action_type,
+    models.AuditLog.table_name,
+    models.AuditLog.record_id,
+    models.AuditLog.timestamp,
+)
 
 
 @api_bp.route("/audit-logs", methods=["GET"])
 @require_auth()
+@conditional("audit_logs")
 def list_audit_logs():
-    """Return all audit logs."""
-    session = SessionLocal()
-    logs = session.query(models.AuditLog).all()
-    return jsonify([
-        {
-            "log_id": l.log_id,
-            "action_type": l.action_type,
-            "table_name": l.table_name,
-            "record_id": l.record_id,
-            "timestamp": l.timestamp.isoformat(),
-        }
-        for l in logs
-    ])
\ No newline at end of file
+    """Return audit logs one keyset page at a time, or stream them as NDJSON.
+
+    Filters: ``action_type``, ``table_name``, ``user_id`` and a ``since`` /
+    ``until`` timestamp range (ISO datetimes, inclusive).
+    """
+    args = request.args
+    try:
+        limit = parse_limit(args.get("limit"))
+        since = _parse_datetime(args.get("since"))
+        until = _parse_datetime(args.get("until"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    stmt = AUDIT_LOG_FIELDS.select()
+    for field in ("action_type", "table_name", "user_id"):
+        if args.get(field):
+            stmt = stmt.where(getattr(models.AuditLog, field) == args[field])
+    if since:
+        stmt = stmt.where(models.AuditLog.timestamp >= since)
+    if until:
+        stmt = stmt.where(models.AuditLog.timestamp <= until)
+
+    session, key = get_read_session(), models.AuditLog.log_id
+    if wants_stream():
+        return ndjson_stream(session, AUDIT_LOG_FIELDS, stmt, key, args.get("after"))
+    return json_page(session, AUDIT_LOG_FIELDS, stmt, key, args.get("after"), limit)
@@ -1,5 +1,33 @@
-"""Entry point for running the Flask application."""
+"""Entry point for running the Flask application.
 
+``python -m backend.run 5055`` starts the development server (one process,
+reloader and debugger on). ``--prod`` (or SERVER_MODE=prod) serves through
+gunicorn instead:
+
+WHY: the dev server used a single process and core on production boxes.
+WHAT: closes #production-server
+HOW: workers/threads/timeouts come from the flags below or WEB_WORKERS,
+WEB_THREADS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT, WEB_MAX_REQUESTS and
+WEB_BIND. The app is built once in the master (preload) and forked; each
+worker then drops the inherited DB connections and restarts the audit
+writer. SIGTERM drains in-flight requests for up to the graceful timeout.
+
+Workers are always ``gthread``: the timeout then only restarts hung
+workers and does not limit a request's duration, which the server-sent
+event streams (``EVENTS_STREAM_SECONDS``, see events.py) rely on. Each
+open stream holds one of a worker's threads.
+
+The in-process event broker only reaches clients of the worker that
+published, so more than one worker needs EVENTS_BROKER set to a shared
+transport; without it WEB_WORKERS defaults to 1 and larger values are
+refused.
+"""
+
+import argparse
+import os
+import sys
+
+from . import events
 from .app import create_app
 
 
@@ -12,8 +40,102 @@ def main(port: int = 5000):
     app.run(debug=True, port=port)
 
 
-if __name__ == "__main__":
-    import sys
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
-    main(port)
+def post_fork(server, worker):
+    """Gunicorn hook: give the worker its own connections and audit thread."""
+    from . import audit
+    from .database import engine, read_engine
+
+    # close=False leaves the parent's sockets alone; the child just forgets them
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+    audit.writer.reset_after_fork()
+
+
+def worker_exit(server, worker):
+    """Gunicorn hook: write audit records still queued before the worker exits."""
+    from . import audit
+
+    audit.writer.stop()
+
+
+def gunicorn_options(args) -> dict:
+    """Translate parsed CLI arguments into gunicorn settings."""
+    return {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "threads": args.threads,
+        # Even for one thread: sync workers are killed after ``timeout`` while
+        # serving a request, which would cut every /api/events stream short.
+        # gthread heartbeats from its main loop, independent of long responses.
+        "worker_class": "gthread",
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "preload_app": True,
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
 
+
+def shared_events() -> bool:
+    """True when the event broker reaches subscribers in every worker."""
+    return not isinstance(events.broker, events.LocalBroker)
+
+
+def serve(options: dict) -> int:
+    """Run ``create_app`` under gunicorn with ``options``."""
+    if options["workers"] > 1 and not shared_events():
+        print("several workers need a shared EVENTS_BROKER; the local broker would only "
+              "deliver events to clients of the publishing worker (use --workers 1)", file=sys.stderr)
+        return 2
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("production mode needs gunicorn: pip install gunicorn", file=sys.stderr)
+        return 2
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            app = create_app()
+            from .database import engine, read_engine
+
+            # Nothing opened while booting should be shared with the workers
+            engine.dispose()
+            read_engine.dispose()
+            return app
+
+    Application().run()
+    return 0
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(prog="python -m backend.run", description="Run the API and dashboards.")
+    parser.add_argument("port", nargs="?", type=int, default=int(env("PORT", "5000")))
+    parser.add_argument("--prod", action="store_true", default=env("SERVER_MODE", "dev") == "prod",
+                        help="serve with gunicorn worker processes")
+    parser.add_argument("--host", default=env("WEB_BIND", "0.0.0.0"))
+    default_workers = (os.cpu_count() or 1) if shared_events() else 1
+    parser.add_argument("--workers", type=int, default=int(env("WEB_WORKERS", str(default_workers))),
+                        help="worker processes (above 1 needs a shared EVENTS_BROKER)")
+    parser.add_argument("--threads", type=int, default=int(env("WEB_THREADS", "4")))
+    parser.add_argument("--timeout", type=int, default=int(env("WEB_TIMEOUT", "60")),
+                        help="seconds before a hung worker is restarted (does not limit request time)")
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("WEB_GRACEFUL_TIMEOUT", "30")),
+                        help="seconds to drain in-flight requests on shutdown")
+    parser.add_argument("--max-requests", type=int, default=int(env("WEB_MAX_REQUESTS", "0")),
+                        help="recycle a worker after this many requests (0 = never)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.prod:
+        sys.exit(serve(gunicorn_options(args)))
+    main(args.port)
@@ -4,21 +4,24 @@ WHY: Provide initial orgs, users, and products so devs can immediately test
 login and CRUD endpoints.
 WHAT: closes #seed-data
 HOW: Extend with more sample batches. Roll back by removing this file.
+
+Run ``python -m backend.sample_data`` to seed; the app no longer seeds on
+boot unless SEED_ON_BOOT=1.
 """
 
 import uuid
 from datetime import date
-from .database import SessionLocal
+from .database import SessionLocal, init_db
 from . import models
 from .routes import hash_password
 
 
-def seed_data():
+def seed_data() -> bool:
     """Insert example organizations, users, and a product if DB is empty."""
     session = SessionLocal()
     if session.query(models.Organization).first():
         session.close()
-        return
+        return False
 
     manuf = models.Organization(
         organization_id="MANUF1",
@@ -84,3 +87,9 @@ def seed_data():
 
     session.commit()
     session.close()
+    return True
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Seeded sample data." if seed_data() else "Database already has data; nothing seeded.")
@@ -0,0 +1,406 @@
+"""Ranked typeahead search over products and batches.
+
+WHY: the stockist page offers batch search but there was no endpoint, and
+``LIKE '%x%'`` over names, SKUs and batch numbers scans every row.
+WHAT: closes #catalog-search
+HOW: ``GET /api/search?q=para 50&kind=batch``. Every query token matches as
+a prefix of a word in the batch number or SKU, the product name or (for
+products) the description; results are ranked with code matches weighted
+highest. A query matching more than SEARCH_CANDIDATES rows (one or two
+letters on a large catalog) is ranked within the first that many, which
+keeps typeahead latency flat. SEARCH_BACKEND picks the implementation:
+
+- ``fts5`` (``auto`` on SQLite builds with FTS5): a ``search_index``
+  virtual table kept current by triggers on ``products`` and ``batches``,
+  so ORM and Core bulk inserts are indexed in the same transaction.
+  Ranking is FTS5's bm25.
+- ``memory`` (``auto`` elsewhere): an in-process sorted token list
+  searched with ``bisect``. Each search checks the tables' versions in
+  ``table_versions`` and, when they moved, indexes only rows whose
+  ``change_seq`` is past the last refresh; past SEARCH_REBUILD_ROWS changed
+  rows it reloads the whole index instead.
+
+``python -m backend.search rebuild`` repopulates the FTS table.
+"""
+
+import argparse
+import heapq
+import os
+import re
+import sys
+import threading
+from bisect import bisect_left, insort
+from typing import NamedTuple
+
+from sqlalchemy import or_, select, text
+
+from . import models
+from .changes import stored_versions
+
+BACKEND = os.environ.get("SEARCH_BACKEND", "auto")
+KINDS = ("product", "batch")
+DEFAULT_LIMIT = 20
+# Broad prefixes are ranked within this many matches, not all of them
+CANDIDATES = int(os.environ.get("SEARCH_CANDIDATES", "200"))
+FTS_TABLE = "search_index"
+# Past this many changed rows a refresh reloads the index, sorting once,
+# instead of inserting row by row
+REBUILD_ROWS = int(os.environ.get("SEARCH_REBUILD_ROWS", "1000"))
+
+# Engine -> whether its database has a usable FTS5 index
+_fts_ready = {}
+
+_TOKEN = re.compile(r"\w+")
+# Per-field weights: code (batch number / SKU), name, other
+WEIGHTS = (10.0, 4.0, 1.0)
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        kind UNINDEXED, ref_id, product_id, code, name, other,
+        prefix='1 2 3', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER search_products_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        VALUES ('product', new.product_id, new.product_id, new.sku, new.name, new.description);
+        -- Batches flushed before their product were indexed without its text
+        UPDATE {FTS_TABLE} SET name = new.name, other = new.sku
+            WHERE {FTS_TABLE} MATCH 'product_id:"' || replace(new.product_id, '"', '""') || '"'
+            AND kind = 'batch' AND product_id = new.product_id;
+    END""",
+    f"""CREATE TRIGGER search_products_au AFTER UPDATE OF sku, name, description ON products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'ref_id:"' || replace(old.product_id, '"', '""') || '"'
+            AND kind = 'product' AND ref_id = old.product_id;
+        INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        VALUES ('product', new.product_id, new.product_id, new.sku, new.name, new.description);
+        UPDATE {FTS_TABLE} SET name = new.name, other = new.sku
+            WHERE {FTS_TABLE} MATCH 'product_id:"' || replace(new.product_id, '"', '""') || '"'
+            AND kind = 'batch' AND product_id = new.product_id;
+    END""",
+    f"""CREATE TRIGGER search_products_ad AFTER DELETE ON products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'ref_id:"' || replace(old.product_id, '"', '""') || '"'
+            AND kind = 'product' AND ref_id = old.product_id;
+    END""",
+    f"""CREATE TRIGGER search_batches_ai AFTER INSERT ON batches BEGIN
+        INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        VALUES ('batch', new.batch_id, new.product_id, new.batch_number,
+                (SELECT name FROM products WHERE product_id = new.product_id),
+                (SELECT sku FROM products WHERE product_id = new.product_id));
+    END""",
+    f"""CREATE TRIGGER search_batches_au AFTER UPDATE OF batch_number, product_id ON batches BEGIN
+        DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'ref_id:"' || replace(old.batch_id, '"', '""') || '"'
+            AND kind = 'batch' AND ref_id = old.batch_id;
+        INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        VALUES ('batch', new.batch_id, new.product_id, new.batch_number,
+                (SELECT name FROM products WHERE product_id = new.product_id),
+                (SELECT sku FROM products WHERE product_id = new.product_id));
+    END""",
+    f"""CREATE TRIGGER search_batches_ad AFTER DELETE ON batches BEGIN
+        DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'ref_id:"' || replace(old.batch_id, '"', '""') || '"'
+            AND kind = 'batch' AND ref_id = old.batch_id;
+    END""",
+]
+
+_FTS_FILL = [
+    f"""INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        SELECT 'product', product_id, product_id, sku, name, description FROM products""",
+    f"""INSERT INTO {FTS_TABLE} (kind, ref_id, product_id, code, name, other)
+        SELECT 'batch', b.batch_id, b.product_id, b.batch_number, p.name, p.sku
+        FROM batches b LEFT JOIN products p ON p.product_id = b.product_id""",
+]
+
+
+def tokenize(value) -> list:
+    """Lowercase word tokens of ``value`` (None gives none)."""
+    return _TOKEN.findall(value.lower()) if value else []
+
+
+def fts5_supported(conn) -> bool:
+    if conn.dialect.name != "sqlite":
+        return False
+    options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+    return "ENABLE_FTS5" in options
+
+
+def fts_installed(conn) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+    ).first() is not None
+
+
+def ensure_fts(conn) -> bool:
+    """Create and fill the FTS table and triggers if missing; return whether it ran."""
+    # Other engines on this database may have cached "not installed"
+    _fts_ready.clear()
+    if fts_installed(conn):
+        return False
+    for ddl in _FTS_DDL:
+        conn.execute(text(ddl))
+    for sql in _FTS_FILL:
+        conn.execute(text(sql))
+    return True
+
+
+def rebuild_fts(conn):
+    """Repopulate ``search_index`` from the base tables."""
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    for sql in _FTS_FILL:
+        conn.execute(text(sql))
+
+
+def use_fts(conn) -> bool:
+    """Whether searches on ``conn`` go through FTS5 under SEARCH_BACKEND.
+
+    Under ``auto`` this is worked out once per engine, not on every search.
+    """
+    if BACKEND == "memory":
+        return False
+    if BACKEND == "fts5":
+        return True
+    ready = _fts_ready.get(conn.engine)
+    if ready is None:
+        ready = _fts_ready[conn.engine] = fts5_supported(conn) and fts_installed(conn)
+    return ready
+
+
+def _hit(kind, ref_id, product_id, code, name, score):
+    return {"kind": kind, "id": ref_id, "product_id": product_id, "code": code, "name": name,
+            "score": round(score, 4)}
+
+
+def _fts_search(conn, tokens, kind, limit):
+    # Column filter keeps the id columns out of matching; every token is a prefix term
+    columns = "{code name other} : "
+    params = {"match": columns + " ".join(f'"{t}"*' for t in tokens),
+              "exact": columns + " ".join(f'"{t}"' for t in tokens),
+              "limit": limit, "candidates": CANDIDATES,
+              "w0": WEIGHTS[0], "w1": WEIGHTS[1], "w2": WEIGHTS[2]}
+    where = f"{FTS_TABLE} MATCH :{{}}"
+    if kind:
+        where += " AND kind = :kind"
+        params["kind"] = kind
+    # Candidates are exact-word matches first, then the first CANDIDATES
+    # prefix matches, so a broad prefix cannot crowd an exact hit out
+    exact = f"SELECT rowid FROM {FTS_TABLE} WHERE {where.format('exact')} LIMIT :candidates"
+    prefix = f"SELECT rowid FROM {FTS_TABLE} WHERE {where.format('match')} LIMIT :candidates"
+    sql = (
+        f"SELECT kind, ref_id, product_id, code, name, bm25({FTS_TABLE}, 0, 0, 0, :w0, :w1, :w2) AS score, "
+        f"rowid IN ({exact}) AS is_exact "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+        f"AND rowid IN (SELECT * FROM ({exact}) UNION SELECT * FROM ({prefix})) "
+        "ORDER BY is_exact DESC, score LIMIT :limit"
+    )
+    rows = conn.execute(text(sql), params)
+    # bm25 is lower-is-better; flip it so every backend ranks by descending score
+    # (exact-word matches still come first, as the memory backend's doubled weight does)
+    return [_hit(k, r, p, c, n, -s) for k, r, p, c, n, s, _ in rows]
+
+
+class _Doc(NamedTuple):
+    kind: str
+    ref_id: str
+    product_id: str
+    code: str
+    name: str
+    weights: dict
+    # " word word ...": one C-level ``in`` test tells whether a prefix matches
+    words: str
+
+
+def _make_doc(kind, ref_id, product_id, code, name, other) -> _Doc:
+    weights = {}
+    for weight, value in zip(WEIGHTS, (code, name, other)):
+        for token in tokenize(value):
+            weights[token] = max(weights.get(token, 0.0), weight)
+    return _Doc(kind, ref_id, product_id, code, name, weights, " " + " ".join(weights))
+
+
+class PrefixIndex:
+    """In-memory token index: a sorted list of ``(token, doc number)`` pairs.
+
+    A query token selects the contiguous run of entries starting with it
+    (two ``bisect`` calls); candidate docs are those matched by every token.
+    Docs are numbered so the set operations hash ints, not id strings.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._docs = {}
+        self._numbers = {}
+        self._lock = threading.RLock()
+        self.versions = None
+        self.seqs = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, *fields):
+        """Index one product or batch (fields as from ``_changed_docs``), replacing it if present."""
+        doc = _make_doc(*fields)
+        with self._lock:
+            number = self._numbers.setdefault((doc.kind, doc.ref_id), len(self._numbers))
+            old = self._docs.get(number)
+            for token in old.weights if old else ():
+                del self._entries[bisect_left(self._entries, (token, number))]
+            self._docs[number] = doc
+            for token in doc.weights:
+                insort(self._entries, (token, number))
+
+    def load(self, rows):
+        """Replace the contents with ``rows`` (as for ``add``), sorting once."""
+        entries, docs, numbers = [], {}, {}
+        for fields in rows:
+            doc = _make_doc(*fields)
+            number = numbers.setdefault((doc.kind, doc.ref_id), len(numbers))
+            docs[number] = doc
+            entries.extend((token, number) for token in doc.weights)
+        entries.sort()
+        with self._lock:
+            self._entries, self._docs, self._numbers = entries, docs, numbers
+
+    def _span(self, token):
+        """Index range of the entries whose word starts with ``token``."""
+        return bisect_left(self._entries, (token,)), bisect_left(self._entries, (token + "\uffff",))
+
+    @staticmethod
+    def _weight(weights, token) -> float:
+        """Best weight among the doc's words starting with ``token`` (0 if none)."""
+        best = 0.0
+        for word, weight in weights.items():
+            if word.startswith(token):
+                best = max(best, weight * 2.0 if word == token else weight)
+        return best
+
+    def _candidates(self, tokens, kind, candidates) -> list:
+        """Numbers of docs matching every token, at most ``candidates`` of them."""
+        entries, docs = self._entries, self._docs
+        spans = sorted(((self._span(t), t) for t in tokens), key=lambda st: st[0][1] - st[0][0])
+        (lo, hi), _ = spans[0]
+        if len(spans) == 1 and kind is None:
+            # One token: the first ``candidates`` distinct docs of its run
+            found = {}
+            for start in range(lo, hi, candidates):
+                found.update(dict.fromkeys([n for _, n in entries[start:min(start + candidates, hi)]]))
+                if len(found) >= candidates:
+                    break
+            return list(found)[:candidates]
+        numbers = {n for _, n in entries[lo:hi]}
+        for (lo, hi), token in spans[1:]:
+            if hi - lo <= 2 * len(numbers):
+                numbers &= {n for _, n in entries[lo:hi]}
+            else:
+                # Cheaper to test the few remaining docs for a word starting with token
+                prefix = " " + token
+                numbers = {n for n in numbers if prefix in docs[n].words}
+        if kind:
+            numbers = {n for n in numbers if docs[n].kind == kind}
+        if len(numbers) > candidates:
+            # Keep docs with the most exact-word matches, which rank highest
+            exact = {}
+            for token in tokens:
+                lo = bisect_left(entries, (token,))
+                for _, n in entries[lo:bisect_left(entries, (token, float("inf")), lo)]:
+                    exact[n] = exact.get(n, 0) + 1
+            return heapq.nsmallest(candidates, numbers, key=lambda n: (-exact.get(n, 0), n))
+        return list(numbers)
+
+    def search(self, tokens, kind=None, limit=DEFAULT_LIMIT, candidates=None) -> list:
+        with self._lock:
+            docs = self._docs
+            scores = {
+                n: sum(self._weight(docs[n].weights, t) for t in tokens)
+                for n in self._candidates(tokens, kind, candidates or CANDIDATES)
+            }
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], docs[item[0]].code or ""))
+            return [
+                _hit(doc.kind, doc.ref_id, doc.product_id, doc.code, doc.name, score)
+                for doc, score in ((docs[n], score) for n, score in ranked[:limit])
+            ]
+
+    def refresh(self, conn):
+        """Index products and batches changed since the last refresh."""
+        versions = stored_versions(conn, ("products", "batches"))
+        if versions == self.versions:
+            return
+        with self._lock:
+            if versions == self.versions:
+                return
+            # change_seq is stamped in commit order, so every row committed after
+            # these versions were read has a higher one and is seen next time
+            since = self.seqs
+            docs = list(_changed_docs(conn, since))
+            if since is None:
+                self.load(docs)
+            elif len(docs) > REBUILD_ROWS:
+                self.load(_changed_docs(conn, None))
+            else:
+                for doc in docs:
+                    self.add(*doc)
+            self.versions = versions
+            self.seqs = {name: versions.get(name, (0,))[0] for name in ("products", "batches")}
+
+
+def _changed_docs(conn, since):
+    """Yield index tuples for rows whose ``change_seq`` is past ``since`` (all if None)."""
+    prod, batch = models.Product.__table__, models.Batch.__table__
+    products = select(prod.c.product_id, prod.c.product_id, prod.c.sku, prod.c.name, prod.c.description)
+    batches = select(batch.c.batch_id, batch.c.product_id, batch.c.batch_number, prod.c.name, prod.c.sku).join_from(
+        batch, prod, batch.c.product_id == prod.c.product_id, isouter=True
+    )
+    if since is not None:
+        products = products.where(prod.c.change_seq > since["products"])
+        # A renamed product changes the text of all its batches
+        renamed = select(prod.c.product_id).where(prod.c.change_seq > since["products"])
+        batches = batches.where(or_(batch.c.change_seq > since["batches"], batch.c.product_id.in_(renamed)))
+    for row in conn.execute(products):
+        yield ("product", *row)
+    for row in conn.execute(batches):
+        yield ("batch", *row)
+
+
+prefix_index = PrefixIndex()
+
+
+def backend_name(conn) -> str:
+    return "fts5" if use_fts(conn) else "memory"
+
+
+def search(conn, query: str, kind=None, limit: int = DEFAULT_LIMIT) -> list:
+    """Return up to ``limit`` ranked hits for ``query``; empty if it has no words."""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    if use_fts(conn):
+        return _fts_search(conn, tokens, kind, limit)
+    prefix_index.refresh(conn)
+    return prefix_index.search(tokens, kind, limit)
+
+
+def main(argv=None):
+    from .database import engine, read_engine
+
+    parser = argparse.ArgumentParser(prog="python -m backend.search", description="Catalog search tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="repopulate the FTS5 index from products and batches")
+    query = sub.add_parser("query", help="run a search and print the hits")
+    query.add_argument("q")
+    query.add_argument("--kind", choices=KINDS)
+    query.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        with engine.begin() as conn:
+            if not fts5_supported(conn):
+                print("this database has no FTS5; the memory backend needs no rebuild", file=sys.stderr)
+                return 2
+            if not ensure_fts(conn):
+                rebuild_fts(conn)
+        print(f"rebuilt {FTS_TABLE}")
+        return 0
+    with read_engine.connect() as conn:
+        for hit in search(conn, args.q, args.kind, args.limit):
+            print(f"{hit['score']:8.3f}  {hit['kind']:7}  {hit['code'] or '':20}  {hit['name'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Column-level JSON serialization for high-volume list endpoints.
+
+WHY: ``list_batches`` and ``list_audit_logs`` spent most of their time
+hydrating ORM objects, tracking them in the identity map and building a
+dict per row before ``json.dumps``.
+WHAT: closes #fast-serialization
+HOW: a ``RowSerializer`` names the columns an endpoint returns. Pages are
+read with a Core ``select`` of just those columns (plain tuples, no
+identity map) and each row is written through a per-column encoder chosen
+once from the column type, straight into the response text. The output is
+byte-for-byte what ``json.dumps`` gives for the equivalent dict, except that
+NaN and infinities become ``null``: ``json.dumps`` writes ``NaN``, which is
+not valid JSON.
+"""
+
+import math
+from json.encoder import encode_basestring_ascii
+
+from flask import Response, stream_with_context
+from sqlalchemy import Date, DateTime, Float, Integer, select
+
+from .pagination import STREAM_CHUNK_SIZE
+
+
+def _encode_str(value):
+    return "null" if value is None else encode_basestring_ascii(value)
+
+
+def _encode_int(value):
+    return "null" if value is None else int.__repr__(value)
+
+
+def _encode_float(value):
+    if value is None or not math.isfinite(value):
+        return "null"
+    return float.__repr__(float(value))
+
+
+def _encode_temporal(value):
+    return "null" if value is None else '"' + value.isoformat() + '"'
+
+
+def _encoder_for(column):
+    if isinstance(column.type, (Date, DateTime)):
+        return _encode_temporal
+    if isinstance(column.type, Integer):
+        return _encode_int
+    if isinstance(column.type, Float):
+        return _encode_float
+    return _encode_str
+
+
+class RowSerializer:
+    """Select ``columns`` as tuples and encode each row as a JSON object."""
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self.encoders = tuple(_encoder_for(c) for c in columns)
+        # '{"a": %s, "b": %s}' with the keys escaped once, up front
+        fields = ", ".join(encode_basestring_ascii(c.key).replace("%", "%%") + ": %s" for c in columns)
+        self.template = "{" + fields + "}"
+
+    def select(self):
+        return select(*self.columns)
+
+    def encode(self, row) -> str:
+        return self.template % tuple([enc(v) for enc, v in zip(self.encoders, row)])
+
+    def dumps(self, rows) -> str:
+        """Encode ``rows`` as a JSON array."""
+        encode = self.encode
+        return "[" + ", ".join([encode(r) for r in rows]) + "]"
+
+
+def _paged(stmt, key_column, after):
+    if after:
+        stmt = stmt.where(key_column > after)
+    return stmt.order_by(key_column)
+
+
+def json_page(session, serializer, stmt, key_column, after: str | None, limit: int):
+    """Core counterpart of ``keyset_page`` + ``page_response``."""
+    rows = session.execute(_paged(stmt, key_column, after).limit(limit + 1)).all()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = getattr(rows[-1], key_column.key)
+    resp = Response(serializer.dumps(rows), mimetype="application/json")
+    if next_after:
+        resp.headers["X-Next-Cursor"] = next_after
+    return resp
+
+
+def ndjson_stream(session, serializer, stmt, key_column, after: str | None):
+    """Stream every row of ``stmt`` after ``after`` as NDJSON from a server-side cursor.
+
+    ``stream_with_context`` keeps the request (and its session) alive until
+    the generator is exhausted; teardown then releases the connection.
+    """
+    stmt = _paged(stmt, key_column, after).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    encode = serializer.encode
+
+    def generate():
+        for chunk in session.execute(stmt).partitions():
+            yield "\n".join([encode(r) for r in chunk]) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
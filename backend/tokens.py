@@ -0,0 +1,136 @@
+"""Stateless HMAC-signed bearer tokens with a small revocation list.
+
+WHY: the in-process token dict tied each token to the worker that issued it.
+WHAT: closes #signed-tokens
+HOW: set TOKEN_SECRET to the same value on every worker/node; TOKEN_TTL
+controls lifetime in seconds.
+
+Format: ``base64url(json claims) + "." + base64url(hmac_sha256(secret, claims))``.
+Claims carry ``sub`` (user id), ``org``, ``role``, ``jti`` and ``exp``.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from .database import after_commit, engine
+from . import models
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TTL = int(os.environ.get("TOKEN_TTL", "28800"))
+# Seconds between reloads of the revocation list from the database
+REVOCATION_REFRESH = float(os.environ.get("TOKEN_REVOCATION_REFRESH", "30"))
+
+_secret = os.environ.get("TOKEN_SECRET")
+if not _secret:
+    logger.warning(
+        "TOKEN_SECRET is not set; using a random per-process secret. "
+        "Tokens will not be accepted by other workers or after restart."
+    )
+    _secret = secrets.token_hex(32)
+SECRET_KEY = _secret.encode()
+
+
+class TokenError(Exception):
+    """Raised when a token is malformed, forged, expired or revoked."""
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user, ttl: int = TOKEN_TTL) -> str:
+    """Return a signed token for ``user`` valid for ``ttl`` seconds."""
+    claims = {
+        "sub": user.user_id,
+        "org": user.organization_id,
+        "role": user.role,
+        "jti": uuid.uuid4().hex,
+        "exp": int(time.time()) + ttl,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> dict:
+    """Return the claims of a valid token or raise ``TokenError``."""
+    payload, sep, signature = token.partition(".")
+    try:
+        # Bytes: compare_digest raises TypeError on non-ASCII str
+        valid = sep and hmac.compare_digest(signature.encode(), _sign(payload).encode())
+    except UnicodeEncodeError:  # lone surrogates from a mangled header
+        valid = False
+    if not valid:
+        raise TokenError("bad signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise TokenError("malformed token")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("expired")
+    if revocations.is_revoked(claims.get("jti")):
+        raise TokenError("revoked")
+    return claims
+
+
+class RevocationList:
+    """Process-local view of ``revoked_tokens``, refreshed periodically.
+
+    Only tokens revoked before expiry are stored, so the set stays small;
+    expired rows are purged whenever a new revocation is written.
+    """
+
+    def __init__(self, refresh: float = REVOCATION_REFRESH):
+        self.refresh = refresh
+        self._jtis = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh:
+            self.reload()
+        return jti in self._jtis
+
+    def reload(self):
+        with self._lock, engine.connect() as conn:
+            query = select(models.RevokedToken.jti).where(
+                models.RevokedToken.expires_at >= datetime.utcnow()
+            )
+            self._jtis = set(conn.scalars(query))
+            self._loaded_at = time.monotonic()
+
+    def revoke(self, session, claims: dict):
+        """Record a revocation in ``session``; applies locally once committed."""
+        session.execute(
+            delete(models.RevokedToken).where(models.RevokedToken.expires_at < datetime.utcnow())
+        )
+        session.merge(
+            models.RevokedToken(
+                jti=claims["jti"],
+                user_id=claims.get("sub"),
+                expires_at=datetime.utcfromtimestamp(claims["exp"]),
+            )
+        )
+        after_commit(session, lambda: self._jtis.add(claims["jti"]))
+
+
+revocations = RevocationList()
@@ -0,0 +1,231 @@
+"""Multi-step approval workflow for requests.
+
+WHY: approvals were recorded without checking step order or advancing the
+request, and every decision needed its own round trip.
+WHAT: closes #approval-workflow
+HOW: each request type has a chain of approver roles (APPROVAL_WORKFLOWS,
+a JSON object of request_type -> list of roles; types not listed need one
+Manufacturer approval). ``decide_many`` validates decisions against the
+preloaded requests and applies them in the caller's transaction.
+
+Status moves Pending -> In Progress -> Approved as steps are approved; any
+rejection ends in Rejected. Races are caught with ``Request.version``:
+the status update only matches the version the decision was checked
+against, so a concurrent decision makes the later one a conflict instead
+of a second approval for the same step.
+
+Approvers may only decide requests whose initiating or target organization
+is their own or below it in the organization hierarchy.
+"""
+
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import func, insert, update
+
+from . import audit, events, hierarchy, models
+
+DEFAULT_CHAIN = ("Manufacturer",)
+DEFAULT_WORKFLOWS = {
+    "Dispatch": ("CFA", "Manufacturer"),
+    "Return": ("CFA", "Manufacturer"),
+}
+DECISIONS = ("Approved", "Rejected")
+OPEN_STATUSES = ("Pending", "In Progress")
+
+_closure = models.OrganizationClosure.__table__
+
+
+def _load_workflows() -> dict:
+    raw = os.environ.get("APPROVAL_WORKFLOWS")
+    if not raw:
+        return dict(DEFAULT_WORKFLOWS)
+    return {kind: tuple(roles) for kind, roles in json.loads(raw).items()}
+
+
+WORKFLOWS = _load_workflows()
+
+
+class WorkflowError(Exception):
+    """A decision that cannot be applied; ``status`` is the HTTP code."""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Decision:
+    request_id: str
+    status: str
+    rationale: str | None = None
+    # Optional guards: the step and request version the client saw
+    approval_step: int | None = None
+    version: int | None = None
+
+    @classmethod
+    def from_dict(cls, data):
+        step, version = data.get("approval_step"), data.get("version")
+        return cls(
+            request_id=data.get("request_id"),
+            status=data.get("status"),
+            rationale=data.get("rationale"),
+            approval_step=int(step) if step is not None else None,
+            version=int(version) if version is not None else None,
+        )
+
+
+def steps_for(request_type) -> tuple:
+    """Approver roles, in order, for ``request_type``."""
+    return WORKFLOWS.get(request_type, DEFAULT_CHAIN)
+
+
+class _State:
+    """What a decision is checked against; updated as a batch is applied."""
+
+    __slots__ = ("request_type", "status", "version", "done", "orgs")
+
+    def __init__(self, req, done):
+        self.request_type = req.request_type
+        self.orgs = (req.initiator_org_id, req.target_org_id)
+        self.status = req.status or "Pending"
+        self.version = req.version
+        self.done = done
+
+
+def _load(session, request_ids) -> dict:
+    """Return ``{request_id: _State}`` with two queries for any number of ids."""
+    ids = list(dict.fromkeys(request_ids))
+    requests = session.query(models.Request).filter(models.Request.request_id.in_(ids)).all()
+    done = dict(
+        session.query(models.Approval.request_id, func.count())
+        .filter(models.Approval.request_id.in_(ids), models.Approval.status == "Approved")
+        .group_by(models.Approval.request_id)
+    )
+    return {r.request_id: _State(r, done.get(r.request_id, 0)) for r in requests}
+
+
+def _scope(session, principal, states) -> set:
+    """Ids among the requests' organizations that are ``principal``'s org or below it."""
+    orgs = {org for state in states.values() for org in state.orgs if org}
+    if not orgs or not principal.organization_id:
+        return set()
+    return set(session.scalars(
+        hierarchy.subtree(principal.organization_id).where(_closure.c.descendant_id.in_(orgs))
+    ))
+
+
+def _check(state, principal, decision, scope) -> int:
+    """Return the step ``decision`` completes or raise ``WorkflowError``."""
+    if decision.status not in DECISIONS:
+        raise WorkflowError(f"status must be one of {', '.join(DECISIONS)}", 400)
+    if state is None:
+        raise WorkflowError("request not found", 404)
+    if state.status not in OPEN_STATUSES:
+        raise WorkflowError(f"request is already {state.status}")
+    if decision.version is not None and decision.version != state.version:
+        raise WorkflowError(f"request changed (version {state.version}, expected {decision.version})")
+    chain = steps_for(state.request_type)
+    step = state.done + 1
+    if decision.approval_step is not None and decision.approval_step != step:
+        raise WorkflowError(f"request is at approval step {step}")
+    if principal.role != chain[step - 1]:
+        raise WorkflowError(f"step {step} must be decided by a {chain[step - 1]} user", 403)
+    if scope.isdisjoint(state.orgs):
+        raise WorkflowError("request does not involve your organization or one below it", 403)
+    return step
+
+
+def _apply(session, state, principal, decision, step, now):
+    """Advance the request row; return ``(approval row, audit record, result)``."""
+    chain = steps_for(state.request_type)
+    if decision.status == "Rejected":
+        new_status = "Rejected"
+    else:
+        new_status = "Approved" if step == len(chain) else "In Progress"
+    req = models.Request.__table__
+    result = session.execute(
+        update(req)
+        .where(req.c.request_id == decision.request_id, req.c.version == state.version)
+        .values(status=new_status, version=req.c.version + 1, updated_at=now)
+    )
+    if result.rowcount != 1:
+        raise WorkflowError("request was decided concurrently; reload and retry")
+    old_status = state.status
+    state.status, state.version = new_status, state.version + 1
+    if decision.status == "Approved":
+        state.done = step
+    audit_record = audit.make_record(
+        "Request Status Change", "requests", decision.request_id,
+        old={"status": old_status}, new={"status": new_status},
+        user_id=principal.user_id,
+    )
+    row = {
+        "approval_record_id": str(uuid.uuid4()),
+        "request_id": decision.request_id,
+        "approver_user_id": principal.user_id,
+        "approval_step": step,
+        "status": decision.status,
+        "rationale": decision.rationale,
+        "approval_date": now,
+        "created_at": now,
+    }
+    return row, audit_record, {
+        "request_id": decision.request_id,
+        "ok": True,
+        "approval_record_id": row["approval_record_id"],
+        "approval_step": step,
+        "request_status": new_status,
+        "version": state.version,
+    }
+
+
+def decide_many(session, principal, decisions) -> list:
+    """Apply ``decisions`` in order within the session's transaction.
+
+    Returns one result dict per decision; failed ones carry ``error`` and
+    the HTTP ``code`` and leave their request untouched. The caller commits.
+    """
+    states = _load(session, [d.request_id for d in decisions])
+    scope = _scope(session, principal, states)
+    now = datetime.utcnow()
+    rows, records, results = [], [], []
+    for decision in decisions:
+        try:
+            state = states.get(decision.request_id)
+            step = _check(state, principal, decision, scope)
+            row, record, result = _apply(session, state, principal, decision, step, now)
+        except WorkflowError as exc:
+            results.append({"request_id": decision.request_id, "ok": False, "error": str(exc), "code": exc.status})
+            continue
+        rows.append(row)
+        records.append(record)
+        results.append(result)
+        events.publish_after_commit(session, "request.decided", state.orgs, {
+            "request_id": decision.request_id,
+            "approval_step": step,
+            "decision": decision.status,
+            "request_status": result["request_status"],
+            "version": result["version"],
+        })
+    if rows:
+        session.execute(insert(models.Approval.__table__), rows)
+        # Core insert skips the flush hook, so audit the approvals here too
+        records.extend(
+            audit.make_record("Approval Created", "approvals", row["approval_record_id"], new=row,
+                              user_id=principal.user_id)
+            for row in rows
+        )
+    audit.record_after_commit(session, records)
+    return results
+
+
+def decide(session, principal, decision) -> dict:
+    """Apply one decision; raise ``WorkflowError`` if it is rejected."""
+    result = decide_many(session, principal, [decision])[0]
+    if not result["ok"]:
+        raise WorkflowError(result["error"], result["code"])
+    return result
@@ -0,0 +1,229 @@
+"""Load-test the main API endpoints with concurrent clients.
+
+Usage::
+
+    python benchmarks/bench_endpoints.py --scale 5000 --clients 8 --save baseline.json
+    python benchmarks/bench_endpoints.py --scale 5000 --clients 8 --baseline baseline.json
+
+The app is built with ``create_app`` against a fresh SQLite file seeded
+with ``--scale`` batches (plus 5x audit logs, 1x requests and inventory
+rows). Each scenario is driven by ``--clients`` threads, each with its own
+Flask test client, and reports p50/p95/p99 latency, requests/sec and SQL
+statements per request. ``--baseline`` exits non-zero if p95, throughput
+or query count regress by more than ``--threshold``.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from common import compare, percentile, save
+
+ADMIN = {"email": "admin@pharma.com", "password": "adminpass"}
+SCENARIOS = ["login", "batches", "inventory", "requests", "approvals", "audit-logs"]
+CHUNK = 5000
+
+
+def seed(scale: int):
+    """Insert ``scale`` batches and proportional inventory, requests and audit rows."""
+    from backend import models
+    from backend.database import engine
+
+    rng = random.Random(42)
+    today = date.today()
+    now = datetime.utcnow()
+    orgs = ["MANUF1", "CFA1", "STOCK1"]
+    batches = [
+        {
+            "batch_id": f"B{i:07d}", "product_id": "PROD1", "batch_number": f"BN{i:07d}",
+            "manufacturing_date": today - timedelta(days=365),
+            "expiry_date": today + timedelta(days=rng.randint(1, 720)),
+            "quality_control_status": "Released", "created_at": now, "updated_at": now,
+        }
+        for i in range(scale)
+    ]
+    inventory = [
+        {
+            "inventory_record_id": str(uuid.uuid4()), "organization_id": rng.choice(orgs),
+            "product_id": "PROD1", "batch_id": b["batch_id"],
+            "quantity": rng.randint(1, 500), "last_updated_at": now,
+        }
+        for b in batches
+    ]
+    requests = [
+        {
+            # Single-step (Manufacturer) workflow so the admin can approve them
+            "request_id": f"R{i:07d}", "request_type": "Inventory Adjustment", "initiator_user_id": "USR3",
+            "initiator_org_id": "STOCK1", "target_org_id": "CFA1", "status": "Pending",
+            "request_date": now, "created_at": now, "updated_at": now,
+        }
+        for i in range(scale)
+    ]
+    logs = [
+        {
+            "log_id": str(uuid.uuid4()), "user_id": "USR1", "action_type": "Bench",
+            "table_name": "batches", "record_id": f"B{i % max(scale, 1):07d}",
+            "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(scale * 5)
+    ]
+    with engine.begin() as conn:
+        for table, rows in (
+            (models.Batch.__table__, batches),
+            (models.Inventory.__table__, inventory),
+            (models.Request.__table__, requests),
+            (models.AuditLog.__table__, logs),
+        ):
+            for start in range(0, len(rows), CHUNK):
+                conn.execute(table.insert(), rows[start:start + CHUNK])
+
+
+class QueryCounter:
+    """Count SQL statements executed by the current thread on ``engines``."""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        # read_engine is the write engine itself unless SQLite splits them
+        for engine in {id(e): e for e in engines}.values():
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def take(self) -> int:
+        count, self._local.count = getattr(self._local, "count", 0), 0
+        return count
+
+
+def make_calls(scale: int, token: str):
+    """Return scenario name -> function(client, rng) issuing one request."""
+    headers = {"Authorization": "Bearer " + token}
+    ids = max(scale, 1)
+    # Approvals are unique per (request, step), so hand out each request once
+    pending = itertools.count()
+
+    def pick(rng, prefix):
+        return f"{prefix}{rng.randrange(ids):07d}"
+
+    return {
+        "login": lambda c, rng: c.post("/api/login", json=ADMIN),
+        "batches": lambda c, rng: c.get(
+            f"/api/batches?limit=100&after={pick(rng, 'B')}", headers=headers
+        ),
+        "inventory": lambda c, rng: c.post("/api/inventory", headers=headers, json={
+            "organization_id": "STOCK1", "product_id": "PROD1",
+            "batch_id": pick(rng, "B"), "quantity": rng.randint(0, 500),
+        }),
+        "requests": lambda c, rng: c.post("/api/requests", headers=headers, json={
+            "request_type": "Dispatch", "target_org_id": "CFA1",
+        }),
+        "approvals": lambda c, rng: c.post("/api/approvals", headers=headers, json={
+            "request_id": f"R{next(pending) % ids:07d}", "approval_step": 1, "status": "Approved",
+        }),
+        "audit-logs": lambda c, rng: c.get("/api/audit-logs?limit=100", headers=headers),
+    }
+
+
+def run_scenario(app, call, counter, clients: int, total: int, warmup: int) -> dict:
+    """Issue ``total`` requests from ``clients`` threads and summarize them."""
+    latencies, queries, errors = [], [], [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker(seed_value):
+        client, rng = app.test_client(), random.Random(seed_value)
+        for _ in range(warmup):
+            call(client, rng)
+        counter.take()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            resp = call(client, rng)
+            elapsed = time.perf_counter() - start
+            count = counter.take()
+            with lock:
+                latencies.append(elapsed)
+                queries.append(count)
+                if resp.status_code >= 400:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(clients)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / max(len(queries), 1), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=2000, help="number of seeded batches")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed requests per client")
+    parser.add_argument("--only", action="append", choices=SCENARIOS, help="run just these scenarios")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    # Configuration is read at import time, so set it before importing the app
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "bench.db")
+    os.environ.setdefault("TOKEN_SECRET", "bench")
+    from backend import create_app
+    from backend.database import engine, read_engine
+
+    app = create_app(dash_mode="off", seed=True)
+    seed(args.scale)
+    counter = QueryCounter(engine, read_engine)
+    token = app.test_client().post("/api/login", json=ADMIN).get_json()["token"]
+    calls = make_calls(args.scale, token)
+
+    results = {"_config": {"scale": args.scale, "clients": args.clients, "requests": args.requests}}
+    for name in args.only or SCENARIOS:
+        stats = run_scenario(app, calls[name], counter, args.clients, args.requests, args.warmup)
+        results[name] = stats
+        print(
+            f"{name:11} {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:7.2f}  "
+            f"p95 {stats['p95_ms']:7.2f}  p99 {stats['p99_ms']:7.2f} ms  "
+            f"{stats['queries_per_request']:5.1f} q/req  {stats['errors']} errors"
+        )
+
+    engine.dispose()
+    read_engine.dispose()
+    tmp.cleanup()
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, {
+            "p95_ms": "lower", "rps": "higher", "queries_per_request": "lower",
+        })
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Measure typeahead latency of ``backend.search`` on a large catalog.
+
+Usage::
+
+    python benchmarks/bench_search.py --batches 100000
+    python benchmarks/bench_search.py --backend memory --save search.json
+
+Seeds a temp SQLite database with ``--products`` products (generated drug
+names and SKUs) and ``--batches`` batches spread over them, then replays
+typeahead sequences (each keystroke is a query) against every backend
+and reports p50/p95/max latency per backend and query length. The
+``memory`` backend's first query builds its index; that build time is
+reported separately as ``index_build_ms``.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import compare, percentile, save
+
+STEMS = ["amox", "amlo", "para", "ibu", "cef", "azi", "met", "lis", "ator", "omep", "pant", "cipro",
+         "doxy", "levo", "losa", "sert", "flu", "glim", "clop", "rosu"]
+SUFFIXES = ["icillin", "dipine", "cetamol", "profen", "triaxone", "thromycin", "formin", "inopril",
+            "vastatin", "razole", "prazole", "floxacin", "cycline", "cetirizine", "sartan", "traline"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Suspension"]
+TYPED = ["amoxicillin 500", "para syrup", "sk0042-0001", "ator 20 tab", "c"]
+
+
+def seed(products: int, batches: int):
+    from backend import models
+    from backend.database import engine
+
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    prods = [
+        {
+            "product_id": f"P{i:05d}", "sku": f"SK{i:04d}",
+            "name": f"{rng.choice(STEMS)}{rng.choice(SUFFIXES)} {rng.choice([5, 10, 20, 250, 500])}mg "
+                    f"{rng.choice(FORMS)}".title(),
+            "created_at": now, "updated_at": now,
+        }
+        for i in range(products)
+    ]
+    rows = [
+        {
+            "batch_id": f"B{i:07d}", "product_id": f"P{i % products:05d}",
+            "batch_number": f"SK{i % products:04d}-{i // products:04d}",
+            "quality_control_status": "Released", "created_at": now, "updated_at": now,
+        }
+        for i in range(batches)
+    ]
+    with engine.begin() as conn:
+        conn.execute(models.Product.__table__.insert(), prods)
+        for start in range(0, len(rows), 5000):
+            conn.execute(models.Batch.__table__.insert(), rows[start:start + 5000])
+
+
+def keystrokes(text):
+    """Every prefix of ``text`` a typeahead would send (skipping trailing spaces)."""
+    return [text[:n] for n in range(1, len(text) + 1) if not text[:n].endswith(" ")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--batches", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5, help="times each keystroke query is run")
+    parser.add_argument("--backend", choices=("fts5", "memory"), action="append", help="run only these backends")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "bench.db")
+    from backend import search
+    from backend.database import read_engine
+    from backend.migrations import upgrade
+
+    upgrade()
+    seed(args.products, args.batches)
+
+    results = {}
+    with read_engine.connect() as conn:
+        for backend in args.backend or ("fts5", "memory"):
+            if backend == "fts5" and not search.fts5_supported(conn):
+                print("fts5     skipped: SQLite was built without FTS5")
+                continue
+            search.BACKEND = backend
+            start = time.perf_counter()
+            search.search(conn, "warmup")
+            build_ms = round((time.perf_counter() - start) * 1000, 1)
+            by_length = {}
+            for text in TYPED:
+                for query in keystrokes(text):
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        search.search(conn, query)
+                        by_length.setdefault(min(len(query), 4), []).append(time.perf_counter() - start)
+            everything = [v for values in by_length.values() for v in values]
+            stats = {
+                "queries": len(everything),
+                "p50_ms": round(percentile(everything, 50) * 1000, 3),
+                "p95_ms": round(percentile(everything, 95) * 1000, 3),
+                "max_ms": round(max(everything) * 1000, 3),
+                "index_build_ms": build_ms,
+            }
+            results[backend] = stats
+            print(f"{backend:8} p50 {stats['p50_ms']:7.3f}  p95 {stats['p95_ms']:7.3f}  "
+                  f"max {stats['max_ms']:7.3f} ms  (first query {build_ms} ms)")
+            for length, values in sorted(by_length.items()):
+                label = f"{length}+ chars" if length == 4 else f"{length} char{'s' if length > 1 else ''}"
+                print(f"    {label:9} p50 {percentile(values, 50) * 1000:7.3f}  p95 {percentile(values, 95) * 1000:7.3f} ms")
+
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, {"p95_ms": "lower"})
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Compare ORM and Core column serialization for list pages.
+
+Usage::
+
+    python benchmarks/bench_serialization.py --scale 20000 --limit 1000
+    python benchmarks/bench_serialization.py --save serial.json --baseline before.json
+
+Seeds a temp database like ``bench_endpoints.py`` and, inside a request
+context, builds the ``/api/batches`` and ``/api/audit-logs`` response
+bodies two ways: ``orm`` (query ORM objects, dict per row, ``json.dumps``;
+the path those endpoints used before ``backend.serializers``) and ``core``
+(``RowSerializer`` over column tuples). Each walks every keyset page of
+``--limit`` rows. Reported per case: rows/sec and the tracemalloc peak
+for one page. The two bodies are checked to be identical first.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import compare, save
+
+
+def _batch_to_dict(b):
+    return {
+        "batch_id": b.batch_id,
+        "product_id": b.product_id,
+        "batch_number": b.batch_number,
+        "manufacturing_date": b.manufacturing_date.isoformat() if b.manufacturing_date else None,
+        "expiry_date": b.expiry_date.isoformat() if b.expiry_date else None,
+        "manufacturing_site_name": b.manufacturing_site_name,
+        "quality_control_status": b.quality_control_status,
+    }
+
+
+def _audit_log_to_dict(l):
+    return {
+        "log_id": l.log_id,
+        "action_type": l.action_type,
+        "table_name": l.table_name,
+        "record_id": l.record_id,
+        "timestamp": l.timestamp.isoformat(),
+    }
+
+
+def cases():
+    from backend import models, routes
+
+    return {
+        "batches": (models.Batch, models.Batch.batch_id, _batch_to_dict, routes.BATCH_FIELDS),
+        "audit-logs": (models.AuditLog, models.AuditLog.log_id, _audit_log_to_dict, routes.AUDIT_LOG_FIELDS),
+    }
+
+
+def orm_page(session, model, key, serialize, after, limit):
+    from backend.pagination import keyset_page, page_response
+
+    session.expunge_all()
+    rows, next_after = keyset_page(session.query(model), key, after, limit)
+    return page_response(rows, next_after, serialize)
+
+
+def core_page(session, fields, key, after, limit):
+    from backend.serializers import json_page
+
+    return json_page(session, fields, fields.select(), key, after, limit)
+
+
+def walk(page):
+    """Fetch every page via ``page(after)``; return ``(rows, seconds)``."""
+    rows, after = 0, None
+    start = time.perf_counter()
+    while True:
+        resp = page(after)
+        rows += resp.get_data().count(b"{")
+        after = resp.headers.get("X-Next-Cursor")
+        if not after:
+            return rows, time.perf_counter() - start
+
+
+def peak_kib(page) -> float:
+    tracemalloc.start()
+    page(None).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=20000, help="number of seeded batches (audit logs: 5x)")
+    parser.add_argument("--limit", type=int, default=1000, help="page size")
+    parser.add_argument("--repeat", type=int, default=3, help="walks per case; the best is reported")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "bench.db")
+    os.environ.setdefault("TOKEN_SECRET", "bench")
+    from bench_endpoints import seed
+    from backend import create_app
+    from backend.database import get_read_session
+
+    app = create_app(dash_mode="off", seed=True)
+    seed(args.scale)
+
+    results = {}
+    with app.test_request_context():
+        session = get_read_session()
+        for name, (model, key, serialize, fields) in cases().items():
+            paths = {
+                "orm": lambda after: orm_page(session, model, key, serialize, after, args.limit),
+                "core": lambda after: core_page(session, fields, key, after, args.limit),
+            }
+            if paths["orm"](None).get_data() != paths["core"](None).get_data():
+                print(f"{name}: ORM and Core bodies differ", file=sys.stderr)
+                return 2
+            for path, page in paths.items():
+                rows, seconds = min((walk(page) for _ in range(args.repeat)), key=lambda r: r[1])
+                stats = {"rows": rows, "rows_per_sec": round(rows / seconds), "peak_kib": peak_kib(page)}
+                results[f"{name}-{path}"] = stats
+                print(f"{name:10} {path:4} {stats['rows_per_sec']:10,} rows/s  "
+                      f"peak {stats['peak_kib']:9,.1f} KiB/page  ({rows} rows)")
+
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, {"rows_per_sec": "higher", "peak_kib": "lower"})
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
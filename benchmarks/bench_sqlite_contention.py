@@ -0,0 +1,123 @@
+"""Compare SQLite profiles under concurrent readers and writers.
+
+Usage::
+
+    python benchmarks/bench_sqlite_contention.py --readers 8 --writers 4 --seconds 5
+    python benchmarks/bench_sqlite_contention.py --save contention.json
+
+For each ``SQLITE_PROFILE`` (``default``: stock journal mode, one engine;
+``production``: WAL, pragmas and a read-only pool for GETs) a fresh
+process seeds a temp database and runs reader threads (``GET
+/api/batches`` pages) alongside writer threads (``POST /api/inventory``)
+for ``--seconds``. Reported per role: operations/sec, latency percentiles
+and failed requests (mostly "database is locked").
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from common import ROOT, compare, percentile, save
+
+PROFILES = ("default", "production")
+
+
+def child(args):
+    import tempfile
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "bench.db")
+    os.environ.setdefault("TOKEN_SECRET", "bench")
+    from bench_endpoints import ADMIN, make_calls, seed
+    from backend import create_app
+
+    app = create_app(dash_mode="off", seed=True)
+    seed(args.scale)
+    token = app.test_client().post("/api/login", json=ADMIN).get_json()["token"]
+    calls = make_calls(args.scale, token)
+    stop = threading.Event()
+    samples = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def worker(role, call, seed_value):
+        client, rng = app.test_client(), random.Random(seed_value)
+        while not stop.is_set():
+            start = time.perf_counter()
+            resp = call(client, rng)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[role].append(elapsed)
+                if resp.status_code >= 400:
+                    errors[role] += 1
+
+    threads = [threading.Thread(target=worker, args=("read", calls["batches"], i)) for i in range(args.readers)]
+    threads += [
+        threading.Thread(target=worker, args=("write", calls["inventory"], 1000 + i)) for i in range(args.writers)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    result = {}
+    for role, values in samples.items():
+        result[role] = {
+            "ops": len(values),
+            "errors": errors[role],
+            "ops_per_sec": round(len(values) / args.seconds, 1),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    print(json.dumps(result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=2000, help="number of seeded batches")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--profile", choices=PROFILES, action="append", help="run only these profiles")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    results = {}
+    for profile in args.profile or PROFILES:
+        env = dict(os.environ, SQLITE_PROFILE=profile)
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--scale", str(args.scale),
+               "--readers", str(args.readers), "--writers", str(args.writers), "--seconds", str(args.seconds)]
+        out = subprocess.run(cmd, cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+        roles = json.loads(out.stdout.strip().splitlines()[-1])
+        for role, stats in roles.items():
+            results[f"{profile}-{role}"] = stats
+            print(
+                f"{profile:10} {role:5} {stats['ops_per_sec']:8.1f} ops/s  p50 {stats['p50_ms']:8.2f}  "
+                f"p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms  {stats['errors']} errors"
+            )
+
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, {"p95_ms": "lower", "ops_per_sec": "higher"})
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Measure cold-start time of ``create_app`` in fresh interpreters.
+
+Usage::
+
+    python benchmarks/bench_startup.py --runs 5 --save startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+
+Each run spawns a new Python process (imports included, as a new worker
+would) against a temporary SQLite file. The first ``cold-schema`` run
+creates the schema; the others find it current and skip DDL.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, compare, save, summarize
+
+SNIPPET = """
+import time
+t = time.perf_counter()
+from backend import create_app
+create_app(dash_mode={mode!r}, seed=False)
+print(time.perf_counter() - t)
+"""
+
+
+def time_once(db_url: str, mode: str) -> float:
+    env = dict(os.environ, DATABASE_URL=db_url, TOKEN_SECRET="bench")
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(mode=mode)],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = "sqlite:///" + os.path.join(tmp, "bench.db")
+        results["cold-schema"] = summarize([time_once(db_url, "off")])
+        for mode in ("eager", "lazy", "off"):
+            results[f"dash-{mode}"] = summarize([time_once(db_url, mode) for _ in range(args.runs)])
+
+    for case, stats in results.items():
+        print(f"{case:12} median {stats['median_ms']:8.1f} ms  min {stats['min_ms']:8.1f} ms")
+    if args.save:
+        save(results, args.save)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, {"median_ms": "lower"})
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
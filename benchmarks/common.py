@@ -0,0 +1,60 @@
+"""Shared helpers for the benchmark scripts: stats and baseline comparison."""
+
+import json
+import os
+import statistics
+import sys
+
+# Let the scripts import ``backend`` when run as ``python benchmarks/<name>.py``
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 < pct <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(values) -> dict:
+    """Return min/median/p95/max of a list of seconds, in milliseconds."""
+    return {
+        "runs": len(values),
+        "min_ms": round(min(values) * 1000, 2),
+        "median_ms": round(statistics.median(values) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def save(results: dict, path: str):
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+def compare(results: dict, baseline_path: str, threshold: float, keys) -> list:
+    """Return regression messages for metrics that got worse than ``threshold``.
+
+    ``keys`` maps a metric name to ``"lower"`` or ``"higher"`` (which
+    direction is better). Results are nested ``{case: {metric: value}}``.
+    """
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+    regressions = []
+    for case, metrics in results.items():
+        before = baseline.get(case)
+        if not isinstance(before, dict) or not isinstance(metrics, dict):
+            continue
+        for metric, better in keys.items():
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if better == "lower" else change < -threshold
+            if worse:
+                regressions.append(f"{case}.{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
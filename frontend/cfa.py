@@ -1,4 +1,7 @@
 from dash import html
+from backend import analytics
+
+from .components import frame_table
 
 
 def layout():
@@ -7,4 +10,12 @@ def layout():
         html.H2("CFA Dashboard"),
         html.P("Track inventory, dispatch requests and view batches."),
         html.P("GET /api/batches to review available stock."),
+        html.H3("CFA stock"),
+        frame_table(analytics.stock_by_product_org("CFA"), "No stock at CFAs."),
+        html.H3("Pending requests to CFAs"),
+        frame_table(analytics.pending_requests("CFA"), "No pending requests."),
+        html.H3("Reorder suggestions"),
+        frame_table(analytics.reorder_suggestions("CFA"), "Nothing to reorder."),
+        html.H3("Batches expiring within 90 days"),
+        frame_table(analytics.near_expiry(org_type="CFA"), "No batches near expiry."),
     ])
@@ -0,0 +1,13 @@
+from dash import html
+
+
+def frame_table(frame, empty_text="Nothing to show."):
+    """Render a pandas DataFrame as a plain HTML table."""
+    if frame.empty:
+        return html.P(empty_text)
+    header = html.Tr([html.Th(col.replace("_", " ").title()) for col in frame.columns])
+    rows = [
+        html.Tr([html.Td("" if value is None else str(value)) for value in record])
+        for record in frame.astype(object).where(frame.notna(), None).itertuples(index=False)
+    ]
+    return html.Table([html.Thead(header), html.Tbody(rows)])
@@ -6,13 +6,16 @@
 from dash import Dash, html, dcc, Output, Input
 from .manufacturer import layout as manufacturer_layout
 from .cfa import layout as cfa_layout
-from .stockist import layout as stockist_layout
+from .stockist import layout as stockist_layout, search_results
 
 
 
 def create_dash(server):
     """Factory to create Dash app and attach to given Flask server."""
-    dash_app = Dash(__name__, server=server, url_base_pathname="/dashboard/")
+    # Page components are rendered by display_page, so callbacks for them
+    # cannot be validated against the initial layout
+    dash_app = Dash(__name__, server=server, url_base_pathname="/dashboard/",
+                    suppress_callback_exceptions=True)
     dash_app.layout = html.Div([
 
         dcc.Location(id="url"),
@@ -32,5 +35,8 @@ def create_dash(server):
             html.P("Select a dashboard page."),
         ])
 
+    @dash_app.callback(Output("batch-search-results", "children"), Input("batch-search", "value"))
+    def search_batches(query):
+        return search_results(query)
 
     return dash_app
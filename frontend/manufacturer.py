@@ -1,6 +1,9 @@
 from dash import html
+from backend import analytics
 from backend.version import VERSION  # display API version
 
+from .components import frame_table
+
 
 def layout():
     """Manufacturer dashboard layout."""
@@ -8,5 +11,13 @@ def layout():
         html.H2("Manufacturer Dashboard"),
         html.P("Manage products, users, batches and approvals here."),
         html.P("Use /api/batches to register production batches."),
+        html.H3("Stock by organization and product"),
+        frame_table(analytics.stock_by_product_org(), "No stock recorded."),
+        html.H3("Batches expiring within 90 days"),
+        frame_table(analytics.near_expiry(), "No batches near expiry."),
+        html.H3("Pending requests"),
+        frame_table(analytics.pending_requests(), "No pending requests."),
+        html.H3("Reorder suggestions across the network"),
+        frame_table(analytics.reorder_suggestions(), "Nothing to reorder."),
         html.Small(f"Backend version: {VERSION}"),
     ])
@@ -1,4 +1,9 @@
-from dash import html
+import pandas as pd
+from dash import dcc, html
+from backend import analytics, search
+from backend.database import read_engine
+
+from .components import frame_table
 
 
 def layout():
@@ -6,5 +11,23 @@ def layout():
     return html.Div([
         html.H2("Stockist Dashboard"),
         html.P("Submit orders, view approvals and search batches."),
-        html.P("Use /api/batches to check batch numbers."),
+        html.H3("Search batches"),
+        dcc.Input(id="batch-search", type="search", placeholder="Batch number, SKU or product name"),
+        html.Div(id="batch-search-results"),
+        html.H3("Stockist stock"),
+        frame_table(analytics.stock_by_product_org("Stockist"), "No stock at stockists."),
+        html.H3("Reorder suggestions"),
+        frame_table(analytics.reorder_suggestions("Stockist"), "Nothing to reorder."),
+        html.H3("Batches expiring within 90 days"),
+        frame_table(analytics.near_expiry(org_type="Stockist"), "No batches near expiry."),
     ])
+
+
+def search_results(query):
+    """Table of batches matching a typeahead query."""
+    if not search.tokenize(query):
+        return None
+    with read_engine.connect() as conn:
+        hits = search.search(conn, query, kind="batch")
+    frame = pd.DataFrame(hits, columns=["code", "name", "product_id"])
+    return frame_table(frame.rename(columns={"code": "batch_number", "name": "product"}), "No matching batches.")
@@ -0,0 +1,60 @@
+"""Shared fixtures: one app over a temp SQLite file seeded with sample data.
+
+``backend.database`` reads DATABASE_URL at import time, so the environment
+is set before anything from ``backend`` is imported.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp.name, "test.db")
+os.environ.setdefault("TOKEN_SECRET", "test-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import create_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app(dash_mode="off", seed=True)
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+def _login(client, email, password):
+    resp = client.post("/api/login", json={"email": email, "password": password})
+    return {"Authorization": "Bearer " + resp.get_json()["token"]}
+
+
+@pytest.fixture()
+def admin(client):
+    """Headers for the seeded Manufacturer user (org MANUF1)."""
+    return _login(client, "admin@pharma.com", "adminpass")
+
+
+@pytest.fixture()
+def cfa(client):
+    """Headers for the seeded CFA user (org CFA1)."""
+    return _login(client, "cfa@pharma.com", "cfapass")
+
+
+@pytest.fixture()
+def stockist(client):
+    """Headers for the seeded Stockist user (org STOCK1)."""
+    return _login(client, "stock@pharma.com", "stockpass")
+
+
+@pytest.fixture()
+def batch(client, admin):
+    """A fresh batch of the seeded product PROD1; returns its batch_id."""
+    resp = client.post("/api/batches", json={"product_id": "PROD1", "batch_number": os.urandom(4).hex()},
+                       headers=admin)
+    assert resp.status_code == 201
+    return resp.get_json()["batch_id"]
@@ -0,0 +1,104 @@
+import os
+import threading
+from datetime import date
+
+from sqlalchemy import update
+
+from backend import models
+from backend.allocation import FefoIndex, _Stock
+from backend.database import SessionLocal
+
+
+def _request(client, headers, target="CFA1"):
+    resp = client.post("/api/requests", json={"request_type": "Dispatch", "target_org_id": target}, headers=headers)
+    assert resp.status_code == 201
+    return resp.get_json()["request_id"]
+
+
+def _items(request_id):
+    with SessionLocal() as session:
+        return session.query(models.RequestItem).filter_by(request_id=request_id).count()
+
+
+def _stocked_product(qty=5):
+    """A fresh product with one released batch of ``qty`` at CFA1."""
+    tag = os.urandom(4).hex()
+    with SessionLocal() as session:
+        session.add(models.Product(product_id=tag, name=tag, sku=tag))
+        session.add(models.Batch(batch_id=tag, product_id=tag, batch_number=tag, expiry_date=date(2999, 1, 1)))
+        session.flush()
+        session.add(models.Inventory(inventory_record_id=tag, organization_id="CFA1", product_id=tag,
+                                     batch_id=tag, quantity=qty))
+        session.commit()
+    return tag
+
+
+def _preview(client, headers, product_id, qty=2):
+    resp = client.post("/api/allocations", json={
+        "organization_id": "CFA1", "lines": [{"product_id": product_id, "quantity": qty}],
+    }, headers=headers)
+    assert resp.status_code == 200
+    return resp.get_json()["lines"][0]
+
+
+def test_quarantined_batch_leaves_the_index(client, stockist):
+    tag = _stocked_product()
+    assert _preview(client, stockist, tag)["allocated"] == 2
+    with SessionLocal() as session:
+        session.get(models.Batch, tag).quality_control_status = "Quarantined"
+        session.commit()
+    assert _preview(client, stockist, tag)["batches"] == []
+
+
+def test_stale_picks_are_not_saved(client, stockist):
+    tag = _stocked_product()
+    assert _preview(client, stockist, tag)["allocated"] == 2
+    # another worker moves the stock; this process's index never hears of it
+    with SessionLocal() as session:
+        session.execute(update(models.Inventory).where(models.Inventory.batch_id == tag).values(quantity=0))
+        session.commit()
+    request_id = _request(client, stockist)
+    resp = client.post("/api/allocations", json={
+        "request_id": request_id, "lines": [{"product_id": tag, "quantity": 2}],
+    }, headers=stockist)
+    assert resp.status_code == 200
+    assert resp.get_json()["lines"][0]["shortfall"] == 2
+    assert _items(request_id) == 0
+
+
+def test_retried_allocation_does_not_duplicate_items(client, admin, stockist, batch):
+    client.post("/api/inventory", json={
+        "organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch, "quantity": 5,
+    }, headers=admin)
+    request_id = _request(client, stockist)
+    body = {"request_id": request_id, "lines": [{"product_id": "PROD1", "quantity": 2}]}
+    first = client.post("/api/allocations", json=body, headers=stockist)
+    assert first.status_code == 200
+    saved = _items(request_id)
+    assert saved >= 1
+    assert client.post("/api/allocations", json=body, headers=stockist).status_code == 409
+    assert _items(request_id) == saved
+
+
+def test_pairs_load_independently():
+    index = FefoIndex()
+    release, started = threading.Event(), threading.Event()
+
+    def load(session, org_id, product_id):
+        if product_id == "SLOW":
+            started.set()
+            release.wait(5)
+        return _Stock(0)
+
+    index._load = load
+    index.ttl = float("inf")
+    worker = threading.Thread(target=index.stock, args=(None, "ORG", "SLOW"))
+    worker.start()
+    try:
+        assert started.wait(5)
+        done = threading.Event()
+        threading.Thread(target=lambda: (index.stock(None, "ORG", "FAST"), done.set())).start()
+        assert done.wait(1), "loading one pair blocked another"
+    finally:
+        release.set()
+        worker.join()
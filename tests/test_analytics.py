@@ -0,0 +1,62 @@
+import os
+from datetime import date
+
+from backend import analytics, models
+from backend.database import SessionLocal
+
+
+def _on_hand(product_id, org_id="CFA1"):
+    frame = analytics.stock_by_product_org()
+    rows = frame[(frame["product_id"] == product_id) & (frame["organization_id"] == org_id)]
+    return int(rows["quantity"].sum())
+
+
+def _count(client, headers, batch_id, quantity):
+    resp = client.post("/api/inventory", json={
+        "organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch_id, "quantity": quantity,
+    }, headers=headers)
+    assert resp.status_code == 201
+
+
+def test_repeat_reads_come_from_the_cache(app):
+    analytics.stock_by_product_org()
+    hits = analytics.cache.hits
+    analytics.stock_by_product_org()
+    assert analytics.cache.hits == hits + 1
+
+
+def test_inventory_write_invalidates_stock_figures(client, admin, batch):
+    before = _on_hand("PROD1")
+    _count(client, admin, batch, 7)
+    assert _on_hand("PROD1") == before + 7
+
+
+def test_unrelated_write_keeps_stock_figures(client, admin):
+    analytics.stock_by_product_org()
+    misses = analytics.cache.misses
+    client.post("/api/requests", json={"request_type": "Dispatch", "target_org_id": "CFA1"}, headers=admin)
+    analytics.stock_by_product_org()
+    assert analytics.cache.misses == misses
+
+
+def test_compute_that_raced_a_write_is_not_stored():
+    cache = analytics.AnalyticsCache(ttl=60)
+
+    def compute():
+        cache.on_change({"inventory"})  # a commit lands mid-compute
+        return "stale"
+
+    assert cache.get_or_compute("key", ("inventory",), compute) == "stale"
+    assert cache.get_or_compute("key", ("inventory",), lambda: "fresh") == "fresh"
+
+
+def test_far_future_expiry_counts_as_stock_but_not_near_expiry(client, admin):
+    batch_id = os.urandom(4).hex()
+    with SessionLocal() as session:
+        session.add(models.Batch(batch_id=batch_id, product_id="PROD1", batch_number=batch_id,
+                                 expiry_date=date(2999, 1, 1)))
+        session.commit()
+    before = _on_hand("PROD1")
+    _count(client, admin, batch_id, 4)
+    assert _on_hand("PROD1") == before + 4
+    assert batch_id not in set(analytics.near_expiry()["batch_number"])
@@ -0,0 +1,26 @@
+import threading
+import time
+
+from frontend import dash_app
+
+from backend.app import LazyDashMiddleware
+
+
+def test_concurrent_first_requests_build_dash_once(monkeypatch):
+    builds = []
+
+    def create_dash(server):
+        builds.append(server)
+        time.sleep(0.05)  # widen the window a missing lock would race in
+
+    monkeypatch.setattr(dash_app, "create_dash", create_dash)
+    middleware = LazyDashMiddleware(api_app=None)
+    environ = {"PATH_INFO": "/dashboard/", "REQUEST_METHOD": "GET", "SERVER_NAME": "test",
+               "SERVER_PORT": "80", "wsgi.url_scheme": "http"}
+    threads = [threading.Thread(target=middleware, args=(dict(environ), lambda *a: None)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert middleware.dash_server is builds[0]
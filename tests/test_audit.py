@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from sqlalchemy import select
+
+from backend import models
+from backend.audit import writer
+from backend.database import SessionLocal, after_commit
+
+
+@pytest.fixture()
+def sync_writer(app):
+    previous, writer.sync = writer.sync, True
+    yield
+    writer.sync = previous
+
+
+def _product(tag):
+    return models.Product(product_id=tag, name=tag, sku=tag)
+
+
+def _logged(*record_ids):
+    with SessionLocal() as session:
+        table = models.AuditLog.__table__
+        return set(session.scalars(select(table.c.record_id).where(table.c.record_id.in_(record_ids))))
+
+
+def test_rolled_back_savepoint_drops_its_audit_records(sync_writer):
+    kept, undone, inner = (os.urandom(4).hex() for _ in range(3))
+    with SessionLocal() as session:
+        session.add(_product(kept))
+        session.flush()
+        savepoint = session.begin_nested()
+        session.add(_product(undone))
+        session.flush()
+        with session.begin_nested():
+            session.add(_product(inner))
+        savepoint.rollback()
+        session.commit()
+    assert _logged(kept, undone, inner) == {kept}
+
+
+def test_released_savepoint_keeps_its_audit_records(sync_writer):
+    tag = os.urandom(4).hex()
+    with SessionLocal() as session:
+        with session.begin_nested():
+            session.add(_product(tag))
+        session.commit()
+    assert _logged(tag) == {tag}
+
+
+def test_after_commit_callback_dropped_with_its_savepoint(app):
+    calls = []
+    with SessionLocal() as session:
+        session.connection()
+        after_commit(session, lambda: calls.append("outer"))
+        savepoint = session.begin_nested()
+        after_commit(session, lambda: calls.append("inner"))
+        savepoint.rollback()
+        with session.begin_nested():
+            after_commit(session, lambda: calls.append("released"))
+        assert calls == []
+        session.commit()
+    assert calls == ["outer", "released"]
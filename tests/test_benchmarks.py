@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_endpoints import QueryCounter, run_scenario  # noqa: E402
+from common import compare, percentile  # noqa: E402
+
+from backend.database import engine, read_engine  # noqa: E402
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_only_regressions_past_the_threshold(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"batches": {"p95_ms": 10.0, "rps": 100.0, "queries_per_request": 2}}))
+    results = {"batches": {"p95_ms": 10.5, "rps": 70.0, "queries_per_request": 4}}
+    keys = {"p95_ms": "lower", "rps": "higher", "queries_per_request": "lower"}
+    regressions = compare(results, str(baseline), 0.1, keys)
+    assert [r.split(":")[0] for r in regressions] == ["batches.rps", "batches.queries_per_request"]
+
+
+def test_scenario_reports_latency_throughput_and_queries(app, admin):
+    counter = QueryCounter(engine, read_engine)
+    call = lambda client, rng: client.get("/api/batches?limit=5", headers=admin)  # noqa: E731
+    stats = run_scenario(app, call, counter, clients=2, total=10, warmup=1)
+    assert stats["requests"] == 10 and stats["errors"] == 0
+    assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert stats["rps"] > 0
+    assert stats["queries_per_request"] >= 1
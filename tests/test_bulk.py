@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+from backend.bulk import SPECS, BulkLoader, insert_rows
+from backend.database import SessionLocal
+
+
+def _ndjson(client, headers, path, records, **kwargs):
+    body = "\n".join(r if isinstance(r, str) else json.dumps(r) for r in records)
+    return client.post(path, data=body, content_type="application/x-ndjson", headers=headers, **kwargs)
+
+
+def _errors(resp):
+    return [e["error"] for e in resp.get_json()["errors"]]
+
+
+def test_valid_rows_still_load(client, admin):
+    resp = _ndjson(client, admin, "/api/batches/bulk", [{"product_id": "PROD1", "batch_number": "BULK-OK-1",
+                                                          "expiry_date": "2030-01-31"}])
+    assert resp.status_code == 200
+    assert resp.get_json()["inserted"] == 1
+
+
+@pytest.mark.parametrize("record, message", [
+    ({"product_id": {"id": "PROD1"}, "batch_number": "BULK-OBJ"}, "invalid product_id"),
+    ({"product_id": "PROD1", "batch_number": "BULK-INT-DATE", "expiry_date": 20300131}, "invalid expiry_date"),
+    ({"product_id": "PROD1", "batch_number": ["BULK", "LIST"]}, "invalid batch_number"),
+    ({"product_id": "PROD1", "batch_number": True}, "invalid batch_number"),
+])
+def test_malformed_values_are_row_errors(client, admin, record, message):
+    good = {"product_id": "PROD1", "batch_number": "BULK-GOOD-" + os.urandom(4).hex()}
+    resp = _ndjson(client, admin, "/api/batches/bulk", [record, good])
+    assert resp.status_code == 200
+    report = resp.get_json()
+    assert report["inserted"] == 1 and report["failed"] == 1
+    assert report["errors"][0]["line"] == 1
+    assert _errors(resp)[0].startswith(message)
+
+
+def test_numeric_text_is_coerced(client, admin):
+    resp = _ndjson(client, admin, "/api/batches/bulk", [{"product_id": "PROD1", "batch_number": 424242}])
+    assert resp.get_json()["inserted"] == 1
+    batches = client.get("/api/batches", query_string={"product_id": "PROD1", "limit": 1000}, headers=admin)
+    assert "424242" in {b["batch_number"] for b in batches.get_json()}
+
+
+def test_non_integer_quantities_are_rejected(client, admin, batch):
+    rows = [{"organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch, "quantity": q}
+            for q in (2.5, True, [1])]
+    resp = _ndjson(client, admin, "/api/inventory/bulk", rows)
+    assert resp.get_json()["failed"] == 3
+
+
+def test_database_errors_fall_back_to_row_errors(client, admin):
+    def flaky(session, spec, rows):
+        # StatementError, not IntegrityError: a value the driver cannot bind
+        if any(r["batch_number"] == "BULK-BAD-BIND" for r in rows):
+            rows = [dict(r, manufacturing_site_name=object()) for r in rows]
+        insert_rows(session, spec, rows)
+
+    session = SessionLocal()
+    try:
+        loader = BulkLoader(session, SPECS["batches"], writer=flaky)
+        report = loader.load(iter([
+            (1, {"product_id": "PROD1", "batch_number": "BULK-BAD-BIND"}),
+            (2, {"product_id": "PROD1", "batch_number": "BULK-FINE"}),
+        ]))
+    finally:
+        session.close()
+    assert report["inserted"] == 1
+    assert report["failed"] == 1 and report["errors"][0]["line"] == 1
+
+
+def test_non_utf8_body_is_400(client, admin):
+    body = b'{"product_id": "PROD1", "batch_number": "caf\xe9"}\n'
+    resp = client.post("/api/batches/bulk", data=body, content_type="application/x-ndjson", headers=admin)
+    assert resp.status_code == 400
+    assert "UTF-8" in resp.get_json()["error"]
+
+
+def test_non_utf8_csv_is_400(client, admin):
+    body = b"product_id,batch_number\nPROD1,caf\xe9\n"
+    resp = client.post("/api/batches/bulk?atomic=1", data=body, content_type="text/csv", headers=admin)
+    assert resp.status_code == 400
+    assert resp.get_json()["inserted"] == 0
@@ -0,0 +1,57 @@
+import uuid
+
+from sqlalchemy import event, func, select
+
+from backend import ledger, models
+from backend.changes import PENDING_SEQ, stored_versions
+from backend.database import SessionLocal, engine
+
+
+def test_versions_bump_at_commit_in_name_order(app, batch):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE table_versions"):
+            statements.append(parameters[-1])
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with SessionLocal() as session:
+            # record_transaction writes inventory before transactions
+            ledger.record_transaction(
+                session, product_id="PROD1", batch_id=batch, quantity=5, transaction_type=ledger.ADJUST_ADD,
+                destination_org_id="CFA1", recorded_by_user_id="USR1",
+            )
+            session.flush()
+            assert statements == []
+            session.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements == ["inventory", "transactions"]
+    with engine.connect() as conn:
+        seen = [conn.execute(select(models.Inventory.change_seq).filter_by(batch_id=batch)).scalar(),
+                conn.execute(select(models.Transaction.change_seq).filter_by(batch_id=batch)).scalar()]
+        versions = stored_versions(conn, ["inventory", "transactions"])
+    assert seen == [versions["inventory"][0], versions["transactions"][0]]
+
+
+def test_change_seq_follows_commit_order(app, batch):
+    early, late = SessionLocal(), SessionLocal()
+    try:
+        first = str(uuid.uuid4())
+        early.add(models.Transaction(transaction_id=first, product_id="PROD1", batch_id=batch, quantity=1,
+                                     transaction_type="Quality Hold", recorded_by_user_id="USR1"))
+        early.flush()
+        assert early.get(models.Transaction, first).change_seq == PENDING_SEQ
+        early.commit()
+        second = str(uuid.uuid4())
+        late.add(models.Transaction(transaction_id=second, product_id="PROD1", batch_id=batch, quantity=1,
+                                    transaction_type="Quality Hold", recorded_by_user_id="USR1"))
+        late.commit()
+        assert early.get(models.Transaction, first).change_seq < late.get(models.Transaction, second).change_seq
+    finally:
+        early.close()
+        late.close()
+    with engine.connect() as conn:
+        t = models.Transaction.__table__
+        assert conn.execute(select(func.count()).where(t.c.change_seq == PENDING_SEQ)).scalar() == 0
@@ -0,0 +1,26 @@
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def test_json_and_ndjson_get_distinct_etags(client, admin, batch):
+    json_resp = client.get("/api/batches", headers=admin)
+    ndjson_resp = client.get("/api/batches", headers={**admin, **NDJSON})
+    assert json_resp.mimetype == "application/json"
+    assert ndjson_resp.mimetype == "application/x-ndjson"
+    assert json_resp.headers["ETag"] != ndjson_resp.headers["ETag"]
+    assert "Accept" in json_resp.headers["Vary"]
+    assert "Accept" in ndjson_resp.headers["Vary"]
+
+
+def test_json_etag_does_not_revalidate_ndjson(client, admin, batch):
+    etag = client.get("/api/batches", headers=admin).headers["ETag"]
+    resp = client.get("/api/batches", headers={**admin, **NDJSON, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+
+
+def test_not_modified_carries_vary(client, admin, batch):
+    etag = client.get("/api/batches", headers={**admin, **NDJSON}).headers["ETag"]
+    resp = client.get("/api/batches", headers={**admin, **NDJSON, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert "Accept" in resp.headers["Vary"]
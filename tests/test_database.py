@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from backend.database import SQLITE_BUSY_TIMEOUT_MS, engine, read_engine
+from backend.principals import principal_cache
+
+
+def _peak_connections(client, method, path, **kwargs):
+    """Most pooled connections the request thread held at once, per engine."""
+    me = threading.get_ident()
+    held, peak = {"write": 0, "read": 0}, {"write": 0, "read": 0}
+
+    def listeners(name):
+        def checkout(*args):
+            if threading.get_ident() == me:
+                held[name] += 1
+                peak[name] = max(peak[name], held[name])
+
+        def checkin(*args):
+            if threading.get_ident() == me and held[name]:
+                held[name] -= 1
+
+        return {"checkout": checkout, "checkin": checkin}
+
+    pools = {"write": (engine.pool, listeners("write")), "read": (read_engine.pool, listeners("read"))}
+    for pool, fns in pools.values():
+        for name, fn in fns.items():
+            event.listen(pool, name, fn)
+    principal_cache.clear()
+    try:
+        resp = client.open(path, method=method, **kwargs)
+    finally:
+        for pool, fns in pools.values():
+            for name, fn in fns.items():
+                event.remove(pool, name, fn)
+    return resp, peak
+
+
+def test_read_and_write_engines_are_split(app):
+    assert read_engine is not engine
+
+
+def _pragma(bind, name):
+    with bind.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_production_pragmas_are_applied(app):
+    assert _pragma(engine, "journal_mode") == "wal"
+    assert _pragma(engine, "synchronous") == 1  # NORMAL
+    assert _pragma(read_engine, "busy_timeout") == SQLITE_BUSY_TIMEOUT_MS
+    assert _pragma(engine, "query_only") == 0
+
+
+def test_read_engine_rejects_writes(app):
+    with read_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM organizations")).scalar() > 0
+        with pytest.raises(OperationalError, match="readonly"):
+            conn.execute(text("UPDATE organizations SET name = name"))
+
+
+def test_write_request_uses_one_connection_on_auth_miss(client, admin):
+    resp, peak = _peak_connections(client, "POST", "/api/requests", headers=admin,
+                                   json={"request_type": "Dispatch", "target_org_id": "CFA1"})
+    assert resp.status_code == 201
+    assert peak == {"write": 1, "read": 0}
+
+
+def test_read_request_authenticates_on_the_read_engine(client, admin):
+    resp, peak = _peak_connections(client, "GET", "/api/batches", headers=admin)
+    assert resp.status_code == 200
+    assert peak == {"write": 0, "read": 1}
@@ -0,0 +1,54 @@
+import csv
+import io
+import uuid
+from datetime import datetime, timedelta
+
+from backend import models
+from backend.database import SessionLocal
+
+
+def _export(client, headers, table, after=None):
+    resp = client.get(f"/api/exports/{table}", query_string={"after": after} if after else {}, headers=headers)
+    assert resp.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    return rows, resp.headers["X-Export-Watermark"]
+
+
+def test_slow_transaction_is_not_skipped(client, admin, batch):
+    _, watermark = _export(client, admin, "transactions")
+
+    # A write stamped long before it commits, as in a slow bulk import
+    session = SessionLocal()
+    txn_id = str(uuid.uuid4())
+    session.add(models.Transaction(
+        transaction_id=txn_id, product_id="PROD1", batch_id=batch, quantity=1,
+        transaction_type="Quality Hold", recorded_by_user_id="USR1",
+        created_at=datetime.utcnow() - timedelta(minutes=10),
+    ))
+    session.flush()
+    try:
+        rows, during = _export(client, admin, "transactions", after=watermark)
+        assert txn_id not in {r["transaction_id"] for r in rows}
+    finally:
+        session.commit()
+        session.close()
+
+    rows, after = _export(client, admin, "transactions", after=during)
+    assert txn_id in {r["transaction_id"] for r in rows}
+    rows, _ = _export(client, admin, "transactions", after=after)
+    assert txn_id not in {r["transaction_id"] for r in rows}
+
+
+def test_updated_balances_are_exported_again(client, admin, batch):
+    client.post("/api/inventory", json={"organization_id": "CFA1", "product_id": "PROD1",
+                                        "batch_id": batch, "quantity": 3}, headers=admin)
+    _, watermark = _export(client, admin, "inventory")
+    client.post("/api/inventory", json={"organization_id": "CFA1", "product_id": "PROD1",
+                                        "batch_id": batch, "quantity": 8}, headers=admin)
+    rows, _ = _export(client, admin, "inventory", after=watermark)
+    assert [(r["batch_id"], r["quantity"]) for r in rows] == [(batch, "8")]
+
+
+def test_legacy_timestamp_watermark_is_accepted(client, admin):
+    rows, watermark = _export(client, admin, "transactions", after="2000-01-01T00:00:00")
+    assert rows and watermark.isdigit()
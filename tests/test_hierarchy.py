@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from backend import models
+from backend.database import SessionLocal
+
+
+@pytest.fixture()
+def chain(client, admin):
+    """Three fresh organizations, each the parent of the next."""
+    ids, parent = [], None
+    for kind in ("CFA", "Stockist", "Stockist"):
+        org_id = os.urandom(4).hex()
+        resp = client.post("/api/organizations", json={
+            "organization_id": org_id, "name": org_id, "type": kind, "parent_organization_id": parent,
+        }, headers=admin)
+        assert resp.status_code == 201
+        ids.append(org_id)
+        parent = org_id
+    return ids
+
+
+def _descendants(client, headers, org_id, **params):
+    resp = client.get(f"/api/organizations/{org_id}/descendants", query_string=params, headers=headers)
+    assert resp.status_code == 200
+    return [(o["organization_id"], o["depth"]) for o in resp.get_json()]
+
+
+def test_descendants_span_every_level(client, admin, chain):
+    top, middle, leaf = chain
+    assert _descendants(client, admin, top) == [(middle, 1), (leaf, 2)]
+    assert _descendants(client, admin, top, type="CFA") == []
+
+
+def test_reparenting_moves_the_subtree(client, admin, chain):
+    top, middle, leaf = chain
+    resp = client.patch(f"/api/organizations/{middle}", json={"parent_organization_id": None}, headers=admin)
+    assert resp.status_code == 200
+    assert _descendants(client, admin, top) == []
+    assert _descendants(client, admin, middle) == [(leaf, 1)]
+
+
+def test_reparenting_under_a_descendant_is_rejected(client, admin, chain):
+    top, _, leaf = chain
+    resp = client.patch(f"/api/organizations/{top}", json={"parent_organization_id": leaf}, headers=admin)
+    assert resp.status_code == 409
+    assert len(_descendants(client, admin, top)) == 2
+
+
+def test_subtree_inventory_includes_descendants(client, admin, chain, batch):
+    top, _, leaf = chain
+    with SessionLocal() as session:
+        session.add(models.Inventory(inventory_record_id=leaf, organization_id=leaf, product_id="PROD1",
+                                     batch_id=batch, quantity=3))
+        session.commit()
+    resp = client.get(f"/api/organizations/{top}/inventory", headers=admin)
+    assert resp.status_code == 200
+    assert [(i["organization_id"], i["quantity"]) for i in resp.get_json()] == [(leaf, 3)]
@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from backend import idempotency, ledger, models
+from backend.database import SessionLocal, engine
+
+
+REQUEST = {"request_type": "Dispatch", "target_org_id": "CFA1"}
+
+
+def _post(client, headers, key, path="/api/requests", **body):
+    body = body or REQUEST
+    return client.post(path, json=body, headers={**headers, idempotency.HEADER: key})
+
+
+def _count_requests(notes):
+    with SessionLocal() as session:
+        return session.query(models.Request).filter_by(notes=notes).count()
+
+
+def _key_row(key):
+    with engine.connect() as conn:
+        return conn.execute(select(idempotency._table).where(idempotency._table.c.idempotency_key == key)).first()
+
+
+def _claim(app, key, age):
+    """A claim with no response yet, as left by a request still running (or dead)."""
+    with app.test_request_context("/api/requests", method="POST", json=REQUEST):
+        digest = idempotency.fingerprint()
+    created = datetime.utcnow() - age
+    with engine.begin() as conn:
+        conn.execute(insert(idempotency._table).values(
+            user_id="USR1", idempotency_key=key, fingerprint=digest,
+            created_at=created, expires_at=created + timedelta(days=1),
+        ))
+
+
+def test_retry_replays_the_stored_response(client, admin):
+    key, notes = str(uuid.uuid4()), str(uuid.uuid4())
+    first = _post(client, admin, key, request_type="Dispatch", target_org_id="CFA1", notes=notes)
+    again = _post(client, admin, key, request_type="Dispatch", target_org_id="CFA1", notes=notes)
+    assert first.status_code == again.status_code == 201
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.get_json() == first.get_json()
+    assert _count_requests(notes) == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client, admin):
+    key = str(uuid.uuid4())
+    assert _post(client, admin, key, request_type="Dispatch", target_org_id="CFA1").status_code == 201
+    assert _post(client, admin, key, request_type="Return", target_org_id="CFA1").status_code == 422
+
+
+def test_server_error_releases_the_key(client, admin, batch, monkeypatch):
+    calls = []
+
+    def fail(*args, **kwargs):
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    key = str(uuid.uuid4())
+    body = {"organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch, "quantity": 2}
+    monkeypatch.setattr(ledger, "set_quantities", fail)
+    assert _post(client, admin, key, "/api/inventory", **body).status_code == 500
+    assert _key_row(key) is None
+    monkeypatch.undo()
+    assert _post(client, admin, key, "/api/inventory", **body).status_code == 201
+
+
+def test_rolled_back_client_error_is_stored(client, admin, batch, monkeypatch):
+    calls = []
+
+    def conflict(*args, **kwargs):
+        calls.append(1)
+        raise ledger.LedgerError("moved meanwhile")
+
+    monkeypatch.setattr(ledger, "set_quantities", conflict)
+    key = str(uuid.uuid4())
+    body = {"organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch, "quantity": 2}
+    assert _post(client, admin, key, "/api/inventory", **body).status_code == 409
+    again = _post(client, admin, key, "/api/inventory", **body)
+    assert again.status_code == 409 and again.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+def test_live_claim_answers_in_progress(app, client, admin):
+    key = str(uuid.uuid4())
+    _claim(app, key, timedelta(0))
+    assert _post(client, admin, key).status_code == 409
+    assert _key_row(key).response_status is None
+
+
+def test_abandoned_claim_is_taken_over_after_the_lease(app, client, admin):
+    key = str(uuid.uuid4())
+    _claim(app, key, timedelta(seconds=idempotency.LEASE_SECONDS + 1))
+    assert _post(client, admin, key).status_code == 201
+    assert _key_row(key).response_status == 201
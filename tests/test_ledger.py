@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from backend import ledger, migrations, models
+from backend.database import SessionLocal, engine
+
+
+def _balance(org, batch_id):
+    session = SessionLocal()
+    try:
+        return ledger.balance(session, org, batch_id)
+    finally:
+        session.close()
+
+
+def _count(client, headers, batch_id, quantity, org="CFA1"):
+    return client.post("/api/inventory", json={
+        "organization_id": org, "product_id": "PROD1", "batch_id": batch_id, "quantity": quantity,
+    }, headers=headers)
+
+
+def _dispatch(client, headers, batch_id, quantity, org="CFA1"):
+    return client.post("/api/transactions", json={
+        "product_id": "PROD1", "batch_id": batch_id, "quantity": quantity,
+        "transaction_type": "Dispatch", "source_org_id": org, "destination_org_id": "STOCK1",
+    }, headers=headers)
+
+
+def test_dispatch_beyond_balance_is_rejected(client, admin, batch):
+    assert _count(client, admin, batch, 5).status_code == 201
+    assert _dispatch(client, admin, batch, 6).status_code == 409
+    assert _dispatch(client, admin, batch, 5).status_code == 201
+    assert _balance("CFA1", batch) == 0
+
+
+def test_dispatch_without_stock_is_rejected(client, admin, batch):
+    assert _dispatch(client, admin, batch, 1).status_code == 409
+    assert _balance("CFA1", batch) == 0
+
+
+def test_concurrent_dispatches_never_overdraw(app, admin, batch):
+    assert _count(app.test_client(), admin, batch, 10).status_code == 201
+
+    def dispatch(_):
+        return _dispatch(app.test_client(), admin, batch, 10).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        codes = list(pool.map(dispatch, range(8)))
+    assert sorted(codes) == [201] + [409] * 7
+    assert _balance("CFA1", batch) == 0
+
+
+def test_negative_stock_count_is_rejected(client, admin, batch):
+    assert _count(client, admin, batch, -3).status_code == 400
+    assert _balance("CFA1", batch) == 0
+
+
+def test_bulk_transactions_check_balances(client, admin, batch):
+    assert _count(client, admin, batch, 4).status_code == 201
+    lines = "\n".join(
+        '{"product_id": "PROD1", "batch_id": "%s", "quantity": %d, "transaction_type": "Dispatch", '
+        '"source_org_id": "CFA1", "destination_org_id": "STOCK1"}' % (batch, qty)
+        for qty in (3, 3)
+    )
+    resp = client.post("/api/transactions/bulk", data=lines, content_type="application/x-ndjson", headers=admin)
+    report = resp.get_json()
+    assert report["inserted"] == 1 and report["failed"] == 1
+    assert "cannot move" in report["errors"][0]["error"]
+    assert _balance("CFA1", batch) == 1
+
+
+def _legacy_balance(batch_id, quantity):
+    """An Inventory row written without a transaction, as before the ledger."""
+    with engine.begin() as conn:
+        conn.execute(insert(models.Inventory.__table__).values(
+            inventory_record_id=batch_id, organization_id="CFA1", product_id="PROD1",
+            batch_id=batch_id, quantity=quantity,
+        ))
+
+
+def _stamp(version):
+    with engine.begin() as conn:
+        conn.execute(update(models.SchemaVersion.__table__).values(version=version))
+
+
+def test_rebuild_refuses_balances_without_history_before_upgrade(app, batch):
+    _legacy_balance(batch, 40)
+    _stamp(ledger.OPENING_BALANCES_VERSION - 1)
+    try:
+        with SessionLocal() as session, pytest.raises(ledger.LedgerError):
+            ledger.rebuild(session)
+        assert _balance("CFA1", batch) == 40
+    finally:
+        migrations.upgrade()
+
+
+def test_upgrade_records_opening_balances(app, batch):
+    _legacy_balance(batch, 40)
+    _stamp(ledger.OPENING_BALANCES_VERSION - 1)
+    migrations.upgrade()
+    with SessionLocal() as session:
+        assert ledger.verify(session) == []
+        assert ledger.rebuild(session) == []
+        notes = session.scalars(select(models.Transaction.notes).filter_by(batch_id=batch)).all()
+    assert notes == [ledger.OPENING_NOTE]
+    assert _balance("CFA1", batch) == 40
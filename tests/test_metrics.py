@@ -0,0 +1,46 @@
+import logging
+
+from backend import metrics
+
+
+def _sample(client, line_prefix):
+    text = client.get("/api/metrics").get_data(as_text=True)
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_requests_are_counted_with_their_sql(client, admin):
+    total = 'api_requests_total{endpoint="api.list_batches",method="GET",status="200"}'
+    statements = 'api_request_sql_statements_sum{endpoint="api.list_batches"}'
+    before, sql_before = _sample(client, total), _sample(client, statements)
+    assert client.get("/api/batches?limit=1", headers=admin).status_code == 200
+    assert _sample(client, total) == before + 1
+    assert _sample(client, statements) > sql_before
+
+
+def test_metrics_are_prometheus_text(client):
+    resp = client.get("/api/metrics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/plain"
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in resp.get_data(as_text=True)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("h", "help", ("endpoint",), (1, 5))
+    for value in (0.5, 3, 9):
+        histogram.observe(value, "e")
+    lines = list(histogram.render())
+    assert 'h_bucket{endpoint="e",le="1"} 1' in lines
+    assert 'h_bucket{endpoint="e",le="5"} 2' in lines
+    assert 'h_bucket{endpoint="e",le="+Inf"} 3' in lines
+    assert 'h_count{endpoint="e"} 3' in lines
+
+
+def test_slow_request_log_includes_sql(client, admin, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 0.000001)
+    with caplog.at_level(logging.WARNING, logger=metrics.logger.name):
+        client.get("/api/batches?limit=1", headers=admin)
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("slow request GET /api/batches")]
+    assert slow and "SELECT" in slow[0]
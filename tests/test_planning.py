@@ -0,0 +1,47 @@
+import math
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from backend import planning
+
+TODAY = date(2026, 1, 31)
+
+
+def test_constant_demand_gives_a_reorder_point_and_order():
+    days = pd.date_range(end=TODAY, periods=planning.WINDOW_DAYS)
+    history = pd.DataFrame({"organization_id": "CFA1", "product_id": "P", "day": days, "quantity": 2})
+    stock = pd.DataFrame({"organization_id": ["CFA1", "CFA1"], "product_id": ["P", "IDLE"], "on_hand": [5, 9]})
+    frame = planning.compute(history, stock, TODAY).set_index("product_id")
+    busy, idle = frame.loc["P"], frame.loc["IDLE"]
+    assert (busy["avg_daily_demand"], busy["forecast_daily_demand"], busy["demand_std"]) == (2, 2, 0)
+    assert busy["reorder_point"] == pytest.approx(2 * planning.LEAD_TIME_DAYS)
+    expected = busy["reorder_point"] + 2 * planning.REVIEW_DAYS - 5
+    assert busy["suggested_order"] == math.ceil(expected)
+    assert (idle["suggested_order"], idle["on_hand"]) == (0, 9)
+
+
+def test_history_outside_the_window_is_ignored():
+    old = pd.DataFrame({"organization_id": ["CFA1"], "product_id": ["P"],
+                        "day": [pd.Timestamp(TODAY - timedelta(days=planning.WINDOW_DAYS))], "quantity": [50]})
+    stock = pd.DataFrame({"organization_id": ["CFA1"], "product_id": ["P"], "on_hand": [0]})
+    assert planning.compute(old, stock, TODAY)["avg_daily_demand"].tolist() == [0]
+
+
+def test_recompute_is_incremental_after_a_full_run(client, admin, batch):
+    assert client.post("/api/planning/recompute", json={"full": True}, headers=admin).get_json()["full"]
+    client.post("/api/inventory", json={
+        "organization_id": "CFA1", "product_id": "PROD1", "batch_id": batch, "quantity": 3,
+    }, headers=admin)
+    result = client.post("/api/planning/recompute", headers=admin).get_json()
+    assert not result["full"]
+    assert result["pairs"] >= 1
+    resp = client.get("/api/planning/reorder-points?organization_id=CFA1&product_id=PROD1", headers=admin)
+    assert resp.status_code == 200
+    rows = resp.get_json()
+    assert len(rows) == 1 and rows[0]["on_hand"] >= 3
+
+
+def test_only_manufacturers_recompute(client, stockist):
+    assert client.post("/api/planning/recompute", headers=stockist).status_code == 403
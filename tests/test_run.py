@@ -0,0 +1,32 @@
+import pytest
+
+from backend import events
+from backend.events import STREAM_SECONDS
+from backend.run import gunicorn_options, parse_args, serve
+
+
+@pytest.mark.parametrize("threads", ["1", "4"])
+def test_workers_are_threaded_so_timeout_spares_event_streams(threads):
+    options = gunicorn_options(parse_args(["--prod", "--threads", threads, "--timeout", "60"]))
+    # sync workers enforce ``timeout`` per request; gthread does not
+    assert options["worker_class"] == "gthread"
+    assert options["timeout"] < STREAM_SECONDS
+
+
+def test_local_broker_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(events, "broker", events.LocalBroker())
+    monkeypatch.delenv("WEB_WORKERS", raising=False)
+    assert parse_args(["--prod"]).workers == 1
+    assert serve(gunicorn_options(parse_args(["--prod", "--workers", "2"]))) == 2
+
+
+def test_broker_interface_is_abstract():
+    with pytest.raises(TypeError):
+        events.Broker()
+
+    class Partial(events.Broker):
+        def publish(self, type, orgs, data):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
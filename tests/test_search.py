@@ -0,0 +1,84 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from backend import models, search
+from backend.database import SessionLocal, engine, read_engine
+
+
+def test_fts_detection_runs_once_per_engine(client, admin):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(read_engine, "before_cursor_execute", record)
+    try:
+        for _ in range(3):
+            assert client.get("/api/search?q=para", headers=admin).status_code == 200
+    finally:
+        event.remove(read_engine, "before_cursor_execute", record)
+    probes = [s for s in statements if "compile_options" in s or "sqlite_master" in s]
+    assert len(probes) <= 2
+    assert read_engine in search._fts_ready
+
+
+def _add_batches(session, numbers, **fields):
+    session.add_all(models.Batch(batch_id=str(uuid.uuid4()), product_id="PROD1", batch_number=n, **fields)
+                    for n in numbers)
+
+
+def test_late_commit_is_indexed(app):
+    index = search.PrefixIndex()
+    with read_engine.connect() as conn:
+        index.refresh(conn)
+    code = "LATE" + uuid.uuid4().hex[:6]
+    with SessionLocal() as session:
+        # Stamped long before it commits, as in a slow atomic bulk import
+        stale = datetime.utcnow() - timedelta(minutes=10)
+        _add_batches(session, [code], created_at=stale, updated_at=stale)
+        session.commit()
+    with read_engine.connect() as conn:
+        index.refresh(conn)
+    assert [h["code"] for h in index.search([code.lower()])] == [code]
+
+
+def test_large_refresh_reloads_instead_of_inserting(app, monkeypatch):
+    index = search.PrefixIndex()
+    with read_engine.connect() as conn:
+        index.refresh(conn)
+    prefix = "R" + uuid.uuid4().hex[:5]
+    with SessionLocal() as session:
+        _add_batches(session, [f"{prefix}{i}" for i in range(5)])
+        session.commit()
+    monkeypatch.setattr(search, "REBUILD_ROWS", 2)
+    monkeypatch.setattr(index, "add", lambda *fields: pytest.fail("inserted row by row"))
+    with read_engine.connect() as conn:
+        index.refresh(conn)
+    assert len(index.search([prefix.lower()])) == 5
+
+
+@pytest.fixture(scope="module")
+def crowded(app):
+    prefix = "Q" + uuid.uuid4().hex[:5].upper()
+    with SessionLocal() as session:
+        _add_batches(session, [f"{prefix}{i:04d}" for i in range(400)] + [prefix])
+        session.commit()
+    return prefix
+
+
+def test_exact_match_survives_broad_prefix_in_fts(crowded):
+    with engine.connect() as conn:
+        if not search.fts5_supported(conn):
+            pytest.skip("SQLite built without FTS5")
+        hits = search._fts_search(conn, [crowded.lower()], "batch", 5)
+    assert hits[0]["code"] == crowded
+
+
+def test_exact_match_survives_broad_prefix_in_memory(crowded):
+    index = search.PrefixIndex()
+    with read_engine.connect() as conn:
+        index.refresh(conn)
+    assert index.search([crowded.lower()], "batch", 5)[0]["code"] == crowded
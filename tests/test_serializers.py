@@ -0,0 +1,19 @@
+import json
+
+import pytest
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table
+
+from backend.serializers import RowSerializer
+
+_table = Table("t", MetaData(), Column("id", Integer), Column("name", String), Column("score", Float))
+_serializer = RowSerializer(_table.c.id, _table.c.name, _table.c.score)
+
+
+@pytest.mark.parametrize("score", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_floats_encode_as_null(score):
+    assert json.loads(_serializer.encode((1, "x", score)), parse_constant=pytest.fail)["score"] is None
+
+
+@pytest.mark.parametrize("row", [(1, "plain", 2.5), (None, "é \"q\"", None), (7, None, 1e-7)])
+def test_encoding_matches_json_dumps(row):
+    assert _serializer.encode(row) == json.dumps(dict(zip(("id", "name", "score"), row)))
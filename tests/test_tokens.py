@@ -0,0 +1,18 @@
+import pytest
+
+from backend.tokens import TokenError, verify_token
+
+
+@pytest.mark.parametrize("token", ["", "no-dot", "é.é", "abc.sïgnature", "\udcff.x", "a.b.c"])
+def test_malformed_tokens_raise_token_error(token):
+    with pytest.raises(TokenError):
+        verify_token(token)
+
+
+def test_non_ascii_bearer_token_is_401(client):
+    resp = client.get("/api/batches", headers={"Authorization": "Bearer tökén.sïg"})
+    assert resp.status_code == 401
+
+
+def test_valid_token_still_works(client, admin):
+    assert client.get("/api/batches", headers=admin).status_code == 200
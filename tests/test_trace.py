@@ -0,0 +1,61 @@
+import pytest
+
+from backend import models
+from backend.database import SessionLocal
+from backend.trace import trace_batch
+
+
+def _move(client, headers, batch_id, kind, source, destination, quantity):
+    resp = client.post("/api/transactions", json={
+        "product_id": "PROD1", "batch_id": batch_id, "quantity": quantity, "transaction_type": kind,
+        "source_org_id": source, "destination_org_id": destination,
+    }, headers=headers)
+    assert resp.status_code == 201
+
+
+@pytest.fixture()
+def shipped(client, admin, batch):
+    """MANUF1 makes 10, ships 6 to CFA1, which ships 2 on to STOCK1."""
+    client.post("/api/inventory", json={
+        "organization_id": "MANUF1", "product_id": "PROD1", "batch_id": batch, "quantity": 10,
+    }, headers=admin)
+    for source, destination, qty in (("MANUF1", "CFA1", 6), ("CFA1", "STOCK1", 2)):
+        _move(client, admin, batch, "Dispatch", source, destination, qty)
+        _move(client, admin, batch, "Receipt", source, destination, qty)
+    return batch
+
+
+def _nodes(tree):
+    for node in tree:
+        yield node
+        yield from _nodes(node["children"])
+
+
+def test_trace_follows_the_chain_with_quantities(client, admin, shipped):
+    resp = client.get(f"/api/batches/{shipped}/trace", headers=admin)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    nodes = {n["organization_id"]: n for n in _nodes(body["tree"])}
+    assert [n["organization_id"] for n in body["tree"]] == ["MANUF1"]
+    assert {k: nodes[k]["on_hand"] for k in nodes} == {"MANUF1": 4, "CFA1": 4, "STOCK1": 2}
+    assert (nodes["CFA1"]["shipped_in"], nodes["CFA1"]["received"]) == (6, 6)
+    assert [c["organization_id"] for c in nodes["CFA1"]["children"]] == ["STOCK1"]
+    assert body["total_on_hand"] == 10
+
+
+def test_trace_from_org_covers_only_its_subtree(client, admin, shipped):
+    body = client.get(f"/api/batches/{shipped}/trace?from_org=CFA1", headers=admin).get_json()
+    assert {n["organization_id"] for n in _nodes(body["tree"])} == {"CFA1", "STOCK1"}
+    assert body["total_on_hand"] == 6
+
+
+def test_cte_and_memory_strategies_agree(shipped):
+    with SessionLocal() as session:
+        batch = session.get(models.Batch, shipped)
+        cte, memory = (trace_batch(session, batch, strategy=s) for s in ("cte", "memory"))
+    assert cte.pop("strategy") == "cte" and memory.pop("strategy") == "memory"
+    assert cte == memory
+
+
+def test_trace_of_unknown_batch_is_404(client, admin):
+    assert client.get("/api/batches/missing/trace", headers=admin).status_code == 404
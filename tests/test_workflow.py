@@ -0,0 +1,39 @@
+import pytest
+
+
+def _org(client, headers, org_id, org_type, parent):
+    resp = client.post("/api/organizations", json={
+        "organization_id": org_id, "name": org_id, "type": org_type, "parent_organization_id": parent,
+    }, headers=headers)
+    assert resp.status_code == 201
+
+
+def _request(client, headers, target):
+    resp = client.post("/api/requests", json={"request_type": "Dispatch", "target_org_id": target}, headers=headers)
+    assert resp.status_code == 201
+    return resp.get_json()["request_id"]
+
+
+@pytest.mark.parametrize("body", [[], "x", 3, None])
+def test_non_object_bodies_are_400(client, cfa, body):
+    resp = client.post("/api/approvals", json=body, headers=cfa)
+    assert resp.status_code == 400
+    resp = client.post("/api/approvals/bulk", json=body, headers=cfa)
+    assert resp.status_code == 400
+
+
+def test_approver_in_the_requests_network_can_decide(client, cfa, stockist):
+    request_id = _request(client, stockist, "STOCK1")
+    resp = client.post("/api/approvals", json={"request_id": request_id, "status": "Approved"}, headers=cfa)
+    assert resp.status_code == 201
+    assert resp.get_json()["request_status"] == "In Progress"
+
+
+def test_approver_outside_the_requests_network_is_forbidden(client, admin, cfa):
+    _org(client, admin, "CFA2", "CFA", "MANUF1")
+    _org(client, admin, "STOCK2", "Stockist", "CFA2")
+    # Raised by an admin-side user, aimed at a stockist under the other CFA
+    request_id = _request(client, admin, "STOCK2")
+    resp = client.post("/api/approvals", json={"request_id": request_id, "status": "Approved"}, headers=cfa)
+    assert resp.status_code == 403
+    assert "organization" in resp.get_json()["error"]
@@ -15,6 +15,9 @@ source venv/bin/activate
 
 pip install -r requirements.txt
 
+# Create tables and load sample data (idempotent)
+python -m backend.sample_data
+
 # Launch backend in background
 python -m backend.run 5055 &
 APP_PID=$!